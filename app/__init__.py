@@ -1,11 +1,15 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from flask_migrate import Migrate
 from config import Config
+from app import database, query_budget
+from app import metrics
 import os
 
 db = SQLAlchemy()
 login_manager = LoginManager()
+migrate = Migrate(render_as_batch=True)  # batch mode so ALTERs work on SQLite
 
 def create_app(config_class=Config):
 
@@ -13,18 +17,35 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
 
     db.init_app(app)
+    migrate.init_app(app, db)
+    database.init_app(app)
     login_manager.init_app(app)
+    query_budget.init_app(app)
+    metrics.init_app(app)
     login_manager.login_view = 'auth.login'  # Redirect here if not logged in
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
     # Import models here (after db is created)
     with app.app_context():
         from app import models
+        from app import stats  # registers the arena stats write hooks
+        from app import ratings  # registers the tier index hooks
+        from app import matchmaking  # registers the matchmaking index hooks
+        from app import duplicates  # registers the photo hash index hooks
     
-    from app.routes import main, auth, bugs, battles
+    from app.routes import main, auth, bugs, battles, tournaments, images, geo
     app.register_blueprint(main.bp)
     app.register_blueprint(auth.bp)
     app.register_blueprint(bugs.bp)
     app.register_blueprint(battles.bp)
+    app.register_blueprint(tournaments.bp)
+    app.register_blueprint(images.bp)
+    app.register_blueprint(geo.bp)
+
+    from app.images import thumbnail_url
+    app.jinja_env.globals['thumbnail_url'] = thumbnail_url
+
+    from app.cli import brawl
+    app.cli.add_command(brawl)
     
     return app
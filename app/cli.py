@@ -0,0 +1,211 @@
+"""
+Command line tools - run `flask brawl --help`
+"""
+import time
+
+import click
+from flask.cli import AppGroup
+
+brawl = AppGroup('brawl', help='BugBrawl maintenance and batch jobs.')
+
+
+@brawl.command('recompute-ratings')
+@click.option('--batch-size', default=10000, show_default=True,
+              help='Battles read from the database per fetch.')
+def recompute_ratings_command(batch_size):
+    """Rebuild every rating and tier from Battle history."""
+    from app.ratings import recompute_ratings
+    replayed, rated = recompute_ratings(batch_size=batch_size)
+    click.echo(f'Replayed {replayed} battles, rated {rated} bugs.')
+
+
+@brawl.command('refresh-stats')
+def refresh_stats_command():
+    """Rebuild the homepage/dashboard stats row from the Bug and Battle tables."""
+    from app.stats import refresh_arena_stats
+    refresh_arena_stats()
+    click.echo('Arena stats rebuilt.')
+
+
+@brawl.command('simulate')
+@click.option('--input', 'input_path', type=click.Path(exists=True, dir_okay=False),
+              help='Bug snapshots as .csv or JSON lines (default: every bug in the database).')
+@click.option('--pairs', default='all', show_default=True,
+              help='all, random:N, or a CSV file of red_id,blue_id lines.')
+@click.option('--seed', type=int, help='RNG seed - same seed, same results for any worker count.')
+@click.option('--workers', type=int, help='Worker processes (default: one per CPU).')
+@click.option('--format', 'output_format', type=click.Choice(['jsonl', 'csv']),
+              help='Output format (default: from the --output extension, else jsonl).')
+@click.option('--output', type=click.File('w'), default='-', show_default=True,
+              help='Where to write results.')
+def simulate_command(input_path, pairs, seed, workers, output_format, output):
+    """Fight bug snapshots offline and stream the results."""
+    from battle_engine.simulate import load_snapshots, parse_pairs, simulate, write_results
+
+    roster = load_snapshots(input_path) if input_path else _snapshot_bugs()
+    try:
+        matchups = parse_pairs(pairs, roster, seed)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--pairs')
+    if output_format is None:
+        output_format = 'csv' if output.name.endswith('.csv') else 'jsonl'
+
+    started = time.perf_counter()
+    try:
+        count = write_results(simulate(roster, matchups, seed=seed, workers=workers),
+                              output, output_format)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed > 0 else 0.0
+    click.echo(f'{count} fights in {elapsed:.2f}s ({rate:,.0f} fights/s)', err=True)
+
+
+def _snapshot_bugs():
+    """Combatants for every bug, read in one pass with no ORM objects"""
+    from sqlalchemy import select
+    from app import db
+    from app.models import Bug
+    from battle_engine.combat import Combatant
+
+    rows = db.session.execute(select(
+        Bug.id, Bug.nickname, Bug.attack, Bug.defense, Bug.speed, Bug.special_attack,
+        Bug.special_defense, Bug.health, Bug.xfactor, Bug.attack_type, Bug.defense_type,
+        Bug.size_class, Bug.attack_type_code, Bug.defense_type_code, Bug.size_code,
+    ).order_by(Bug.id))
+    return [Combatant.from_bug(row) for row in rows]
+
+
+@brawl.command('balance')
+@click.option('--output-dir', default='balance-report', show_default=True,
+              type=click.Path(file_okay=False), help='Where the CSV/HTML report goes.')
+@click.option('--grid', default='25,50,75', show_default=True,
+              help='Comma separated levels swept for attack, defense and speed.')
+@click.option('--samples', default=2, show_default=True, type=click.IntRange(min=1),
+              help='Fights per build pairing.')
+@click.option('--seed', type=int, help='RNG seed.')
+@click.option('--strict', is_flag=True,
+              help='Exit with status 1 if any archetype is dominant or useless (for CI).')
+def balance_command(output_dir, grid, samples, seed, strict):
+    """Sweep every type/size archetype and report win rates."""
+    from battle_engine.balance import analyze, verdict, write_report
+
+    try:
+        levels = tuple(int(level) for level in grid.split(','))
+    except ValueError:
+        raise click.BadParameter('expected comma separated numbers', param_hint='--grid')
+
+    started = time.perf_counter()
+    report = analyze(grid=levels, samples=samples, seed=seed)
+    paths = write_report(report, output_dir)
+    elapsed = time.perf_counter() - started
+
+    verdicts = [verdict(rate) for rate in report.archetype_rates]
+    click.echo(f'{report.fights:,} fights in {elapsed:.1f}s - '
+               f'{verdicts.count("dominant")} dominant, {verdicts.count("useless")} useless '
+               f'of {len(verdicts)} archetypes')
+    for path in paths:
+        click.echo(f'  {path}')
+    if strict and (verdicts.count('dominant') or verdicts.count('useless')):
+        raise SystemExit(1)
+
+
+@brawl.command('hash-images')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Bugs hashed per commit.')
+def hash_images_command(batch_size):
+    """Backfill Bug.image_hash for photos that don't have one yet."""
+    import os
+    from PIL import Image, UnidentifiedImageError
+    from sqlalchemy import select
+    from app import db
+    from app.images import image_hash, upload_root
+    from app.models import Bug
+
+    root = upload_root()
+    hashed = missing = 0
+    last_id = 0
+    while True:
+        bugs = db.session.execute(
+            select(Bug).where(Bug.image_hash.is_(None), Bug.id > last_id)
+            .order_by(Bug.id).limit(batch_size)
+        ).scalars().all()
+        if not bugs:
+            break
+        for bug in bugs:
+            try:
+                with Image.open(os.path.join(root, bug.image_path)) as image:
+                    bug.image_hash = image_hash(image)
+                hashed += 1
+            except (OSError, UnidentifiedImageError):
+                missing += 1
+        last_id = bugs[-1].id
+        db.session.commit()
+    click.echo(f'Hashed {hashed} photos, {missing} missing or unreadable.')
+
+
+@brawl.command('worker')
+@click.option('--threads', default=2, show_default=True, type=click.IntRange(min=1),
+              help='Worker threads in this process.')
+@click.option('--poll-interval', default=1.0, show_default=True,
+              help='Seconds to wait when the queue is empty.')
+@click.option('--burst', is_flag=True, help='Exit once no job is runnable.')
+def worker_command(threads, poll_interval, burst):
+    """Run queued stat generation jobs and tournaments."""
+    from flask import current_app
+    from app.stat_jobs import work
+
+    processed = work(current_app._get_current_object(), threads=threads,
+                     poll_interval=poll_interval, burst=burst)
+    click.echo(f'Ran {processed} jobs.')
+
+
+@brawl.command('resolve-species')
+@click.option('--batch-size', default=200, show_default=True,
+              help='Species names resolved per call.')
+def resolve_species_command(batch_size):
+    """Look up every species name on file and warm the taxonomy cache."""
+    from sqlalchemy import select
+    from app import db
+    from app.models import Bug
+    from app.taxonomy import resolve_many
+
+    names = db.session.execute(
+        select(Bug.species).where(Bug.species.isnot(None)).distinct()
+    ).scalars().all()
+    found = 0
+    for start in range(0, len(names), batch_size):
+        resolved = resolve_many(names[start:start + batch_size])
+        found += sum(1 for taxon in resolved.values() if taxon is not None)
+    click.echo(f'Resolved {found} of {len(names)} species names.')
+
+
+@brawl.command('geohash-bugs')
+@click.option('--batch-size', default=5000, show_default=True,
+              help='Bugs updated per commit.')
+def geohash_bugs_command(batch_size):
+    """Backfill Bug.geohash / Bug.region for bugs that have coordinates."""
+    from sqlalchemy import select, update
+    from app import db
+    from app.models import Bug
+    from battle_engine.geo import REGION_PRECISION, encode
+
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(Bug.id, Bug.latitude, Bug.longitude)
+            .where(Bug.id > last_id, Bug.latitude.isnot(None), Bug.longitude.isnot(None))
+            .order_by(Bug.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        changes = []
+        for bug_id, latitude, longitude in rows:
+            cell = encode(latitude, longitude)
+            changes.append({'id': bug_id, 'geohash': cell, 'region': cell[:REGION_PRECISION]})
+        db.session.execute(update(Bug), changes)
+        db.session.commit()
+        updated += len(changes)
+        last_id = rows[-1].id
+    click.echo(f'Geohashed {updated} bugs.')
@@ -0,0 +1,54 @@
+"""
+SQLite connection tuning
+
+SQLite only allows one writer at a time. With the default rollback journal
+a writer also blocks every reader, and a second writer fails straight away
+with "database is locked". SQLITE_PRAGMAS (ProductionConfig) switches the
+database to WAL and gives writers a busy timeout so they queue instead of
+failing. The pragmas run on every new pooled connection - journal_mode
+sticks to the database file, the others are per connection. Development and
+tests leave them unset and get SQLite's defaults.
+
+SQLITE_BEGIN = 'IMMEDIATE' (ProductionConfig) makes every transaction the
+driver opens a BEGIN IMMEDIATE: it takes the write lock at BEGIN, whatever
+the transaction goes on to do - read-only ones included - and holds it until
+commit or rollback, so all of them queue behind each other. That's the price
+of never failing halfway: a deferred BEGIN upgrades to a writer
+mid-transaction, and under WAL that fails at once if another process
+committed in between - busy_timeout can't help there.
+
+Schema changes go through Flask-Migrate: `flask db upgrade` creates or
+updates the tables (`flask db stamp head` once for a database that was made
+by the old db.create_all() in run.py).
+"""
+from sqlalchemy import event
+
+
+def _pragma_listener(pragmas, begin):
+    def set_pragmas(dbapi_connection, connection_record):
+        if begin:
+            dbapi_connection.isolation_level = begin
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return set_pragmas
+
+
+def init_app(app):
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas or not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return
+    from app import db
+    with app.app_context():
+        event.listen(db.engine, 'connect', _pragma_listener(pragmas, app.config.get('SQLITE_BEGIN')))
+
+
+def dispose_after_fork(app):
+    """
+    gunicorn post_fork hook: with --preload the engine was created in the
+    master, so drop any connections it holds - never share them with a child
+    """
+    from app import db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,168 @@
+"""
+Duplicate Photo Detection
+
+Every bug photo gets a 64-bit difference hash (app.images.image_hash) stored
+on Bug.image_hash. Near-duplicates - the same photo recompressed, resized or
+slightly cropped - land within a few bits of each other.
+
+HashIndex answers "which photos are within Hamming distance k?" with
+multi-index hashing: the hash is cut into CHUNKS 16-bit chunks, each with its
+own table. If two hashes differ in at most k bits, at least one chunk differs
+in at most k // CHUNKS bits (pigeonhole), so a query only probes the buckets
+that close to its own chunks and checks those candidates - no scan over all
+photos however big the table gets.
+
+The per-process index is built from the database on first use and kept
+current by the Bug mapper events below. Like the matchmaking indexes, it is
+rebuilt every DUPLICATES_TTL seconds so worker processes pick up each
+other's uploads, and changes wait in the session until its transaction
+commits (dropped on rollback).
+"""
+import threading
+import time
+from functools import lru_cache
+from itertools import combinations
+
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from app.models import Bug
+
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+DUPLICATE_DISTANCE = 10  # bits; unrelated photos sit around 25+ apart
+
+_index = None
+_built_at = 0.0
+_lock = threading.Lock()
+
+
+def to_unsigned(value):
+    """Stored hashes are signed 64-bit (database BIGINT) - back to 0..2**64-1"""
+    return value & ((1 << HASH_BITS) - 1)
+
+
+def to_signed(value):
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+@lru_cache(maxsize=None)
+def _flips(radius):
+    """Every CHUNK_BITS-wide mask with at most `radius` bits set"""
+    return tuple(sum(1 << bit for bit in bits)
+                 for r in range(radius + 1)
+                 for bits in combinations(range(CHUNK_BITS), r))
+
+
+class HashIndex:
+    def __init__(self):
+        self.hashes = {}  # item id -> hash
+        self.tables = [{} for _ in range(CHUNKS)]  # chunk value -> set of item ids
+
+    def __len__(self):
+        return len(self.hashes)
+
+    @staticmethod
+    def _chunks(value):
+        return [(value >> (i * CHUNK_BITS)) & CHUNK_MASK for i in range(CHUNKS)]
+
+    def add(self, item_id, value):
+        self.remove(item_id)
+        self.hashes[item_id] = value
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            table.setdefault(chunk, set()).add(item_id)
+
+    def remove(self, item_id):
+        value = self.hashes.pop(item_id, None)
+        if value is None:
+            return
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            bucket = table[chunk]
+            bucket.discard(item_id)
+            if not bucket:
+                del table[chunk]
+
+    def query(self, value, k=DUPLICATE_DISTANCE):
+        """[(item id, distance)] within k bits of value, closest first"""
+        matches = {}
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            for flip in _flips(k // CHUNKS):
+                for item_id in table.get(chunk ^ flip, ()):
+                    if item_id not in matches:
+                        distance = bin(self.hashes[item_id] ^ value).count('1')
+                        matches[item_id] = distance
+        return sorted(((item_id, distance) for item_id, distance in matches.items() if distance <= k),
+                      key=lambda match: (match[1], match[0]))
+
+
+def hash_index() -> HashIndex:
+    global _index, _built_at
+    ttl = current_app.config.get('DUPLICATES_TTL', 300)
+    if _index is None or time.monotonic() - _built_at > ttl:
+        index = HashIndex()
+        rows = db.session.execute(
+            select(Bug.id, Bug.image_hash).where(Bug.image_hash.isnot(None))
+            .execution_options(yield_per=10000)
+        )
+        for bug_id, value in rows:
+            index.add(bug_id, to_unsigned(value))
+        with _lock:
+            _index, _built_at = index, time.monotonic()
+    return _index
+
+
+def reset_hash_index():
+    global _index
+    with _lock:
+        _index = None
+
+
+def find_duplicates(value, k=DUPLICATE_DISTANCE, exclude=None):
+    """Bug ids whose photo is within k bits of value: [(bug_id, distance)], closest first"""
+    index = hash_index()
+    with _lock:
+        matches = index.query(to_unsigned(value), k)
+    return [match for match in matches if match[0] != exclude]
+
+
+@event.listens_for(Bug, 'after_insert')
+@event.listens_for(Bug, 'after_update')
+def _index_bug(mapper, connection, target):
+    # only a loaded hash - reading an expired one would reload it mid-flush
+    loaded = inspect(target).dict
+    if _index is None or 'image_hash' not in loaded:
+        return
+    _queue(object_session(target), target.id, loaded['image_hash'])
+
+
+@event.listens_for(Bug, 'after_delete')
+def _unindex_bug(mapper, connection, target):
+    if _index is not None:
+        _queue(object_session(target), target.id, None)
+
+
+def _queue(session, bug_id, value):
+    """value None = remove"""
+    session.info.setdefault('hash_index_changes', []).append((bug_id, value))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_after_commit(session):
+    changes = session.info.pop('hash_index_changes', None)
+    if not changes or _index is None:
+        return
+    with _lock:
+        for bug_id, value in changes:
+            if value is None:
+                _index.remove(bug_id)
+            else:
+                _index.add(bug_id, to_unsigned(value))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('hash_index_changes', None)
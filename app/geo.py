@@ -0,0 +1,86 @@
+"""
+Bugs Found Near Me
+
+Queries over Bug.geohash / Bug.region (battle_engine.geo):
+
+- bugs_near() reads only the geohash cells covering the search circle - a few
+  indexed range scans - and checks the real distance on those rows. With no
+  radius it finds the k nearest by widening the search circle until k bugs
+  are inside it
+- region_leaderboard() ranks the bugs of one REGION_PRECISION cell straight
+  off the (region, wins) index
+"""
+import math
+from collections import namedtuple
+
+from sqlalchemy import and_, func, or_, select
+
+from app import db
+from app.models import Bug
+from battle_engine import geo
+
+START_RADIUS_KM = 5.0
+MAX_RADIUS_KM = 20038.0  # half the equator - everything is within this
+
+Sighting = namedtuple('Sighting', ['bug_id', 'distance_km'])
+
+
+def _in_cells(cells):
+    return or_(*(and_(Bug.geohash >= low, Bug.geohash < high)
+                 for low, high in map(geo.prefix_range, cells)))
+
+
+def _within(latitude, longitude, radius_km):
+    """Every bug within radius_km as Sightings, unsorted"""
+    rows = db.session.execute(
+        select(Bug.id, Bug.latitude, Bug.longitude)
+        .where(_in_cells(geo.cover(latitude, longitude, radius_km)))
+    )
+    sightings = []
+    for bug_id, lat, lon in rows:
+        distance = geo.distance_km(latitude, longitude, lat, lon)
+        if distance <= radius_km:
+            sightings.append(Sighting(bug_id, distance))
+    return sightings
+
+
+def bugs_near(latitude, longitude, k=10, radius_km=None):
+    """
+    Up to k Sightings closest first - within radius_km if given, else the
+    k nearest anywhere
+    """
+    if radius_km is not None:
+        return sorted(_within(latitude, longitude, radius_km), key=lambda s: (s.distance_km, s.bug_id))[:k]
+
+    radius = START_RADIUS_KM
+    while True:
+        sightings = _within(latitude, longitude, radius)
+        # everything closer than radius has been seen, so the k closest of
+        # them are the true k nearest
+        if len(sightings) >= k or radius >= MAX_RADIUS_KM:
+            return sorted(sightings, key=lambda s: (s.distance_km, s.bug_id))[:k]
+        # grow to roughly where k bugs should be at the density seen so far
+        growth = 4.0 if not sightings else max(2.0, 1.2 * math.sqrt(k / len(sightings)))
+        radius = min(radius * growth, MAX_RADIUS_KM)
+
+
+def region_of(latitude, longitude):
+    return geo.encode(latitude, longitude, geo.REGION_PRECISION)
+
+
+def region_leaderboard(region, limit=10):
+    """{'region', 'bugs', 'wins', 'bounds', 'top': [Bug rows by wins]}"""
+    bugs, wins = db.session.execute(
+        select(func.count(), func.coalesce(func.sum(Bug.wins), 0)).where(Bug.region == region)
+    ).one()
+    top = db.session.execute(
+        select(Bug.id, Bug.nickname, Bug.species, Bug.wins, Bug.losses, Bug.rating)
+        .where(Bug.region == region).order_by(Bug.wins.desc(), Bug.id).limit(limit)
+    ).all()
+    return {
+        'region': region,
+        'bounds': geo.bounds(region),
+        'bugs': bugs,
+        'wins': wins,
+        'top': [row._asdict() for row in top],
+    }
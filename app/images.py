@@ -0,0 +1,228 @@
+"""
+Image Pipeline
+
+Bug photos are stored by content hash under UPLOAD_FOLDER:
+
+    originals/ab/abcdef....jpg        the upload, byte for byte
+    thumbs/ab/abcdef..._320.webp      one WebP + one JPEG per THUMBNAIL_SIZES
+    thumbs/ab/abcdef..._320.jpg
+
+- save_upload() streams the upload to disk in chunks while hashing it, so
+  nothing is buffered in memory and a photo uploaded twice is stored once
+- thumbnails are built on a thread pool (IMAGE_WORKERS threads, 0 = inline)
+  so the request never waits for Pillow
+- latitude / longitude / found_date are read from EXIF when the photo has them
+- every upload gets a perceptual hash and is checked against the photos
+  already on file (app.duplicates) - StoredImage.duplicates lists near matches
+
+Bug.image_path holds the path relative to UPLOAD_FOLDER (originals/...).
+Use thumbnail_url(bug.image_path, 320) in templates - it falls back to the
+original until the thumbnail exists.
+"""
+import hashlib
+import os
+import threading
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app, url_for
+from PIL import ExifTags, Image, ImageOps, UnidentifiedImageError
+
+from app.duplicates import find_duplicates, to_signed
+
+THUMBNAIL_SIZES = (128, 320, 640)
+THUMBNAIL_FORMATS = {'webp': ('WEBP', {'quality': 80}),
+                     'jpg': ('JPEG', {'quality': 85, 'progressive': True})}
+CHUNK_SIZE = 64 * 1024
+
+StoredImage = namedtuple('StoredImage', ['digest', 'image_path', 'created', 'exif',
+                                         'image_hash', 'duplicates'])
+ExifData = namedtuple('ExifData', ['latitude', 'longitude', 'found_date'])
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def upload_root():
+    return os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+
+
+def _extension(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return 'jpg' if extension == 'jpeg' else extension
+
+
+def original_path(digest, extension):
+    return os.path.join('originals', digest[:2], f'{digest}.{extension}')
+
+
+def thumbnail_path(digest, size, extension='webp'):
+    return os.path.join('thumbs', digest[:2], f'{digest}_{size}.{extension}')
+
+
+def save_upload(file_storage) -> StoredImage:
+    """
+    Store an uploaded werkzeug FileStorage by content hash.
+
+    Raises ValueError for a disallowed extension or a file Pillow can't read.
+    """
+    extension = _extension(file_storage.filename or '')
+    allowed = {_extension(f'.{ext}') for ext in current_app.config['ALLOWED_EXTENSIONS']}
+    if extension not in allowed:
+        raise ValueError(f'Only {", ".join(sorted(allowed))} images are allowed')
+
+    root = upload_root()
+    tmp_dir = os.path.join(root, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+
+    sha = hashlib.sha256()
+    try:
+        with open(tmp_path, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                out.write(chunk)
+        with Image.open(tmp_path) as image:
+            exif = _read_exif(image)
+            perceptual = image_hash(image)
+    except (UnidentifiedImageError, OSError) as e:
+        _discard(tmp_path)
+        raise ValueError('That file is not an image we can read') from e
+
+    digest = sha.hexdigest()
+    relative = original_path(digest, extension)
+    final = os.path.join(root, relative)
+    created = not os.path.exists(final)
+    if created:
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.replace(tmp_path, final)
+    else:
+        _discard(tmp_path)  # same photo already stored
+
+    queue_thumbnails(relative)
+    return StoredImage(digest, relative, created, exif, perceptual, find_duplicates(perceptual))
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _rational(value):
+    return float(value[0]) / float(value[1]) if isinstance(value, tuple) else float(value)
+
+
+def _gps_degrees(parts, ref):
+    degrees, minutes, seconds = (_rational(part) for part in parts)
+    value = degrees + minutes / 60 + seconds / 3600
+    return -value if ref in ('S', 'W') else value
+
+
+def read_exif(path) -> ExifData:
+    """GPS position and capture time from a photo's EXIF (None where missing)"""
+    with Image.open(path) as image:
+        return _read_exif(image)
+
+
+def _read_exif(image):
+    latitude = longitude = found_date = None
+    exif = image.getexif()
+    gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    try:
+        if ExifTags.GPS.GPSLatitude in gps and ExifTags.GPS.GPSLongitude in gps:
+            latitude = _gps_degrees(gps[ExifTags.GPS.GPSLatitude], gps.get(ExifTags.GPS.GPSLatitudeRef))
+            longitude = _gps_degrees(gps[ExifTags.GPS.GPSLongitude], gps.get(ExifTags.GPS.GPSLongitudeRef))
+    except (TypeError, ValueError, ZeroDivisionError):
+        latitude = longitude = None  # malformed GPS block - ignore it
+
+    taken = (exif.get_ifd(ExifTags.IFD.Exif).get(ExifTags.Base.DateTimeOriginal)
+             or exif.get(ExifTags.Base.DateTime))
+    if taken:
+        try:
+            found_date = datetime.strptime(str(taken).strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+        except ValueError:
+            pass
+    return ExifData(latitude, longitude, found_date)
+
+
+def image_hash(image):
+    """
+    64-bit difference hash (dHash) as a signed integer for Bug.image_hash:
+    shrink to 9x8 greyscale, one bit per "is this pixel brighter than its
+    right-hand neighbour"
+    """
+    pixels = list(ImageOps.exif_transpose(image).convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            left = pixels[row * 9 + column]
+            value = (value << 1) | (left > pixels[row * 9 + column + 1])
+    return to_signed(value)
+
+
+def apply_exif(bug, exif):
+    """Fill a bug's location/date from EXIF, without overwriting what the user entered"""
+    if bug.latitude is None and bug.longitude is None and exif.latitude is not None:
+        bug.latitude, bug.longitude = exif.latitude, exif.longitude
+    if bug.found_date is None and exif.found_date is not None:
+        bug.found_date = exif.found_date
+
+
+def build_thumbnails(root, image_path):
+    """Write every missing thumbnail for an original. Safe to run twice"""
+    digest = os.path.basename(image_path).split('.', 1)[0]
+    wanted = [(size, extension) for size in THUMBNAIL_SIZES for extension in THUMBNAIL_FORMATS
+              if not os.path.exists(os.path.join(root, thumbnail_path(digest, size, extension)))]
+    if not wanted:
+        return
+    with Image.open(os.path.join(root, image_path)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for size, extension in wanted:
+            thumb = image.copy()
+            thumb.thumbnail((size, size))
+            final = os.path.join(root, thumbnail_path(digest, size, extension))
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            pillow_format, options = THUMBNAIL_FORMATS[extension]
+            tmp = f'{final}.{uuid.uuid4().hex}.tmp'
+            thumb.save(tmp, pillow_format, **options)
+            os.replace(tmp, final)
+
+
+def _thumbnail_job(root, image_path, logger):
+    try:
+        build_thumbnails(root, image_path)
+    except Exception:
+        logger.exception('Thumbnail build failed for %s', image_path)
+
+
+def queue_thumbnails(image_path):
+    """Build thumbnails in the background (inline when IMAGE_WORKERS is 0)"""
+    global _executor
+    root = upload_root()
+    workers = current_app.config.get('IMAGE_WORKERS', 2)
+    if workers <= 0:
+        build_thumbnails(root, image_path)
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbs')
+    return _executor.submit(_thumbnail_job, root, image_path, current_app.logger)
+
+
+def thumbnail_url(image_path, size, extension='webp'):
+    """URL of the smallest thumbnail >= size, or of the original if it isn't built yet"""
+    if not image_path:
+        return ''
+    size = next((s for s in THUMBNAIL_SIZES if s >= size), THUMBNAIL_SIZES[-1])
+    digest = os.path.basename(image_path).split('.', 1)[0]
+    thumb = thumbnail_path(digest, size, extension)
+    if os.path.exists(os.path.join(upload_root(), thumb)):
+        return url_for('images.uploaded_file', filename=thumb.replace(os.sep, '/'))
+    return url_for('images.uploaded_file', filename=image_path.replace(os.sep, '/'))
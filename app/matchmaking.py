@@ -0,0 +1,148 @@
+"""
+Matchmaking
+
+Per-process MatchIndex (battle_engine.matchmaking) over every bug, one keyed
+by Elo rating and one by power level, so finding a fair opponent never
+touches the Bug table:
+
+- ORM inserts/updates/deletes of bugs are picked up by the mapper events below
+- rating/tier changes from the battle write path come in via bugs_rerated()
+
+Like the tier index the indexes are built on first use and rebuilt every
+MATCHMAKING_TTL seconds so worker processes converge on each other's writes,
+and changes wait in the session until its transaction commits (dropped on
+rollback).
+"""
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from app.models import Bug
+from battle_engine.matchmaking import MatchIndex
+from battle_engine.ratings import DEFAULT_RATING
+
+MATCH_KEYS = ('rating', 'power')
+
+_indexes = None
+_built_at = 0.0
+_lock = threading.Lock()
+
+
+def _power(attack, defense, speed):
+    return (attack or 0) + (defense or 0) + (speed or 0)
+
+
+def _rating(rating):
+    return rating if rating is not None else DEFAULT_RATING
+
+
+def match_indexes():
+    """{'rating': MatchIndex, 'power': MatchIndex}"""
+    global _indexes, _built_at
+    ttl = current_app.config.get('MATCHMAKING_TTL', 300)
+    if _indexes is None or time.monotonic() - _built_at > ttl:
+        indexes = {key: MatchIndex() for key in MATCH_KEYS}
+        for bug_id, rating, attack, defense, speed, tier, size_class in db.session.execute(
+            select(Bug.id, Bug.rating, Bug.attack, Bug.defense, Bug.speed,
+                   Bug.tier, Bug.size_class)
+        ):
+            indexes['rating'].upsert(bug_id, _rating(rating), tier, size_class)
+            indexes['power'].upsert(bug_id, _power(attack, defense, speed), tier, size_class)
+        with _lock:
+            _indexes, _built_at = indexes, time.monotonic()
+    return _indexes
+
+
+def reset_match_indexes():
+    global _indexes
+    with _lock:
+        _indexes = None
+
+
+def find_opponents(bug_id, k=5, by='rating', tier=None, size_class=None, exclude=()):
+    """
+    Ids of the k bugs closest to bug_id by rating or power, closest first.
+
+    Raises KeyError for an unknown bug and ValueError for an unknown key.
+    """
+    if by not in MATCH_KEYS:
+        raise ValueError(f'Unknown matchmaking key: {by}')
+    index = match_indexes()[by]
+    with _lock:
+        return index.nearest(index.key_of(bug_id), k, tier, size_class,
+                             exclude=(bug_id, *exclude))
+
+
+def bugs_rerated(ratings, tiers):
+    """Battle write path hook - {bug_id: new rating}, {bug_id: tier}"""
+    if _indexes is not None:
+        _queue(db.session, _rerate, dict(ratings), dict(tiers))
+
+
+def _rerate(indexes, ratings, tiers):
+    for by, index in indexes.items():
+        for bug_id in set(ratings) | set(tiers):
+            if bug_id not in index:
+                continue
+            key, tier, size_class = index.entries[bug_id]
+            if by == 'rating':
+                key = ratings.get(bug_id, key)
+            index.upsert(bug_id, key, tiers.get(bug_id, tier), size_class)
+
+
+@event.listens_for(Bug, 'after_insert')
+@event.listens_for(Bug, 'after_update')
+def _index_bug(mapper, connection, target):
+    if _indexes is None:
+        return
+    # only trust loaded attributes - ratings also move through Core updates,
+    # and touching an expired attribute here would reload it mid-flush
+    loaded = inspect(target).dict
+    fields = {name: loaded[name] for name in ('rating', 'attack', 'defense', 'speed', 'tier', 'size_class')
+              if name in loaded}
+    _queue(object_session(target), _upsert, target.id, fields)
+
+
+def _upsert(indexes, bug_id, loaded):
+    for by, index in indexes.items():
+        key, tier, size_class = index.entries.get(bug_id, (None, None, None))
+        if by == 'rating' and 'rating' in loaded:
+            key = _rating(loaded['rating'])
+        elif by == 'power' and all(field in loaded for field in ('attack', 'defense', 'speed')):
+            key = _power(loaded['attack'], loaded['defense'], loaded['speed'])
+        index.upsert(bug_id, key if key is not None else 0,
+                     loaded.get('tier', tier), loaded.get('size_class', size_class))
+
+
+@event.listens_for(Bug, 'after_delete')
+def _unindex_bug(mapper, connection, target):
+    if _indexes is not None:
+        _queue(object_session(target), _remove, target.id)
+
+
+def _remove(indexes, bug_id):
+    for index in indexes.values():
+        index.remove(bug_id)
+
+
+def _queue(session, change, *args):
+    session.info.setdefault('match_index_changes', []).append((change, args))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_after_commit(session):
+    changes = session.info.pop('match_index_changes', None)
+    if not changes or _indexes is None:
+        return
+    with _lock:
+        for change, args in changes:
+            change(_indexes, *args)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('match_index_changes', None)
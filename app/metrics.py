@@ -0,0 +1,459 @@
+"""
+Performance metrics, served in Prometheus text format on /metrics
+
+Recorded in each process. Under gunicorn any worker may answer a scrape, so
+with METRICS_MULTIPROC_DIR set every process also writes its series to a
+file there (at most every METRICS_FLUSH_SECONDS, after a request or a
+record_fights()), and /metrics adds up its own live numbers and every other
+process's file. Workers that exit are folded into an archive file by the
+gunicorn master (mark_process_dead(), see gunicorn.conf.py), so totals never
+go backwards while the server runs. Without the directory each process
+serves only its own numbers:
+
+- bugbrawl_request_seconds             latency histogram per endpoint + method
+- bugbrawl_requests_total              per endpoint, method and status code
+- bugbrawl_request_sql_statements      SQL statements per request, per endpoint
+- bugbrawl_sql_seconds_total           time spent in SQL, per endpoint
+- bugbrawl_template_seconds            render time per template
+- bugbrawl_section_seconds             timed() blocks - load_user, arena_snapshot...
+- bugbrawl_engine_fights_total /
+  bugbrawl_engine_seconds_total        fights run by the battle engine and the
+                                       time they took (record_fights())
+- bugbrawl_engine_fights_per_second    the two above divided
+
+Settings (defaults set in init_app):
+
+- METRICS_ENABLED           on unless turned off
+- METRICS_MULTIPROC_DIR     shared directory for multi-process totals
+                            (default: the METRICS_MULTIPROC_DIR env var,
+                            which gunicorn.conf.py sets)
+- METRICS_FLUSH_SECONDS     how stale another process's numbers may be
+- METRICS_PROFILE_SLOW_MS   0 = off. Otherwise every request's thread is
+                            sampled every METRICS_PROFILE_INTERVAL seconds and
+                            requests slower than this many ms leave a
+                            collapsed-stack file in METRICS_PROFILE_DIR - feed
+                            it to flamegraph.pl or speedscope
+
+Put /metrics behind the proxy's allow-list - it is not login protected.
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import Response, current_app, g, has_app_context, has_request_context, request, \
+    template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+ARCHIVE_FILE = 'archive.json'  # series of processes that have exited
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_label_value(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+    def snapshot(self):
+        """Copy of every series, {labels: value}"""
+        with self.lock:
+            return {labels: list(value) if isinstance(value, list) else value
+                    for labels, value in self.series.items()}
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self.series.get(labels, 0)
+
+    def render(self, series=None):
+        series = sorted((self.snapshot() if series is None else series).items())
+        return self.header() + [f'{self.name}{_labels(self.label_names, labels)} {_number(value)}'
+                                for labels, value in series]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, labels, value):
+        with self.lock:
+            counts = self.series.get(labels)
+            if counts is None:
+                # one slot per bucket, then the total count and the running sum
+                counts = self.series[labels] = [0] * len(self.buckets) + [0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-2] += 1
+            counts[-1] += value
+
+    def render(self, series=None):
+        series = sorted((self.snapshot() if series is None else series).items())
+        lines = self.header()
+        for labels, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", "+Inf")])} {counts[-2]}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {_number(counts[-1])}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {counts[-2]}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram('bugbrawl_request_seconds', 'Request latency.', ('endpoint', 'method'))
+REQUESTS = Counter('bugbrawl_requests_total', 'Requests served.', ('endpoint', 'method', 'status'))
+REQUEST_SQL = Histogram('bugbrawl_request_sql_statements', 'SQL statements per request.', ('endpoint',),
+                        buckets=STATEMENT_BUCKETS)
+SQL_SECONDS = Counter('bugbrawl_sql_seconds_total', 'Time spent executing SQL in requests.', ('endpoint',))
+TEMPLATE_SECONDS = Histogram('bugbrawl_template_seconds', 'Template render time.', ('template',))
+SECTION_SECONDS = Histogram('bugbrawl_section_seconds', 'Time spent in timed() sections.', ('section',))
+ENGINE_FIGHTS = Counter('bugbrawl_engine_fights_total', 'Fights run by the battle engine.', ('source',))
+ENGINE_SECONDS = Counter('bugbrawl_engine_seconds_total', 'Time the battle engine spent fighting.',
+                         ('source',))
+METRICS = (REQUEST_SECONDS, REQUESTS, REQUEST_SQL, SQL_SECONDS, TEMPLATE_SECONDS, SECTION_SECONDS,
+           ENGINE_FIGHTS, ENGINE_SECONDS)
+
+
+@contextmanager
+def timed(section):
+    """Time a block (or, as a decorator, a function) into bugbrawl_section_seconds"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        SECTION_SECONDS.observe((section,), time.perf_counter() - started)
+
+
+def record_fights(source, fights, seconds):
+    """Count engine work - source is where it ran (battle, tournament...)"""
+    ENGINE_FIGHTS.inc((source,), fights)
+    ENGINE_SECONDS.inc((source,), seconds)
+    _maybe_flush()
+
+
+def _add(totals, data):
+    """Add one process's file contents ({name: [[labels, value]...]}) into totals ({name: {labels: value}})"""
+    for name, rows in data.items():
+        series = totals.setdefault(name, {})
+        for labels, value in rows:
+            labels = tuple(labels)
+            current = series.get(labels)
+            if current is None:
+                series[labels] = value
+            elif isinstance(value, list):
+                series[labels] = [a + b for a, b in zip(current, value)]
+            else:
+                series[labels] = current + value
+
+
+def _dump(totals):
+    return {name: [[list(labels), value] for labels, value in series.items()]
+            for name, series in totals.items()}
+
+
+def _write(path, data):
+    """Atomic write - readers see the old file or the new one, never half of one"""
+    temporary = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.tmp')
+    with open(temporary, 'w') as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+
+def _read(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+_process_file = None  # (pid, file name) - a forked worker gets a name of its own
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+
+
+def _own_file():
+    global _process_file
+    if _process_file is None or _process_file[0] != os.getpid():
+        # the start time keeps a reused pid from writing over a dead worker's file
+        _process_file = (os.getpid(), f'metrics-{os.getpid()}-{time.time_ns()}.json')
+    return _process_file[1]
+
+
+def flush(directory):
+    """Write this process's series to its file in directory"""
+    _write(os.path.join(directory, _own_file()),
+           _dump({metric.name: metric.snapshot() for metric in METRICS}))
+
+
+def _maybe_flush():
+    global _last_flush
+    directory = current_app.config.get('METRICS_MULTIPROC_DIR') if has_app_context() else None
+    if not directory or time.monotonic() - _last_flush < current_app.config['METRICS_FLUSH_SECONDS']:
+        return
+    if _flush_lock.acquire(blocking=False):  # another thread is writing it already
+        try:
+            _last_flush = time.monotonic()
+            flush(directory)
+        finally:
+            _flush_lock.release()
+
+
+def _other_processes(directory, totals):
+    """Add the archive and every other live process's file into totals"""
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    while True:
+        # list first: a file that is gone by the time the archive is read has
+        # been folded into it, and one that vanishes later raises below
+        paths = glob.glob(os.path.join(directory, 'metrics-*.json'))
+        archive = _read(archive_path) if os.path.exists(archive_path) else {'absorbed': [], 'metrics': {}}
+        found = {}
+        _add(found, archive['metrics'])
+        skip = set(archive['absorbed']) | {_own_file()}
+        try:
+            for path in paths:
+                if os.path.basename(path) not in skip:
+                    _add(found, _read(path))
+        except FileNotFoundError:
+            continue  # folded into the archive since we read it - start over
+        _add(totals, _dump(found))
+        return
+
+
+def _forget_parent():
+    """A forked child counts from zero - what the parent recorded is the parent's to report"""
+    global _process_file, _last_flush, _flush_lock
+    for metric in METRICS:
+        metric.series = {}
+        metric.lock = threading.Lock()
+    _process_file, _last_flush, _flush_lock = None, 0.0, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_parent)
+
+
+def mark_process_dead(pid, directory):
+    """
+    gunicorn child_exit hook (runs in the master): fold an exited worker's
+    file into the archive, then remove it. The archive names the files it
+    absorbed so a scrape in between doesn't count them twice.
+    """
+    paths = glob.glob(os.path.join(directory, f'metrics-{pid}-*.json'))
+    if not paths:
+        return
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    archive = _read(archive_path) if os.path.exists(archive_path) else {'absorbed': [], 'metrics': {}}
+    totals = {}
+    _add(totals, archive['metrics'])
+    for path in paths:
+        _add(totals, _read(path))
+    _write(archive_path, {'absorbed': [os.path.basename(path) for path in paths], 'metrics': _dump(totals)})
+    for path in paths:
+        os.remove(path)
+
+
+def clear_directory(directory):
+    """Start from zero - gunicorn on_starting hook"""
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')) + [os.path.join(directory, ARCHIVE_FILE)]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def render_metrics():
+    totals = {metric.name: metric.snapshot() for metric in METRICS}
+    directory = current_app.config.get('METRICS_MULTIPROC_DIR') if has_app_context() else None
+    if directory and os.path.isdir(directory):
+        _other_processes(directory, totals)
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render(totals[metric.name]))
+    lines += ['# HELP bugbrawl_engine_fights_per_second Engine throughput while fighting.',
+              '# TYPE bugbrawl_engine_fights_per_second gauge']
+    for (source,), fights in sorted(totals[ENGINE_FIGHTS.name].items()):
+        seconds = totals[ENGINE_SECONDS.name].get((source,), 0)
+        rate = fights / seconds if seconds > 0 else 0.0
+        lines.append(f'bugbrawl_engine_fights_per_second{_labels(("source",), (source,))} {_number(rate)}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view():
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+
+def _endpoint():
+    return request.endpoint or '<unmatched>'
+
+
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context() and 'metrics_started' in g:
+        g.metrics_sql_count += 1
+        g.metrics_sql_seconds += time.perf_counter() - context._metrics_started
+
+
+def _template_started(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('metrics_templates', []).append(time.perf_counter())
+
+
+def _template_done(sender, template, context, **extra):
+    if has_request_context() and g.get('metrics_templates'):
+        TEMPLATE_SECONDS.observe((template.name or '<string>',), time.perf_counter() - g.metrics_templates.pop())
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_sql_count = 0
+    g.metrics_sql_seconds = 0.0
+    if current_app.config['METRICS_PROFILE_SLOW_MS']:
+        # started on first use so a preloading server starts it in each worker
+        _start_sampler(current_app.config['METRICS_PROFILE_INTERVAL']).watch()
+
+
+def _finish_request(response):
+    if 'metrics_started' not in g or request.endpoint == 'metrics':
+        return response
+    endpoint = _endpoint()
+    REQUEST_SECONDS.observe((endpoint, request.method), time.perf_counter() - g.metrics_started)
+    REQUESTS.inc((endpoint, request.method, str(response.status_code)))
+    REQUEST_SQL.observe((endpoint,), g.metrics_sql_count)
+    SQL_SECONDS.inc((endpoint,), g.metrics_sql_seconds)
+    _maybe_flush()
+    return response
+
+
+def _finish_profile(error=None):
+    if _sampler is None or 'metrics_started' not in g:
+        return
+    stacks = _sampler.unwatch()
+    slow_ms = current_app.config['METRICS_PROFILE_SLOW_MS']
+    elapsed_ms = (time.perf_counter() - g.metrics_started) * 1000
+    if stacks and slow_ms and elapsed_ms >= slow_ms:
+        _dump_profile(stacks, elapsed_ms)
+
+
+class _Sampler(threading.Thread):
+    """Samples the stacks of the request threads that are being watched"""
+
+    def __init__(self, interval):
+        super().__init__(name='metrics-sampler', daemon=True)
+        self.interval = interval
+        self.watched = {}  # thread id -> Counter of collapsed stacks
+        self.lock = threading.Lock()
+
+    def watch(self):
+        with self.lock:
+            self.watched[threading.get_ident()] = StackCounter()
+
+    def unwatch(self):
+        with self.lock:
+            return self.watched.pop(threading.get_ident(), None)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.watched:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self.watched.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[_collapse(frame)] += 1
+
+
+def _collapse(frame):
+    """root;...;leaf - one entry per frame as module:function"""
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _dump_profile(stacks, elapsed_ms):
+    directory = current_app.config['METRICS_PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    path = os.path.join(directory, f'{stamp}-{_endpoint()}-{elapsed_ms:.0f}ms.folded')
+    with open(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    current_app.logger.info('Slow request %s (%.0fms) profiled to %s', request.path, elapsed_ms, path)
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def _start_sampler(interval):
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = _Sampler(interval)
+            _sampler.start()
+    return _sampler
+
+
+def init_app(app):
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('METRICS_MULTIPROC_DIR', os.environ.get('METRICS_MULTIPROC_DIR'))
+    app.config.setdefault('METRICS_FLUSH_SECONDS', 1.0)
+    app.config.setdefault('METRICS_PROFILE_SLOW_MS', 0)
+    app.config.setdefault('METRICS_PROFILE_INTERVAL', 0.005)
+    app.config.setdefault('METRICS_PROFILE_DIR', 'profiles')
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_done, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    if app.config['METRICS_PROFILE_SLOW_MS']:
+        app.teardown_request(_finish_profile)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
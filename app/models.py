@@ -5,11 +5,17 @@ SQLAlchemy handles all the SQL for you!
 """
 from datetime import datetime
 from app import db, login_manager
+from app.metrics import timed
 from flask_login import UserMixin
+from sqlalchemy.orm import validates
+from battle_engine import geo
+from battle_engine.ratings import DEFAULT_RATING
+from battle_engine.tables import attack_type_code, defense_type_code, size_code
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # This tells Flask how to load a user from the database
 @login_manager.user_loader
+@timed('load_user')
 def load_user(user_id):
     return User.query.get(int(user_id))
 
@@ -35,11 +41,20 @@ class User(UserMixin, db.Model):
 
 
 class Bug(db.Model):
+    # region + wins: a regional leaderboard is an index range read, no sort
+    __table_args__ = (
+        db.Index('ix_bug_region_wins', 'region', 'wins'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     
     nickname = db.Column(db.String(100), nullable=False)
+    # lower-cased nickname for indexed, case-insensitive prefix search (battle picker)
+    nickname_key = db.Column(db.String(100), index=True)
     species = db.Column(db.String(200))  # Scientific or common name
     image_path = db.Column(db.String(255), nullable=False)
+    # perceptual (dHash) of the photo, for near-duplicate checks (app/duplicates.py)
+    image_hash = db.Column(db.BigInteger)
     description = db.Column(db.Text)
     
     # Combat stats (1-100 scale)
@@ -59,6 +74,12 @@ class Bug(db.Model):
     attack_type = db.Column(db.String(50))   # e.g., piercing, crushing, slashing, venom, chemical, grappling
     defense_type = db.Column(db.String(50))  # e.g., hard_shell, segmented_armor, evasive, hairy_spiny, toxic_skin, thick_hide
     size_class = db.Column(db.String(20))    # tiny, small, medium, large, massive
+
+    # Integer codes for the three fields above (battle_engine.tables) - kept in
+    # sync by the validators below so the engine never handles strings
+    attack_type_code = db.Column(db.SmallInteger, default=0)
+    defense_type_code = db.Column(db.SmallInteger, default=0)
+    size_code = db.Column(db.SmallInteger, default=0)
     
     xfactor = db.Column(db.Float, default=0.0)  # -5.0 to +5.0 hidden modifier
     xfactor_reason = db.Column(db.Text)
@@ -75,26 +96,32 @@ class Bug(db.Model):
     location_found = db.Column(db.String(200))
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
+    # geohash of latitude/longitude and its REGION_PRECISION prefix, kept in
+    # sync by the validators below - "near me" and regional leaderboards (app/geo.py)
+    geohash = db.Column(db.String(12), index=True)
+    region = db.Column(db.String(12))
     found_date = db.Column(db.DateTime)
 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    submission_date = db.Column(db.DateTime, default=datetime.utcnow)
+    submission_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Tier system (for tournaments)
     tier = db.Column(db.String(20))  # 'uber', 'ou', 'uu', 'ru', 'nu', 'zu'
+    # Elo rating, updated on every battle - tiers are rating percentiles (app/ratings.py)
+    rating = db.Column(db.Float, default=DEFAULT_RATING, index=True)
 
   # Battle record or win %
-    wins = db.Column(db.Integer, default=0),
+    wins = db.Column(db.Integer, default=0, index=True)
     losses = db.Column(db.Integer, default=0)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    submission_date = db.Column(db.DateTime, default=datetime.utcnow)
-    red_corner_bug = db.relationship('Battle', 
-                                      foreign_keys='Battle.red_corner_bug_id',
-                                      backref='bluebug', 
-                                      lazy='dynamic')
-    battles_as_bug2 = db.relationship('Battle',
-                                      foreign_keys='Battle.blue_corner_bug__id', 
-                                      backref='redbug',
+    submission_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    battles_as_red = db.relationship('Battle',
+                                     foreign_keys='Battle.red_corner_bug_id',
+                                     back_populates='red_corner_bug',
+                                     lazy='dynamic')
+    battles_as_blue = db.relationship('Battle',
+                                      foreign_keys='Battle.blue_corner_bug__id',
+                                      back_populates='blue_corner_bug',
                                       lazy='dynamic')
     
     @property
@@ -109,6 +136,37 @@ class Bug(db.Model):
     def __repr__(self):
         return f'<Bug {self.nickname}>'
 
+    @validates('nickname')
+    def _set_nickname_key(self, key, value):
+        self.nickname_key = (value or '').lower()
+        return value
+
+    @validates('attack_type')
+    def _set_attack_type_code(self, key, value):
+        self.attack_type_code = attack_type_code(value)
+        return value
+
+    @validates('defense_type')
+    def _set_defense_type_code(self, key, value):
+        self.defense_type_code = defense_type_code(value)
+        return value
+
+    @validates('size_class')
+    def _set_size_code(self, key, value):
+        self.size_code = size_code(value)
+        return value
+
+    @validates('latitude', 'longitude')
+    def _set_geohash(self, key, value):
+        latitude = value if key == 'latitude' else self.latitude
+        longitude = value if key == 'longitude' else self.longitude
+        if latitude is None or longitude is None:
+            self.geohash = self.region = None
+        else:
+            self.geohash = geo.encode(latitude, longitude)
+            self.region = self.geohash[:geo.REGION_PRECISION]
+        return value
+
     def generate_flair(self):
         """Auto-generate flair based on performance"""
         if self.win_rate >= 1:
@@ -127,40 +185,41 @@ class Bug(db.Model):
             self.flair = Null
 
 class Species(db.Model):
-  #taxonomy api still tbd
-  id = db.Column(db.Integer, primary_key=True)
-  scientific_name = db.Column(db.String(200))
-  common_name = db.Column(db.String(200))
-  genus = db.Column(db.String(200))
-  family = db.Column(db.String(200))
-  species = db.Column(db.String(200))
-  descrition = db.Column(db.String(200))
-  habitat = db.Column(db.String(200))
-  diet = db.Column(db.String(200)) #<-maybe used in matchup advantage?
-  avg_size = db.Column(db.Integer(5))
-  avg_weight = db.Column(db.Integer(5))
-  
-  #combat traits for zero sum game    
+    #taxonomy api still tbd
+    id = db.Column(db.Integer, primary_key=True)
+    scientific_name = db.Column(db.String(200))
+    common_name = db.Column(db.String(200))
+    genus = db.Column(db.String(200))
+    family = db.Column(db.String(200))
+    species = db.Column(db.String(200))
+    descrition = db.Column(db.String(200))
+    habitat = db.Column(db.String(200))
+    diet = db.Column(db.String(200)) #<-maybe used in matchup advantage?
+    avg_size = db.Column(db.Integer)
+    avg_weight = db.Column(db.Integer)
+
+    #combat traits for zero sum game
     has_venom = db.Column(db.Boolean, default=False)
     has_pincers = db.Column(db.Boolean, default=False)
     has_stinger = db.Column(db.Boolean, default=False)
     can_fly = db.Column(db.Boolean, default=False)
     has_armor = db.Column(db.Boolean, default=False)
 
-        # API references
+    # API references
     gbif_id = db.Column(db.String(100))
     inaturalist_id = db.Column(db.String(100))
     wikipedia_url = db.Column(db.String(500))
     data_source = db.Column(db.String(100))
 
-    bugs = db.relationship('Bug', lazy='dynamic')
+    # Bug.species is free text for now, so there is no bugs relationship -
+    # add one with a species_id FK on Bug once bugs get linked to a row here
 
     def add_to_dict(self):
-      return{
+        return {
             'id': self.id,
             'scientific_name': self.scientific_name,
             'common_name': self.common_name,
-            'order': self.order,
+            'genus': self.genus,
             'family': self.family,
             'characteristics': {
                 'has_venom': self.has_venom,
@@ -169,19 +228,174 @@ class Species(db.Model):
                 'can_fly': self.can_fly,
                 'has_armor': self.has_armor
             }
-      }
+        }
 
 class Battle(db.Model):
+    # (column, battle_date, id) composites serve both the FK lookups and the
+    # newest-first keyset pagination of /battles and per-bug history
+    __table_args__ = (
+        db.Index('ix_battle_battle_date_id', 'battle_date', 'id'),
+        db.Index('ix_battle_red_corner_date', 'red_corner_bug_id', 'battle_date', 'id'),
+        db.Index('ix_battle_blue_corner_date', 'blue_corner_bug__id', 'battle_date', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     
     # The two bugs fighting
     red_corner_bug_id = db.Column(db.Integer, db.ForeignKey('bug.id'), nullable=False)
     blue_corner_bug__id = db.Column(db.Integer, db.ForeignKey('bug.id'), nullable=False)
-    winner_id = db.Column(db.Integer, db.ForeignKey('bug.id'))
+    winner_id = db.Column(db.Integer, db.ForeignKey('bug.id'), index=True)
+    # RNG seed + packed event log (battle_engine.combat) - the text narrative is
+    # rendered from these when the battle is viewed. narrative only holds text
+    # from battles recorded before the log existed
+    seed = db.Column(db.Integer)
+    events = db.Column(db.LargeBinary)
     narrative = db.Column(db.Text)
     battle_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Tournament battles only
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournament.id'), index=True)
+    round_number = db.Column(db.Integer)
     
+    # many-to-one, so list views can joinedload() all three in the same query
+    red_corner_bug = db.relationship('Bug', foreign_keys=[red_corner_bug_id],
+                                     back_populates='battles_as_red')
+    blue_corner_bug = db.relationship('Bug', foreign_keys=[blue_corner_bug__id],
+                                      back_populates='battles_as_blue')
     winner = db.relationship('Bug', foreign_keys=[winner_id])
     
     def __repr__(self):
         return f'<Battle {self.id}: {self.red_corner_bug_id} vs {self.blue_corner_bug__id}>'
+
+
+class Tournament(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    format = db.Column(db.String(30), nullable=False)  # single_elimination, double_elimination, round_robin
+    status = db.Column(db.String(20), default='pending')  # pending, running, complete, failed
+    seed = db.Column(db.Integer)  # RNG seed - same seed + roster replays the same bracket
+    rounds_played = db.Column(db.Integer, default=0)
+    locked_at = db.Column(db.DateTime)  # claimed by a worker / last round saved (app/tournaments.py)
+    champion_id = db.Column(db.Integer, db.ForeignKey('bug.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+    champion = db.relationship('Bug', foreign_keys=[champion_id])
+    entries = db.relationship('TournamentEntry', backref='tournament', lazy='dynamic',
+                              order_by='TournamentEntry.placement')
+    battles = db.relationship('Battle', backref='tournament', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<Tournament {self.name}>'
+
+
+class TournamentEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournament.id'), nullable=False, index=True)
+    bug_id = db.Column(db.Integer, db.ForeignKey('bug.id'), nullable=False)
+    seed = db.Column(db.Integer, nullable=False)  # 1 = top seed
+    wins = db.Column(db.Integer, default=0)
+    losses = db.Column(db.Integer, default=0)
+    placement = db.Column(db.Integer)  # filled in when the tournament completes
+
+    bug = db.relationship('Bug')
+
+    def __repr__(self):
+        return f'<TournamentEntry {self.tournament_id}:{self.bug_id}>'
+
+
+class ArenaStats(db.Model):
+    """
+    Single row of running totals for the homepage and dashboard.
+    Kept up to date on every write by app/stats.py - never aggregated per request.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+
+    total_bugs = db.Column(db.Integer, default=0)
+    total_users = db.Column(db.Integer, default=0)
+    total_battles = db.Column(db.Integer, default=0)
+    total_tournaments = db.Column(db.Integer, default=0)
+
+    # per-stat max + running sum (avg = sum / total_bugs)
+    max_attack = db.Column(db.Integer, default=0)
+    max_defense = db.Column(db.Integer, default=0)
+    max_speed = db.Column(db.Integer, default=0)
+    max_health = db.Column(db.Integer, default=0)
+    sum_attack = db.Column(db.BigInteger, default=0)
+    sum_defense = db.Column(db.BigInteger, default=0)
+    sum_speed = db.Column(db.BigInteger, default=0)
+    sum_health = db.Column(db.BigInteger, default=0)
+
+    # top bugs by wins: [{'id', 'nickname', 'wins', 'losses'}, ...]
+    leaderboard = db.Column(db.JSON, default=list)
+
+    # a row that can't be trusted (e.g. marked by hand after raw SQL edits) -
+    # reads aggregate around it until `flask brawl refresh-stats` rebuilds it
+    stale = db.Column(db.Boolean, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+
+class StatJob(db.Model):
+    """
+    One queued stat generation for a bug (app/stat_jobs.py).
+    Workers claim pending rows whose run_after has passed; failures go back to
+    pending with a later run_after until max_attempts is used up.
+    """
+    __table_args__ = (
+        db.Index('ix_stat_job_claim', 'status', 'run_after', 'id'),
+        db.Index('ix_stat_job_provider_status', 'provider', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    bug_id = db.Column(db.Integer, db.ForeignKey('bug.id'), nullable=False, index=True)
+    provider = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    bug = db.relationship('Bug')
+
+    def __repr__(self):
+        return f'<StatJob {self.id} bug={self.bug_id} {self.status}>'
+
+
+class TaxonCache(db.Model):
+    """
+    Persistent cache of taxonomy provider answers (app/taxonomy.py), one row
+    per provider + normalized name. payload is None when the provider had no
+    match, so misses are cached too (for a shorter TTL).
+    """
+    __table_args__ = (
+        db.UniqueConstraint('provider', 'name', name='uq_taxon_cache_provider_name'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(50), nullable=False)
+    name = db.Column(db.String(200), nullable=False)
+    payload = db.Column(db.JSON)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<TaxonCache {self.provider}:{self.name}>'
+
+
+class Narration(db.Model):
+    """
+    Finished narrator output (app/narrator.py), keyed by a hash of the fight
+    log + both bugs + provider, so a battle is only ever narrated once.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), nullable=False, unique=True)
+    provider = db.Column(db.String(50), nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Narration {self.key[:12]} {self.provider}>'
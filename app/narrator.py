@@ -0,0 +1,234 @@
+"""
+Battle Narrator
+
+A model (NARRATOR_PROVIDER) retells a battle from its play-by-play. That can
+take seconds, so it never happens inside simulate_battle or the battle page:
+
+- the page opens /battle/<id>/narration, an SSE stream
+- the first listener starts generation on a background thread
+  (NARRATOR_WORKERS per process); chunks go out to every listener as they
+  arrive, and anyone joining late gets what was said so far first
+- the finished text is stored in Narration under narration_key() - a hash of
+  the fight log, both bugs and the provider - so a replayed or popular battle
+  is served from the table and never reaches the model twice
+
+Providers subclass NarratorProvider and are added with register_provider().
+LocalNarrator ('local') streams the play-by-play back word by word, for
+tests and development; OllamaNarrator talks to a local Ollama server.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Narration
+
+KEEPALIVE_SECONDS = 15  # SSE comment sent while the model is quiet, so proxies keep the stream open
+
+NarrationRequest = namedtuple('NarrationRequest', ['red_name', 'blue_name', 'winner_name', 'play_by_play'])
+
+_streams = {}  # narration key -> _Stream still being generated
+_lock = threading.Lock()
+_executor = None
+
+
+def prompt(request):
+    """The instruction sent to model-backed providers"""
+    return (
+        'You are the ringside announcer at a bug fighting arena. Retell this fight '
+        f'between {request.red_name} (red corner) and {request.blue_name} (blue corner) '
+        'as lively commentary in one or two short paragraphs. Stick to what happened '
+        f'and finish by naming the winner{f", {request.winner_name}" if request.winner_name else ""}.\n\n'
+        f'Play-by-play:\n{request.play_by_play}'
+    )
+
+
+class NarratorProvider:
+    """stream() yields the narration in chunks (tokens, words...) as they are produced"""
+    name = None
+
+    def stream(self, request, settings):
+        raise NotImplementedError
+
+
+class LocalNarrator(NarratorProvider):
+    """Deterministic stand-in: the play-by-play, one word at a time"""
+    name = 'local'
+
+    def stream(self, request, settings):
+        delay = settings.get('NARRATOR_LOCAL_DELAY', 0.0)
+        words = f'Welcome to the arena!\n{request.play_by_play}'.split(' ')
+        for number, word in enumerate(words):
+            if delay:
+                time.sleep(delay)
+            yield word if number == len(words) - 1 else f'{word} '
+
+
+class OllamaNarrator(NarratorProvider):
+    """Ollama /api/generate, which streams one JSON object per line"""
+    name = 'ollama'
+
+    def stream(self, request, settings):
+        body = json.dumps({'model': settings['NARRATOR_MODEL'], 'prompt': prompt(request),
+                           'stream': True}).encode()
+        http_request = Request(f"{settings['NARRATOR_OLLAMA_URL'].rstrip('/')}/api/generate", data=body,
+                               headers={'Content-Type': 'application/json'})
+        with urlopen(http_request, timeout=settings['NARRATOR_TIMEOUT']) as response:
+            for line in response:
+                if not line.strip():
+                    continue
+                part = json.loads(line)
+                if part.get('error'):
+                    raise RuntimeError(part['error'])
+                if part.get('response'):
+                    yield part['response']
+                if part.get('done'):
+                    return
+
+
+_providers = {}
+
+
+def register_provider(provider):
+    _providers[provider.name] = provider
+
+
+def get_provider(name) -> NarratorProvider:
+    try:
+        return _providers[name]
+    except KeyError:
+        raise ValueError(f'Unknown narrator provider: {name}')
+
+
+register_provider(LocalNarrator())
+register_provider(OllamaNarrator())
+
+
+def narration_key(battle, provider=None):
+    """sha256 of provider + both bugs (id and nickname) + winner + the packed fight log"""
+    provider = provider or current_app.config.get('NARRATOR_PROVIDER', 'local')
+    red, blue = battle.red_corner_bug, battle.blue_corner_bug
+    sha = hashlib.sha256(
+        f'{provider}|{red.id}|{red.nickname}|{blue.id}|{blue.nickname}|{battle.winner_id}|'.encode()
+    )
+    sha.update(bytes(battle.events or b''))
+    return sha.hexdigest()
+
+
+def cached_narration(key):
+    """Finished narration text, or None"""
+    return db.session.execute(select(Narration.text).where(Narration.key == key)).scalar()
+
+
+class _Stream:
+    """One narration in progress: the chunks so far, shared by every listener"""
+
+    def __init__(self, text=None):
+        self.chunks = [text] if text is not None else []
+        self.done = text is not None
+        self.error = None
+        self.changed = threading.Condition()
+
+    def append(self, chunk):
+        with self.changed:
+            self.chunks.append(chunk)
+            self.changed.notify_all()
+
+    def finish(self, error=None):
+        with self.changed:
+            self.done = True
+            self.error = error
+            self.changed.notify_all()
+
+    def follow(self, keepalive=KEEPALIVE_SECONDS):
+        """
+        Yield ('chunk', text) from the start, then ('keepalive', None) during
+        silences, and finally ('done', None) or ('failed', message)
+        """
+        sent = 0
+        while True:
+            with self.changed:
+                if sent == len(self.chunks) and not self.done:
+                    self.changed.wait(keepalive)
+                chunks = self.chunks[sent:]
+                done, error = self.done, self.error
+            if not chunks and not done:
+                yield 'keepalive', None
+            for chunk in chunks:
+                yield 'chunk', chunk
+            sent += len(chunks)
+            if done and sent == len(self.chunks):
+                yield ('failed', error) if error else ('done', None)
+                return
+
+
+def narration_stream(battle, play_by_play) -> _Stream:
+    """The narration for a battle: cached, already being generated, or started now"""
+    provider = current_app.config.get('NARRATOR_PROVIDER', 'local')
+    key = narration_key(battle, provider)
+    with _lock:
+        stream = _streams.get(key)
+    if stream is not None:
+        return stream
+    text = cached_narration(key)
+    if text is not None:
+        return _Stream(text)
+
+    request = NarrationRequest(battle.red_corner_bug.nickname, battle.blue_corner_bug.nickname,
+                               battle.winner.nickname if battle.winner else None, play_by_play)
+    with _lock:
+        # another listener may have started it since we looked; if it also
+        # finished in between, we narrate twice and the second insert is dropped
+        stream = _streams.get(key)
+        if stream is None:
+            stream = _streams[key] = _Stream()
+            _pool().submit(_narrate, current_app._get_current_object(), key, provider, request, stream)
+    return stream
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=current_app.config.get('NARRATOR_WORKERS', 4),
+                                       thread_name_prefix='narrator')
+    return _executor
+
+
+def _narrate(app, key, provider_name, request, stream):
+    with app.app_context():
+        try:
+            for chunk in get_provider(provider_name).stream(request, app.config):
+                stream.append(chunk)
+            db.session.add(Narration(key=key, provider=provider_name, text=''.join(stream.chunks)))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+            stream.finish()
+        except Exception as e:
+            app.logger.warning('Narration %s via %s failed: %s', key[:12], provider_name, e)
+            stream.finish(error='The narrator lost their voice - showing the play-by-play instead.')
+        finally:
+            with _lock:
+                _streams.pop(key, None)
+            db.session.remove()
+
+
+def sse_events(stream):
+    """
+    Server-sent events for a _Stream: `chunk` events, then `done` or `failed`
+    (not `error` - EventSource fires its own error event when the connection drops)
+    """
+    for kind, data in stream.follow():
+        if kind == 'keepalive':
+            yield ': keepalive\n\n'
+        else:
+            yield f'event: {kind}\ndata: {json.dumps(data)}\n\n'
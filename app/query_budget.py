@@ -0,0 +1,70 @@
+"""
+SQL statement counting per request
+
+Turn on with QUERY_BUDGET_ENABLED (on by default in debug and testing).
+Every response gets an X-Query-Count header, and views decorated with
+@query_budget(n) that run more than n statements either log a warning or,
+with QUERY_BUDGET_STRICT (default: when TESTING), raise QueryBudgetExceeded
+so the test that hit the view fails. That's how N+1 queries get caught.
+
+    @bp.route('/battles')
+    @query_budget(4)
+    def list_battles(): ...
+"""
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries):
+    """Allow a view at most max_queries SQL statements per request"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return view(*args, **kwargs)
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_count' in g:
+        g.query_count += 1
+
+
+def _start_counting():
+    g.query_count = 0
+
+
+def _check_budget(response):
+    if 'query_count' not in g:
+        return response
+    count = g.query_count
+    response.headers['X-Query-Count'] = str(count)
+
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', None)
+    if budget is not None and count > budget:
+        message = f'{request.endpoint} ran {count} SQL statements (budget {budget})'
+        if current_app.config['QUERY_BUDGET_STRICT']:
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('QUERY_BUDGET_ENABLED', app.debug or app.testing)
+    app.config.setdefault('QUERY_BUDGET_STRICT', app.testing)
+    if not app.config['QUERY_BUDGET_ENABLED']:
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', _count_statement):
+        event.listen(Engine, 'before_cursor_execute', _count_statement)
+    app.before_request(_start_counting)
+    app.after_request(_check_budget)
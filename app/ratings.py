@@ -0,0 +1,195 @@
+"""
+Ratings Write Path
+
+Every battle write calls rate_battles() before committing: ratings move by
+Elo (atomic `rating = rating + delta` updates) and tiers are reassigned from
+an in-process TierIndex (battle_engine.ratings):
+
+- the two fighters get their new tier straight from the index
+- if a tier boundary moved, only bugs in the rating band it swept over are
+  re-tiered (one indexed range query), never the whole table
+
+The index is built from Bug.rating on first use and rebuilt every
+TIER_INDEX_TTL seconds so worker processes converge on each other's writes.
+Changes to it are queued on the session and applied once the transaction
+commits (dropped on rollback), so a failed write never leaves the index
+ahead of the table.
+New ratings and tiers are passed on to the matchmaking indexes
+(app.matchmaking). recompute_ratings() replays all Battle history for
+migrations.
+"""
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import bindparam, event, func, or_, select, update
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from app.matchmaking import bugs_rerated, reset_match_indexes
+from app.models import Battle, Bug
+from battle_engine.ratings import DEFAULT_RATING, TierIndex, rate_outcomes, tier_for
+
+_bug_table = Bug.__table__
+_index = None
+_built_at = 0.0
+_lock = threading.Lock()
+
+
+def tier_index() -> TierIndex:
+    global _index, _built_at
+    ttl = current_app.config.get('TIER_INDEX_TTL', 300)
+    if _index is None or time.monotonic() - _built_at > ttl:
+        ratings = db.session.execute(select(Bug.rating)).scalars()
+        index = TierIndex(ratings)
+        with _lock:
+            _index, _built_at = index, time.monotonic()
+    return _index
+
+
+def rate_battles(winner_ids, loser_ids):
+    """Battle write path hook - update ratings and tiers, does not commit"""
+    bug_ids = set(winner_ids) | set(loser_ids)
+    if not bug_ids:
+        return
+    # load the index before the ratings move, or a fresh build would count them twice
+    index = tier_index()
+    old = {
+        bug_id: rating if rating is not None else DEFAULT_RATING
+        for bug_id, rating in db.session.execute(
+            select(Bug.id, Bug.rating).where(Bug.id.in_(bug_ids))
+        )
+    }
+    new = rate_outcomes(dict(old), zip(winner_ids, loser_ids))
+
+    db.session.execute(
+        update(_bug_table)
+        .where(_bug_table.c.id == bindparam('b_id'))
+        .values(rating=func.coalesce(_bug_table.c.rating, DEFAULT_RATING) + bindparam('delta')),
+        [{'b_id': bug_id, 'delta': new[bug_id] - old[bug_id]} for bug_id in old],
+    )
+    tiers = _retier(index, old, new)
+    bugs_rerated(new, tiers)
+
+
+def _retier(index, old, new):
+    moves = [(old[bug_id], new[bug_id]) for bug_id in old]
+    queued = db.session.info.get('tier_index_changes', [])
+    with _lock:
+        # try this transaction's changes for the new boundaries, then take
+        # them back - the shared index only changes once it commits
+        _apply(index, queued)
+        cuts_before = index.cuts()
+        _apply(index, [('move', moves)])
+        cuts_after = index.cuts()
+        _apply(index, [('move', moves)] + queued, undo=True)
+    _queue(db.session, 'move', moves)
+    tiers = {bug_id: tier_for(new[bug_id], cuts_after) for bug_id in old}
+
+    # a moved boundary can promote/demote bystanders - only in the swept band
+    for before, after in zip(cuts_before, cuts_after):
+        if before == after:
+            continue
+        low, high = min(before, after), max(before, after)
+        for bug_id, rating in db.session.execute(
+            select(Bug.id, Bug.rating)
+            .where(Bug.rating >= low - 0.5, Bug.rating < high + 0.5)
+        ):
+            tiers.setdefault(bug_id, tier_for(rating, cuts_after))
+
+    db.session.execute(
+        update(_bug_table)
+        .where(_bug_table.c.id == bindparam('b_id'))
+        .where(or_(_bug_table.c.tier.is_(None), _bug_table.c.tier != bindparam('new_tier')))
+        .values(tier=bindparam('new_tier')),
+        [{'b_id': bug_id, 'new_tier': tier} for bug_id, tier in tiers.items()],
+    )
+    return tiers
+
+
+def recompute_ratings(batch_size=10000):
+    """
+    Replay every battle in order to rebuild all ratings and tiers.
+
+    Returns (battles replayed, bugs rated)
+    """
+    global _index, _built_at
+    ratings = {}
+    battles = db.session.execute(
+        select(Battle.winner_id, Battle.red_corner_bug_id, Battle.blue_corner_bug__id)
+        .where(Battle.winner_id.isnot(None))
+        .order_by(Battle.battle_date, Battle.id)
+        .execution_options(yield_per=batch_size)
+    )
+    replayed = 0
+    for chunk in battles.partitions():
+        rate_outcomes(ratings, (
+            (winner, blue if winner == red else red) for winner, red, blue in chunk
+        ))
+        replayed += len(chunk)
+
+    bug_ids = db.session.execute(select(Bug.id)).scalars().all()
+    final = {bug_id: ratings.get(bug_id, DEFAULT_RATING) for bug_id in bug_ids}
+    index = TierIndex(final.values())
+    db.session.execute(
+        update(_bug_table)
+        .where(_bug_table.c.id == bindparam('b_id'))
+        .values(rating=bindparam('new_rating'), tier=bindparam('new_tier')),
+        [{'b_id': bug_id, 'new_rating': rating, 'new_tier': index.tier_of(rating)}
+         for bug_id, rating in final.items()],
+    )
+    db.session.commit()
+    with _lock:
+        _index, _built_at = index, time.monotonic()
+    reset_match_indexes()
+    return replayed, len(final)
+
+
+@event.listens_for(Bug, 'before_insert')
+def _tier_new_bug(mapper, connection, target):
+    if target.rating is None:
+        target.rating = DEFAULT_RATING
+    if _index is not None and target.tier is None:
+        target.tier = _index.tier_of(target.rating)
+
+
+@event.listens_for(Bug, 'after_insert')
+def _index_new_bug(mapper, connection, target):
+    if _index is not None:
+        _queue(object_session(target), 'add', [target.rating])
+
+
+@event.listens_for(Bug, 'after_delete')
+def _unindex_bug(mapper, connection, target):
+    if _index is not None:
+        _queue(object_session(target), 'remove', [target.rating])
+
+
+def _queue(session, operation, items):
+    session.info.setdefault('tier_index_changes', []).append((operation, items))
+
+
+def _apply(index, changes, undo=False):
+    """Replay queued (operation, items) changes on index - or take them back, newest first"""
+    for operation, items in reversed(changes) if undo else changes:
+        for item in items:
+            if operation == 'move':
+                index.move(*(reversed(item) if undo else item))
+            elif (operation == 'add') != undo:
+                index.add(item)
+            else:
+                index.remove(item)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_after_commit(session):
+    changes = session.info.pop('tier_index_changes', None)
+    if not changes or _index is None:
+        return
+    with _lock:
+        _apply(_index, changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('tier_index_changes', None)
@@ -0,0 +1,85 @@
+"""
+Battle Results Writer
+
+Saves any number of battle outcomes in one transaction:
+- Battle rows go in with a single executemany INSERT
+- win/loss records are bumped in SQL (wins = wins + n), never read-modify-write
+  in Python, so concurrent writers can't lose each other's increments
+"""
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime
+
+from sqlalchemy import func, insert, update
+
+from app import db
+from app.models import Bug, Battle
+from app.ratings import rate_battles
+from app.stats import battles_recorded
+
+BattleOutcome = namedtuple(
+    'BattleOutcome',
+    ['red_id', 'blue_id', 'winner_id', 'tournament_id', 'round_number', 'narrative'],
+    defaults=(None, None, None),
+)
+
+
+def record_battles(outcomes, commit=True) -> int:
+    """
+    Insert a Battle row per outcome and update both bugs' records.
+
+    Args:
+        outcomes: iterable of BattleOutcome
+        commit: commit the transaction (pass False to fold into a bigger one)
+
+    Returns:
+        number of battles written
+    """
+    battle_date = datetime.utcnow()
+    rows = []
+    winner_ids = []
+    loser_ids = []
+    for outcome in outcomes:
+        rows.append({
+            'red_corner_bug_id': outcome.red_id,
+            'blue_corner_bug__id': outcome.blue_id,
+            'winner_id': outcome.winner_id,
+            'tournament_id': outcome.tournament_id,
+            'round_number': outcome.round_number,
+            'narrative': outcome.narrative,
+            'battle_date': battle_date,
+        })
+        if outcome.winner_id is not None:
+            winner_ids.append(outcome.winner_id)
+            loser_ids.append(outcome.blue_id if outcome.winner_id == outcome.red_id else outcome.red_id)
+
+    if rows:
+        db.session.execute(insert(Battle.__table__), rows)
+        apply_records(winner_ids, loser_ids)
+        rate_battles(winner_ids, loser_ids)
+        battles_recorded(len(rows), winner_ids, loser_ids)
+    if commit:
+        db.session.commit()
+    return len(rows)
+
+
+def apply_records(winner_ids, loser_ids):
+    """
+    Atomically add wins/losses, one UPDATE per distinct increment:
+
+        UPDATE bug SET wins = wins + 1 WHERE id IN (...)
+        UPDATE bug SET wins = wins + 2 WHERE id IN (...)
+
+    Most batches (a single fight, a tournament round) need just one per column.
+    Does not commit.
+    """
+    bug_table = Bug.__table__
+    for column, ids in ((bug_table.c.wins, winner_ids), (bug_table.c.losses, loser_ids)):
+        by_increment = defaultdict(list)
+        for bug_id, n in Counter(ids).items():
+            by_increment[n].append(bug_id)
+        for n, bug_ids in by_increment.items():
+            db.session.execute(
+                update(bug_table)
+                .where(bug_table.c.id.in_(bug_ids))
+                .values({column: func.coalesce(column, 0) + n})
+            )
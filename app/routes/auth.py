@@ -0,0 +1,16 @@
+"""
+User accounts - login/registration still to be built
+
+Registered so login_manager.login_view ('auth.login') and the blueprint
+list in create_app resolve; until the forms exist, login just points back
+at the homepage
+"""
+from flask import Blueprint, flash, redirect, url_for
+
+bp = Blueprint('auth', __name__)
+
+
+@bp.route('/login')
+def login():
+    flash('Accounts are not available yet.', 'info')
+    return redirect(url_for('main.index'))
@@ -7,27 +7,180 @@ matchup matrix
 
 
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from collections import namedtuple
+from functools import lru_cache
+from datetime import datetime
+from flask import Blueprint, Response, render_template, redirect, url_for, flash, request, abort, jsonify
 from flask_login import login_required
+from sqlalchemy import desc, func, select, tuple_, union_all
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models import Bug, Battle
+from app.matchmaking import MATCH_KEYS, find_opponents
+from app.metrics import record_fights
+from app.narrator import cached_narration, narration_key, narration_stream, sse_events
+from app.results import apply_records
+from app.stat_jobs import ACTIVE, job_status, stats_pending
+from app.ratings import rate_battles
+from app.stats import battles_recorded
+from app.query_budget import query_budget
+from battle_engine.combat import RED, Combatant, record_fight
+from battle_engine.narrative import render_narrative
+from battle_engine.odds import DEFAULT_FIGHTS, win_odds
+from battle_engine.ratings import TIERS
+from battle_engine.tables import SIZE_CLASSES
 import random
+import sys
+import time
 
 bp = Blueprint('battles', __name__)
 
+PER_PAGE = 10
+
+# One page of a newest-first keyset listing; next_after is the ?after= value
+# for the following page (None on the last page)
+KeysetPage = namedtuple('KeysetPage', ['items', 'has_next', 'next_after'])
+
+
+def _parse_after(value):
+    """?after=<battle_date ISO>,<id> -> (datetime, id)"""
+    try:
+        date, battle_id = value.rsplit(',', 1)
+        return datetime.fromisoformat(date), int(battle_id)
+    except ValueError:
+        abort(400, description='after must look like <battle_date>,<id>')
+
+
+def _keyset_page(battles, per_page):
+    """battles: newest-first list fetched with limit per_page + 1"""
+    has_next = len(battles) > per_page
+    items = battles[:per_page]
+    next_after = f'{items[-1].battle_date.isoformat()},{items[-1].id}' if has_next else None
+    return KeysetPage(items, has_next, next_after)
+
+
+def _with_fighters(query):
+    """Load both corners and the winner in the same SELECT (no per-row lazy loads)"""
+    return query.options(
+        joinedload(Battle.red_corner_bug),
+        joinedload(Battle.blue_corner_bug),
+        joinedload(Battle.winner),
+    )
+
+
+def _newest_first(query, after):
+    if after:
+        query = query.filter(tuple_(Battle.battle_date, Battle.id) < _parse_after(after))
+    return query.order_by(desc(Battle.battle_date), desc(Battle.id))
+
+
 @bp.route('/battles')
+@query_budget(4)
 def list_battles():
+    """
+    ?page=N    - classic OFFSET pagination (fine for the first few pages)
+    ?after=... - keyset pagination from a cursor, same cost on any page
+    """
+    after = request.args.get('after')
+    if after is not None:
+        battles = _newest_first(_with_fighters(Battle.query), after).limit(PER_PAGE + 1).all()
+        return render_template('battle_list.html', battles=_keyset_page(battles, PER_PAGE))
+
     page = request.args.get('page', 1, type=int)
-    battles = Battle.query.order_by(Battle.battle_date.desc())\
-        .paginate(page=page, per_page=10, error_out=False)
+    battles = _with_fighters(Battle.query).order_by(Battle.battle_date.desc())\
+        .paginate(page=page, per_page=PER_PAGE, error_out=False)
     return render_template('battle_list.html', battles=battles)
 
 
+@bp.route('/bug/<int:bug_id>/battles')
+@query_budget(3)
+def bug_battles(bug_id):
+    """
+    A bug's battle history, newest first, as JSON with keyset pagination (?after=)
+
+    Red and blue corner battles are read from their own (corner, battle_date, id)
+    index with a LIMIT each and merged, so no page sorts the bug's full history
+    """
+    Bug.query.get_or_404(bug_id)
+    after = request.args.get('after')
+    per_page = max(1, min(request.args.get('limit', 20, type=int), 100))
+
+    corners = []
+    for column in (Battle.red_corner_bug_id, Battle.blue_corner_bug__id):
+        corner = select(Battle.id, Battle.battle_date).where(column == bug_id)
+        if after:
+            corner = corner.where(tuple_(Battle.battle_date, Battle.id) < _parse_after(after))
+        corners.append(
+            corner.order_by(desc(Battle.battle_date), desc(Battle.id))
+            .limit(per_page + 1).subquery().select()
+        )
+    merged = union_all(*corners).subquery()
+    ids = select(merged.c.id).order_by(desc(merged.c.battle_date), desc(merged.c.id))\
+        .limit(per_page + 1)
+
+    battles = Battle.query.filter(Battle.id.in_(ids))\
+        .order_by(desc(Battle.battle_date), desc(Battle.id)).all()
+    page = _keyset_page(battles, per_page)
+
+    return jsonify({
+        'bug_id': bug_id,
+        'battles': [{
+            'id': battle.id,
+            'battle_date': battle.battle_date.isoformat(),
+            'corner': 'red' if battle.red_corner_bug_id == bug_id else 'blue',
+            'opponent_id': (battle.blue_corner_bug__id if battle.red_corner_bug_id == bug_id
+                            else battle.red_corner_bug_id),
+            'won': battle.winner_id == bug_id,
+            'tournament_id': battle.tournament_id,
+        } for battle in page.items],
+        'next_after': page.next_after,
+    })
+
+
 @bp.route('/battle/<int:battle_id>')
+@query_budget(3)
 def view_battle(battle_id):
     """View a specific battle"""
-    battle = Battle.query.get_or_404(battle_id)
-    return render_template('battle_view.html', battle=battle)
+    battle = _with_fighters(Battle.query).filter_by(id=battle_id).first_or_404()
+    # the narrator's retelling if it's been generated - otherwise the page
+    # streams it from battle_narration()
+    narration = cached_narration(narration_key(battle)) if battle.events else None
+    return render_template('battle_view.html', battle=battle, narrative=battle_narrative(battle),
+                           narration=narration)
+
+
+@bp.route('/battle/<int:battle_id>/narration')
+@query_budget(2)
+def battle_narration(battle_id):
+    """Narrator output as server-sent events (app.narrator)"""
+    battle = _with_fighters(Battle.query).filter_by(id=battle_id).first_or_404()
+    if not battle.events:
+        abort(404)
+    stream = narration_stream(battle, battle_narrative(battle))
+    return Response(sse_events(stream), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+NARRATIVE_CACHE_SIZE = 1024
+
+
+def battle_narrative(battle: Battle) -> str:
+    """Text narrative for a battle - rendered from its event log, LRU cached"""
+    if battle.events:
+        return _render_narrative(battle.id, battle.red_corner_bug.nickname,
+                                 battle.blue_corner_bug.nickname,
+                                 battle.winner.nickname if battle.winner else None,
+                                 bytes(battle.events))
+    # tournament fights are resolved in bulk by the batch engine, which keeps
+    # no log - they have no play-by-play and battle_view.html says so
+    return battle.narrative or ''
+
+
+@lru_cache(maxsize=NARRATIVE_CACHE_SIZE)
+def _render_narrative(battle_id, red_name, blue_name, winner_name, events):
+    # battle_id keeps identical logs from different battles apart; names are
+    # part of the key so a renamed bug doesn't serve stale text
+    return render_narrative(red_name, blue_name, events, winner_name)
 
 
 @bp.route('/battle/new', methods=['GET', 'POST'])
@@ -35,8 +188,8 @@ def view_battle(battle_id):
 def new_battle():
     """Create a new battle"""
     if request.method == 'POST':
-        red_corner_bug_id = request.form.get(' red_corner_bug_id', type=int)
-         blue_corner_bug_id = request.form.get('blue_corner_bug_id', type=int)
+        red_corner_bug_id = request.form.get('red_corner_bug_id', type=int)
+        blue_corner_bug_id = request.form.get('blue_corner_bug_id', type=int)
         
         # Validation
         if not red_corner_bug_id or not blue_corner_bug_id:
@@ -49,6 +202,8 @@ def new_battle():
         
         red_corner_bug = Bug.query.get_or_404(red_corner_bug_id)
         blue_corner_bug = Bug.query.get_or_404(blue_corner_bug_id)
+        if not _battle_ready(red_corner_bug, blue_corner_bug):
+            return redirect(url_for('battles.new_battle'))
         
         # battle sim
         battle = simulate_battle(red_corner_bug, blue_corner_bug)
@@ -56,236 +211,235 @@ def new_battle():
         flash(f'Battle complete! {battle.winner.nickname} wins!', 'success')
         return redirect(url_for('battles.view_battle', battle_id=battle.id))
     
-    bugs = Bug.query.all()
-    return render_template('battle_new.html', bugs=bugs)
-  
-# Combat type system (offensive -> defensive multipliers)
-# Offensive types: piercing, crushing, slashing, venom, chemical, grappling
-# Defensive types: hard_shell, segmented_armor, evasive, hairy_spiny, toxic_skin, thick_hide
-
-MATCHUP_MATRIX = {
-    'piercing': {
-        'hard_shell': 1.5, 'segmented_armor': 1.0, 'evasive': 0.7,
-        'hairy_spiny': 1.0, 'toxic_skin': 1.5, 'thick_hide': 0.7
-    },
-    'crushing': {
-        'hard_shell': 1.5, 'segmented_armor': 0.7, 'evasive': 1.0,
-        'hairy_spiny': 1.0, 'toxic_skin': 0.7, 'thick_hide': 1.5
-    },
-    'slashing': {
-        'hard_shell': 0.7, 'segmented_armor': 1.5, 'evasive': 1.5,
-        'hairy_spiny': 0.7, 'toxic_skin': 1.0, 'thick_hide': 1.0
-    },
-    'venom': {
-        'hard_shell': 1.0, 'segmented_armor': 1.5, 'evasive': 1.0,
-        'hairy_spiny': 0.7, 'toxic_skin': 0.7, 'thick_hide': 1.5
-    },
-    'chemical': {
-        'hard_shell': 1.0, 'segmented_armor': 1.0, 'evasive': 1.5,
-        'hairy_spiny': 1.5, 'toxic_skin': 0.7, 'thick_hide': 0.7
-    },
-    'grappling': {
-        'hard_shell': 0.7, 'segmented_armor': 0.7, 'evasive': 1.5,
-        'hairy_spiny': 1.5, 'toxic_skin': 1.0, 'thick_hide': 1.0
-    }
-}
-
-SIZE_ORDER = ['tiny', 'small', 'medium', 'large', 'massive']
-
-SIZE_BASE_MODIFIER = {
-    ('massive', 'tiny'): 1.5,
-    ('massive', 'small'): 1.3,
-    ('massive', 'medium'): 1.15,
-    ('large', 'tiny'): 1.4,
-    ('large', 'small'): 1.25,
-    ('large', 'medium'): 1.1,
-    ('medium', 'tiny'): 1.3,
-    ('medium', 'small'): 1.15,
-    ('small', 'tiny'): 1.2,
-    ('tiny', 'massive'): 0.7,
-    ('tiny', 'large'): 0.75,
-    ('tiny', 'medium'): 0.8,
-    ('small', 'massive'): 0.75,
-    ('small', 'large'): 0.8,
-    ('small', 'medium'): 0.85,
-    ('medium', 'large'): 0.9,
-    ('medium', 'massive'): 0.85,
-    ('large', 'massive'): 0.9,
-}
-#the smaller bug cannot use a crushing attack against a larger bug
-SIZE_DEPENDENT_ATTACKS = {'crushing', 'grappling', 'piercing', 'slashing'}
-SIZE_AGNOSTIC_ATTACKS = {'venom', 'chemical'}
-
-def get_matchup_multiplier(attack_type: str, defense_type: str) -> float:
-    """Return multiplier for attack_type vs defense_type using MATCHUP_MATRIX.
-    Falls back to 1.0 for unknown types."""
-    if not attack_type or not defense_type:
-        return 1.0
-    attack = (attack_type or '').lower()
-    defense = (defense_type or '').lower()
-    return MATCHUP_MATRIX.get(attack, {}).get(defense, 1.0)
-
-def get_size_multipliers(size_a: str, size_b: str, attack_type_a: Optional[str] = None, attack_type_b: Optional[str] = None) -> tuple[float, float]:
-    """Return (mult_a, mult_b) based on size class and (optionally) attack types.
-
-    Behavior:
-    - If an attack type is size-agnostic (venom/chemical), that attack ignores size modifiers.
-    - If size-pair explicit mapping exists in SIZE_BASE_MODIFIER, it is used.
-    - Otherwise null
+    # the form looks bugs up on demand through bug_picker() - no full roster here
+    return render_template('battle_new.html')
+
+
+def _battle_ready(*bugs):
+    """Flash and return False if any bug is still waiting for its stats"""
+    pending = stats_pending([bug.id for bug in bugs])
+    for bug in bugs:
+        if bug.id in pending:
+            flash(f'{bug.nickname} is still getting its stats - try again in a moment', 'warning')
+    return not pending
+
+
+@bp.route('/bug/<int:bug_id>/stats-status')
+@query_budget(2)
+def bug_stats_status(bug_id):
+    """Stat generation progress for the upload page to poll (app.stat_jobs)"""
+    bug = Bug.query.get_or_404(bug_id)
+    job = job_status(bug_id)
+    return jsonify({
+        'bug_id': bug_id,
+        'battle_ready': job is None or job['status'] not in ACTIVE,
+        'stats_generated': bool(bug.stats_generated),
+        'job': job,
+    })
+
+
+PICKER_LIMIT = 10
+PICKER_MAX_LIMIT = 50
+
+
+def _prefix_upper(prefix):
     """
-    a = red_corner_bug.size
-    b = blue_corner_bug.size
-
-    # Unknown sizes -> neutral
-    if a is None or b is None:
-        return 1.0, 1.0
-
-    # If attack types explicitly ignore size, respect that
-    atk_a = (attack_type_a or '').lower() if attack_type_a else None
-    atk_b = (attack_type_b or '').lower() if attack_type_b else None
-
-    # If both attacks are size-agnostic, no size modifiers apply
-    if (atk_a in SIZE_AGNOSTIC_ATTACKS) and (atk_b in SIZE_AGNOSTIC_ATTACKS):
-        return 1.0, 1.0
-
-    # Compute default diff-based multipliers (fallback)
-    ia = SIZE_ORDER.index(a)
-    ib = SIZE_ORDER.index(b)
-    diff = ia - ib
-    def default_for_diff(d):
-        if d == 0:
-            return 1.0
-        if d == 1:
-            return 1.15
-        if d == 2:
-            return 1.30
-        if d >= 3:
-            return 1.40
-        if d == -1:
-            return 1.0 / 1.15
-        if d == -2:
-            return 1.0 / 1.30
-        if d <= -3:
-            return 1.0 / 1.40
-        return 1.0
-
-    # Try explicit mapping first
-    explicit_a = SIZE_BASE_MODIFIER.get((a, b))
-    explicit_b = SIZE_BASE_MODIFIER.get((b, a))
-
-    if explicit_a is not None or explicit_b is not None:
-        # If one direction missing, try reciprocal of the other or fallback
-        if explicit_a is None and explicit_b is not None:
-            explicit_a = 1.0 / explicit_b if explicit_b != 0 else 1.0
-        if explicit_b is None and explicit_a is not None:
-            explicit_b = 1.0 / explicit_a if explicit_a != 0 else 1.0
-        mult_a = explicit_a if explicit_a is not None else default_for_diff(diff)
-        mult_b = explicit_b if explicit_b is not None else default_for_diff(-diff)
-    else:
-        mult_a = default_for_diff(diff)
-        mult_b = default_for_diff(-diff)
+    Smallest string above everything starting with prefix ('abc' -> 'abd'),
+    or None when there is none (prefix is all U+10FFFF) and the range stays open
+    """
+    while prefix:
+        code = ord(prefix[-1]) + 1
+        if code <= sys.maxunicode:
+            if 0xD800 <= code <= 0xDFFF:
+                code = 0xE000  # lone surrogates can't be stored - skip the block
+            return prefix[:-1] + chr(code)
+        prefix = prefix[:-1]
+    return None
+
+
+@bp.route('/battle/picker')
+@query_budget(2)
+def bug_picker():
+    """
+    Typeahead for the new-battle form: ?q=<nickname prefix>&limit=N
+
+    Returns only id/nickname/species/power_level, found by a range scan on the
+    indexed nickname_key column. Responses carry an ETag so repeat lookups
+    come back as 304 Not Modified.
+    """
+    prefix = request.args.get('q', '').strip().lower()
+    limit = max(1, min(request.args.get('limit', PICKER_LIMIT, type=int), PICKER_MAX_LIMIT))
 
-    # If a given attack is size-agnostic, it should not receive the size-based boost/penalty
-    if atk_a in SIZE_AGNOSTIC_ATTACKS:
-        mult_a = 1.0
-    if atk_b in SIZE_AGNOSTIC_ATTACKS:
-        mult_b = 1.0
+    query = select(
+        Bug.id, Bug.nickname, Bug.species,
+        (func.coalesce(Bug.attack, 0) + func.coalesce(Bug.defense, 0) +
+         func.coalesce(Bug.speed, 0)).label('power_level'),
+    )
+    if prefix:
+        # nickname_key >= 'abc' AND nickname_key < 'abd' - same rows as LIKE 'abc%'
+        query = query.where(Bug.nickname_key >= prefix)
+        upper = _prefix_upper(prefix)
+        if upper is not None:
+            query = query.where(Bug.nickname_key < upper)
+    rows = db.session.execute(query.order_by(Bug.nickname_key, Bug.id).limit(limit))
+
+    response = jsonify([row._asdict() for row in rows])
+    response.cache_control.private = True
+    response.cache_control.max_age = 30
+    response.add_etag()
+    return response.make_conditional(request)
 
-    return round(mult_a, 3), round(mult_b, 3)
 
-def simulate_battle(red_corner_bug: Bug, blue_corner_bug: Bug) -> Battle:
+@bp.route('/battle/odds')
+@query_budget(1)
+def battle_odds():
+    """
+    Red's chance of beating blue as JSON: ?red=<id>&blue=<id>&fights=N
+
+    Monte Carlo over N seeded fights with a 95% confidence interval, memoized
+    on both bugs' combat stats (battle_engine.odds)
+    """
+    red_id = request.args.get('red', type=int)
+    blue_id = request.args.get('blue', type=int)
+    if not red_id or not blue_id:
+        abort(400, description='red and blue bug ids are required')
+    fighters = {bug.id: bug for bug in Bug.query.filter(Bug.id.in_([red_id, blue_id]))}
+    if red_id not in fighters or blue_id not in fighters:
+        abort(404)
+
+    odds = win_odds(Combatant.from_bug(fighters[red_id]), Combatant.from_bug(fighters[blue_id]),
+                    request.args.get('fights', DEFAULT_FIGHTS, type=int))
+    response = jsonify({
+        'red_id': red_id,
+        'blue_id': blue_id,
+        'fights': odds.fights,
+        'red_win_probability': round(odds.probability, 4),
+        'confidence_interval': [round(odds.low, 4), round(odds.high, 4)],
+    })
+    response.cache_control.private = True
+    response.cache_control.max_age = 30
+    return response
+
+
+OPPONENTS_LIMIT = 5
+OPPONENTS_MAX_LIMIT = 50
+# quick battles pick at random among this many closest opponents so the
+# same two bugs don't meet every time
+QUICK_BATTLE_POOL = 3
+
+
+def _match_filters():
+    """?by=rating|power&tier=..&size_class=.. shared by the matchmaking views"""
+    by = request.values.get('by', 'rating')
+    tier = request.values.get('tier') or None
+    size_class = request.values.get('size_class') or None
+    if by not in MATCH_KEYS:
+        abort(400, description=f'by must be one of {", ".join(MATCH_KEYS)}')
+    if tier is not None and tier not in TIERS:
+        abort(400, description=f'Unknown tier: {tier}')
+    if size_class is not None and size_class not in SIZE_CLASSES:
+        abort(400, description=f'Unknown size class: {size_class}')
+    return {'by': by, 'tier': tier, 'size_class': size_class}
+
+
+def _opponents_or_404(bug_id, k, filters):
+    try:
+        return find_opponents(bug_id, k, **filters)
+    except KeyError:
+        abort(404)
+
+
+@bp.route('/bug/<int:bug_id>/opponents')
+@query_budget(2)
+def bug_opponents(bug_id):
+    """
+    Fair opponents for a bug as JSON: ?limit=N&by=rating|power&tier=&size_class=
+
+    Served from the in-memory matchmaking index - only the matched rows are read
+    """
+    limit = max(1, min(request.args.get('limit', OPPONENTS_LIMIT, type=int), OPPONENTS_MAX_LIMIT))
+    opponent_ids = _opponents_or_404(bug_id, limit, _match_filters())
+
+    rows = {row.id: row for row in db.session.execute(
+        select(Bug.id, Bug.nickname, Bug.species, Bug.rating, Bug.tier, Bug.size_class)
+        .where(Bug.id.in_(opponent_ids))
+    )} if opponent_ids else {}
+    return jsonify([rows[bug_id]._asdict() for bug_id in opponent_ids if bug_id in rows])
+
+
+@bp.route('/battle/quick', methods=['POST'])
+@login_required
+def quick_battle():
+    """Fight the red corner bug against one of its closest opponents (filters as bug_opponents)"""
+    bug_id = request.form.get('red_corner_bug_id', type=int)
+    if not bug_id:
+        flash('Please pick a red corner bug', 'danger')
+        return redirect(url_for('battles.new_battle'))
+
+    opponent_ids = _opponents_or_404(bug_id, QUICK_BATTLE_POOL, _match_filters())
+    if not opponent_ids:
+        flash('No opponent found - try loosening the filters', 'warning')
+        return redirect(url_for('battles.new_battle'))
+
+    red_corner_bug = Bug.query.get_or_404(bug_id)
+    blue_corner_bug = Bug.query.get_or_404(random.choice(opponent_ids))
+    if not _battle_ready(red_corner_bug, blue_corner_bug):
+        return redirect(url_for('battles.new_battle'))
+    battle = simulate_battle(red_corner_bug, blue_corner_bug)
+
+    flash(f'Battle complete! {battle.winner.nickname} wins!', 'success')
+    return redirect(url_for('battles.view_battle', battle_id=battle.id))
+
+
+def simulate_battle(red_corner_bug: Bug, blue_corner_bug: Bug,
+                    tournament_id=None, round_number=None) -> Battle:
     """
     Simulate a battle between two bugs
     
-    BATTLE MECHANICS:
-    1. Calculate base power (attack + defense + speed)
-    2. Apply type advantages
-    3. Add randomness (±10%)
-    4. Determine winner
-    5. Generate narrative
-    6. Update records\
-    7. Advance bug if tournament battle
+    BATTLE MECHANICS (battle_engine.combat):
+    1. Snapshot both bugs into Combatants (no ORM access during the fight)
+    2. Trade blows in speed order - type/size matchups, specials, xfactor, ±10%
+    3. First bug out of health loses
+    4. Keep the seed and packed event log (text is rendered on view)
+    5. Update records (atomic SQL increments, see app.results), rating and tier
+    6. Advance bug if tournament battle
     
     Args:
         red_corner_bug: First bug
         blue_corner_bug: Second bug
+        tournament_id / round_number: set for tournament battles
     
     Returns:
         Battle object with winner and narrative
     """
-
-    battle = Battle(
-        red_corner_bug_id=red_corner_bug.id,
-        blue_corner_bug_id=blue_corner_bug.id,
-        winner_id=winner.id if winner else None,
-        battle_date=db.func.current_timestamp(),
-        narrative=narrative,
-        tournament_id=tournament_id,
-        round_number=round_number,
-    )
-  
-    # Calculate power with randomness
-    red_corner_bug_power = calculate_battle_power(red_corner_bug)
-    blue_corner_bug_power = calculate_battle_power(blue_corner_bug)
-    
-    # Determine winner
-    if red_corner_bug_power > blue_corner_bug_power:
-        winner = bug1
-        loser = bug2
-    elif bug2_power > bug1_power:
-        winner = bug2
-        loser = bug1
+    seed = random.getrandbits(31)
+    started = time.perf_counter()
+    result, events = record_fight(Combatant.from_bug(red_corner_bug),
+                                  Combatant.from_bug(blue_corner_bug), seed)
+    record_fights('battle', 1, time.perf_counter() - started)
+    if result.winner == RED:
+        winner, loser = red_corner_bug, blue_corner_bug
     else:
-        # Tie - random winner
-        winner = random.choice([bug1, bug2])
-        loser = bug2 if winner == bug1 else bug1
-    
-    # Generate narrative
-    narrative = generate_battle_narrative(bug1, bug2, winner)
+        winner, loser = blue_corner_bug, red_corner_bug
     
     # Create battle record
     battle = Battle(
-        bug1_id=bug1.id,
-        bug2_id=bug2.id,
+        red_corner_bug_id=red_corner_bug.id,
+        blue_corner_bug__id=blue_corner_bug.id,
         winner_id=winner.id,
-        narrative=narrative
+        seed=seed,
+        events=events,
+        tournament_id=tournament_id,
+        round_number=round_number,
     )
+    db.session.add(battle)
     
-    # Update win/loss records
-    winner.wins += 1
-    loser.losses += 1
+    # Update win/loss records in SQL so concurrent battles can't lose updates
+    apply_records([winner.id], [loser.id])
+    rate_battles([winner.id], [loser.id])
+    battles_recorded(1, [winner.id], [loser.id])
     
-    # Save to database
-    db.session.add(battle)
+    # Save to database - battle row and both records in one transaction
     db.session.commit()
     
     return battle
-
-
-def calculate_battle_power(bug: Bug) -> float:
-    """
-    Calculate a bug's battle power
-    
-    FORMULA:
-    - Attack is weighted 2x (offense wins fights)
-    - Defense is weighted 1.5x (protection matters)
-    - Speed is weighted 1.2x (going first helps)
-    - Add ±10% randomness (critical hits, luck, etc.)
-    
-    Args:
-        bug: Bug to calculate power for
-    
-    Returns:
-        Total battle power (float)
-    """
-    base_power = (
-        bug.attack * 2.0 +
-        bug.defense * 1.5 +
-        bug.speed * 1.2
-    )
-    
-    # Add randomness (90% to 110% of base power)
-    randomness = random.uniform(0.9, 1.1)
-    
-    return base_power * randomness
-
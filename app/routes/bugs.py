@@ -0,0 +1,6 @@
+"""
+Bug uploads and profiles - still to be built (see app/images.py for storage)
+"""
+from flask import Blueprint
+
+bp = Blueprint('bugs', __name__)
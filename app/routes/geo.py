@@ -0,0 +1,66 @@
+"""
+Location views - bugs found near a point and regional leaderboards (app/geo.py)
+"""
+import math
+
+from flask import Blueprint, abort, jsonify, request
+from sqlalchemy import select
+from app import db
+from app.geo import bugs_near, region_leaderboard, region_of
+from app.models import Bug
+from app.query_budget import query_budget
+from battle_engine.geo import BASE32, REGION_PRECISION
+
+bp = Blueprint('geo', __name__)
+
+NEAR_LIMIT = 10
+NEAR_MAX_LIMIT = 100
+LEADERBOARD_LIMIT = 10
+LEADERBOARD_MAX_LIMIT = 100
+
+
+def _point():
+    """?lat=&lon= as floats, 400 if missing or off the map"""
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    if latitude is None or longitude is None:
+        abort(400, description='lat and lon are required')
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        abort(400, description='lat must be within ±90 and lon within ±180')
+    return latitude, longitude
+
+
+@bp.route('/bugs/near')
+@query_budget(14)  # the k-nearest search may widen its radius a dozen times
+def near():
+    """
+    Bugs closest to ?lat=&lon= as JSON, nearest first: ?limit=N&radius_km=R
+    (without radius_km, the N nearest wherever they are)
+    """
+    latitude, longitude = _point()
+    limit = max(1, min(request.args.get('limit', NEAR_LIMIT, type=int), NEAR_MAX_LIMIT))
+    radius_km = request.args.get('radius_km', type=float)
+    if radius_km is not None and (not math.isfinite(radius_km) or radius_km <= 0):
+        abort(400, description='radius_km must be a positive number')
+
+    sightings = bugs_near(latitude, longitude, k=limit, radius_km=radius_km)
+    rows = {row.id: row for row in db.session.execute(
+        select(Bug.id, Bug.nickname, Bug.species, Bug.location_found, Bug.latitude, Bug.longitude,
+               Bug.wins, Bug.losses)
+        .where(Bug.id.in_([sighting.bug_id for sighting in sightings]))
+    )} if sightings else {}
+    return jsonify([dict(rows[sighting.bug_id]._asdict(), distance_km=round(sighting.distance_km, 3))
+                    for sighting in sightings if sighting.bug_id in rows])
+
+
+@bp.route('/leaderboard/region')
+@query_budget(2)
+def regional_leaderboard():
+    """Top bugs of a region cell: ?region=<4-char geohash> or ?lat=&lon= for the cell holding that point"""
+    region = request.args.get('region')
+    if region is None:
+        region = region_of(*_point())
+    elif len(region) != REGION_PRECISION or any(char not in BASE32 for char in region):
+        abort(400, description=f'region must be a {REGION_PRECISION}-character geohash')
+    limit = max(1, min(request.args.get('limit', LEADERBOARD_LIMIT, type=int), LEADERBOARD_MAX_LIMIT))
+    return jsonify(region_leaderboard(region, limit))
@@ -0,0 +1,19 @@
+"""
+Serving stored bug photos and thumbnails (see app/images.py)
+"""
+from flask import Blueprint, abort, send_from_directory
+from app.images import upload_root
+
+bp = Blueprint('images', __name__)
+
+# paths are content hashes, so a URL's bytes never change
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+@bp.route('/uploads/<path:filename>')
+def uploaded_file(filename):
+    if not filename.startswith(('originals/', 'thumbs/')):
+        abort(404)
+    response = send_from_directory(upload_root(), filename, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
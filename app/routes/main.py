@@ -2,70 +2,60 @@
 Front End Connection - Homepage and Dashboard
 """
 from flask import Blueprint, render_template
-from app import db
-from app.models import Bug, Battle, User
-from sqlalchemy import desc, func
+from app.stats import arena_snapshot
+from app.metrics import timed
+from app.query_budget import query_budget
+
+# a warm snapshot is 3 statements (stats row, recent bugs, recent battles);
+# with no usable stats row it adds 2 read-only aggregates (aggregates,
+# leaderboard - see app/stats.py _aggregate)
+ARENA_QUERY_BUDGET = 3 + 2
 
 bp = Blueprint('main', __name__)
 
 @bp.route('/')
+@query_budget(ARENA_QUERY_BUDGET)
 def index():
     """
     Homepage - show recent activity and top bugs
-    - .order_by() - sort results
-    - .limit() - get only N results
-    - desc() - descending order (newest first)
-    """
-    # Get 5 most recent battles
-    recent_battles = Battle.query.order_by(desc(Battle.battle_date)).limit(5).all()
-    
-    # Get top 10 bugs by wins
-    top_bugs = Bug.query.order_by(desc(Bug.wins)).limit(10).all()
 
-    all_bugs = Bug.query.order_by(submission_date(Bug)).all()
+    Served from the cached arena snapshot (app/stats.py), so the page
+    costs the same no matter how many bugs and battles exist
+    """
+    with timed('arena_snapshot'):
+        arena = arena_snapshot()
     
     return render_template('index.html',
-                         battles=recent_battles,
-                         top_bugs=top_bugs)
+                         battles=arena['recent_battles'],
+                         top_bugs=arena['top_bugs'])
 
 
 @bp.route('/dashboard')
+@query_budget(ARENA_QUERY_BUDGET)
 def dashboard():
     """
     Simple Admin Dashboard
     
     Shows key statistics about the arena
-    
-    TEACHING MOMENT:
-    - .count() - count rows
-    - func.avg() - SQL aggregate function for average
-    - .scalar() - get single value from query
+
+    Totals, max/avg stats and the leaderboard are kept up to date on every
+    write (app/stats.py) instead of COUNT/MAX queries per page view
     """
-    # Basic counts
-    total_bugs = Bug.query.count()
-    total_users = User.query.count()
-    total_battles = Battle.query.count()
-    total_tournaments = Tournament.query.count()
-    
-    # Calculate highest stats
-    max_attack = db.session.query(func.max(Bug.attack)).scalar() or 0
-    max_defense = db.session.query(func.max(Bug.defense)).scalar() or 0
-    max_speed = db.session.query(func.max(Bug.speed)).scalar() or 0
-    max_hp = db.session.query(func.max(Bug.HP)).scalar() or 0
-  
-    recent_bugs = Bug.query.order_by(desc(Bug.submission_date)).limit(5).all()
-    recent_battles = Battle.query.order_by(desc(Battle.battle_date)).limit(5).all()
-    
-    # Top performers
-    top_bugs = Bug.query.order_by(desc(Bug.wins)).limit(5).all()
+    with timed('arena_snapshot'):
+        arena = arena_snapshot()
     
     return render_template('dashboard.html',
-                         total_bugs=total_bugs,
-                         total_users=total_users,
-                         total_battles=total_battles,
-                         avg_attack=round(avg_attack, 1),
-                         avg_defense=round(avg_defense, 1),
-                         avg_speed=round(avg_speed, 1),
-                         recent_bugs=recent_bugs,
-                         recent_battles=recent_battles,
-                         top_bugs=top_bugs)
+                         total_bugs=arena['total_bugs'],
+                         total_users=arena['total_users'],
+                         total_battles=arena['total_battles'],
+                         total_tournaments=arena['total_tournaments'],
+                         max_attack=arena['max_attack'],
+                         max_defense=arena['max_defense'],
+                         max_speed=arena['max_speed'],
+                         max_hp=arena['max_health'],
+                         avg_attack=round(arena['avg_attack'], 1),
+                         avg_defense=round(arena['avg_defense'], 1),
+                         avg_speed=round(arena['avg_speed'], 1),
+                         recent_bugs=arena['recent_bugs'],
+                         recent_battles=arena['recent_battles'],
+                         top_bugs=arena['top_bugs'][:5])
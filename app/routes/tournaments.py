@@ -0,0 +1,76 @@
+"""
+Tournaments - create, run and view brackets
+"""
+from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask_login import login_required
+from app import db
+from app.models import Bug, Tournament, TournamentEntry
+from app.matchmaking import find_opponents
+from app.tournaments import FORMATS, create_tournament
+from sqlalchemy import desc
+from sqlalchemy.orm import joinedload
+from app.query_budget import query_budget
+
+bp = Blueprint('tournaments', __name__)
+
+
+@bp.route('/tournaments')
+@query_budget(4)
+def list_tournaments():
+    page = request.args.get('page', 1, type=int)
+    tournaments = Tournament.query.options(joinedload(Tournament.champion))\
+        .order_by(desc(Tournament.created_at))\
+        .paginate(page=page, per_page=10, error_out=False)
+    return render_template('tournament_list.html', tournaments=tournaments, formats=FORMATS)
+
+
+@bp.route('/tournament/<int:tournament_id>')
+@query_budget(4)
+def view_tournament(tournament_id):
+    """Final standings and round count - or progress while a worker plays it"""
+    tournament = Tournament.query.options(joinedload(Tournament.champion))\
+        .filter_by(id=tournament_id).first_or_404()
+    entries = tournament.entries.options(joinedload(TournamentEntry.bug)).limit(64).all()
+    return render_template('tournament_view.html', tournament=tournament, entries=entries)
+
+
+@bp.route('/tournament/new', methods=['POST'])
+@login_required
+def new_tournament():
+    """
+    Create a tournament and queue it for the worker (`flask brawl worker`)
+
+    Entrants are either picked bugs (bug_ids), the `around` bug plus its
+    `size - 1` closest-rated opponents (optionally within `tier`), or the top
+    `size` bugs by wins
+    """
+    name = request.form.get('name', '').strip()
+    format = request.form.get('format')
+    bug_ids = request.form.getlist('bug_ids', type=int)
+    size = request.form.get('size', type=int)
+    around = request.form.get('around', type=int)
+
+    if not name:
+        flash('Please name the tournament', 'danger')
+        return redirect(url_for('tournaments.list_tournaments'))
+
+    if not bug_ids and size and around:
+        try:
+            bug_ids = [around] + find_opponents(around, size - 1,
+                                                tier=request.form.get('tier') or None)
+        except KeyError:
+            flash('Unknown bug', 'warning')
+            return redirect(url_for('tournaments.list_tournaments'))
+    elif not bug_ids and size:
+        bug_ids = [bug_id for (bug_id,) in
+                   db.session.query(Bug.id).order_by(desc(Bug.wins)).limit(size)]
+
+    try:
+        tournament = create_tournament(name, format, bug_ids)
+    except ValueError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('tournaments.list_tournaments'))
+
+    # played in the background - a big bracket would outlast the request timeout
+    flash('Tournament queued! Standings appear here once it has been played.', 'success')
+    return redirect(url_for('tournaments.view_tournament', tournament_id=tournament.id))
@@ -0,0 +1,280 @@
+"""
+Stat Generation Jobs
+
+Generating a bug's stats (an LLM, a taxonomy lookup...) can take seconds, so
+it never runs in the upload request. The request calls enqueue_stats() and
+a worker (`flask brawl worker`) picks the job up from the StatJob table:
+
+- claiming is a conditional UPDATE, so any number of worker threads and
+  processes can share the table without double-running a job
+- each provider has a concurrency limit - a job is only claimed while fewer
+  than `concurrency` jobs for that provider are running, across all workers
+- a failed job goes back to pending with exponential backoff until it runs
+  out of attempts; a job whose worker died is reclaimed after STAT_JOB_TIMEOUT
+- the provider runs outside any database transaction; its stats are written
+  to the bug together with the job's "done" status, and only if this worker
+  still holds the job (a reclaimed job belongs to whoever claimed it next)
+
+A bug is battle-ready unless it has a job in flight (ACTIVE) - stats_pending()
+lists those and the battle views turn them away. A failed job leaves the bug
+with the stats it had. The UI polls /bug/<id>/stats-status
+(app/routes/battles.py), which uses the same rule.
+
+The same worker threads also play queued tournaments (app/tournaments.py)
+whenever no stat job is runnable.
+
+Providers subclass StatProvider and are added with register_provider().
+LocalStatProvider ('local') is deterministic and needs no network, for tests
+and development.
+"""
+import hashlib
+import os
+import random
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select, update
+
+from app import db
+from app.models import Bug, StatJob
+from battle_engine.tables import ATTACK_TYPES, DEFENSE_TYPES, SIZE_CLASSES
+
+ACTIVE = ('pending', 'running')  # a bug with a job in one of these can't battle yet
+GENERATED_FIELDS = ('attack', 'defense', 'speed', 'special_attack', 'special_defense', 'health',
+                    'xfactor', 'xfactor_reason', 'attack_type', 'defense_type', 'size_class',
+                    'special_ability')
+SNAPSHOT_FIELDS = ('id', 'nickname', 'species', 'description', 'size_class', 'location_found')
+
+
+class StatProvider:
+    """
+    generate() gets a plain dict of the bug (SNAPSHOT_FIELDS) and returns the
+    GENERATED_FIELDS it wants to set. Raise to have the job retried.
+    """
+    name = None
+    concurrency = 1  # jobs of this provider running at once, across all workers
+
+    def generate(self, bug):
+        raise NotImplementedError
+
+
+class LocalStatProvider(StatProvider):
+    """Stats derived from a hash of species + nickname - same bug, same stats"""
+    name = 'local'
+    concurrency = 4
+
+    def generate(self, bug):
+        key = f"{(bug.get('species') or '').lower()}|{bug.get('nickname') or ''}"
+        rng = random.Random(hashlib.sha256(key.encode()).digest())
+        xfactor = round(rng.uniform(-5.0, 5.0), 1)
+        return {
+            'attack': rng.randint(20, 100),
+            'defense': rng.randint(20, 100),
+            'speed': rng.randint(20, 100),
+            'special_attack': rng.randint(20, 100),
+            'special_defense': rng.randint(20, 100),
+            'health': rng.randint(60, 140),
+            'xfactor': xfactor,
+            'xfactor_reason': f'Local stub roll ({xfactor:+.1f})',
+            'attack_type': rng.choice(ATTACK_TYPES),
+            'defense_type': rng.choice(DEFENSE_TYPES),
+            'size_class': bug.get('size_class') or rng.choice(SIZE_CLASSES),
+        }
+
+
+_providers = {}
+
+
+def register_provider(provider):
+    _providers[provider.name] = provider
+
+
+def get_provider(name) -> StatProvider:
+    try:
+        return _providers[name]
+    except KeyError:
+        raise ValueError(f'Unknown stat provider: {name}')
+
+
+register_provider(LocalStatProvider())
+
+
+def enqueue_stats(bug_id, provider=None, commit=True) -> StatJob:
+    """Queue stat generation for a bug (returns the active job if there already is one)"""
+    provider = provider or current_app.config.get('STAT_PROVIDER', 'local')
+    get_provider(provider)
+    job = StatJob.query.filter(StatJob.bug_id == bug_id, StatJob.status.in_(ACTIVE)).first()
+    if job is None:
+        job = StatJob(bug_id=bug_id, provider=provider,
+                      max_attempts=current_app.config.get('STAT_JOB_MAX_ATTEMPTS', 5))
+        db.session.add(job)
+    if commit:
+        db.session.commit()
+    return job
+
+
+def stats_pending(bug_ids):
+    """The subset of bug_ids still waiting on a stat job"""
+    return set(db.session.execute(
+        select(StatJob.bug_id).where(StatJob.bug_id.in_(bug_ids), StatJob.status.in_(ACTIVE))
+    ).scalars())
+
+
+def job_status(bug_id):
+    """Latest job for a bug as a dict, or None"""
+    job = StatJob.query.filter_by(bug_id=bug_id).order_by(StatJob.id.desc()).first()
+    if job is None:
+        return None
+    return {
+        'id': job.id,
+        'status': job.status,
+        'provider': job.provider,
+        'attempts': job.attempts,
+        'run_after': job.run_after.isoformat() if job.status == 'pending' else None,
+        'error': job.error,
+    }
+
+
+def _reclaim_stale(now):
+    """Jobs running longer than STAT_JOB_TIMEOUT (worker died) go back to the queue"""
+    timeout = timedelta(seconds=current_app.config.get('STAT_JOB_TIMEOUT', 300))
+    db.session.execute(
+        update(StatJob)
+        .where(StatJob.status == 'running', StatJob.locked_at < now - timeout)
+        .values(status='pending', locked_by=None, locked_at=None)
+    )
+
+
+def claim_job(worker_id):
+    """Claim the next runnable job; returns its id or None"""
+    now = datetime.utcnow()
+    _reclaim_stale(now)
+    for name in random.sample(list(_providers), len(_providers)):
+        limit = _providers[name].concurrency
+        running = select(func.count()).select_from(StatJob)\
+            .where(StatJob.provider == name, StatJob.status == 'running').scalar_subquery()
+        job_id = db.session.execute(
+            select(StatJob.id)
+            .where(StatJob.status == 'pending', StatJob.provider == name, StatJob.run_after <= now)
+            .order_by(StatJob.run_after, StatJob.id).limit(1)
+        ).scalar()
+        if job_id is None:
+            continue
+        # only one worker can flip pending -> running, and only below the provider limit
+        claimed = db.session.execute(
+            update(StatJob)
+            .where(StatJob.id == job_id, StatJob.status == 'pending', running < limit)
+            .values(status='running', locked_by=worker_id, locked_at=now,
+                    attempts=StatJob.attempts + 1)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+    db.session.commit()
+    return None
+
+
+def backoff(attempts):
+    """Seconds before retry number `attempts`: base * 2^(attempts-1), capped, with jitter"""
+    base = current_app.config.get('STAT_JOB_BACKOFF', 5)
+    delay = min(base * 2 ** (attempts - 1), current_app.config.get('STAT_JOB_BACKOFF_MAX', 3600))
+    return delay * random.uniform(1.0, 1.25)
+
+
+def run_job(job_id, worker_id):
+    """Run one job claimed by worker_id to done / retry / failed"""
+    job = db.session.get(StatJob, job_id)
+    provider = get_provider(job.provider)
+    bug = db.session.get(Bug, job.bug_id)
+    snapshot = {field: getattr(bug, field) for field in SNAPSHOT_FIELDS} if bug else None
+    db.session.commit()  # no transaction open while the provider works
+
+    try:
+        if snapshot is None:
+            raise LookupError(f'Bug {job.bug_id} no longer exists')
+        stats = provider.generate(snapshot)
+    except Exception as e:
+        current_app.logger.warning('Stat job %s failed (attempt %s): %s', job_id, job.attempts, e)
+        _failed(job_id, worker_id, e)
+        return False
+
+    finished = db.session.execute(
+        _still_ours(job_id, worker_id).values(status='done', error=None, finished_at=datetime.utcnow())
+    ).rowcount
+    if not finished:
+        db.session.rollback()
+        current_app.logger.warning('Stat job %s was reclaimed from %s, dropping its result', job_id, worker_id)
+        return False
+    bug = db.session.get(Bug, job.bug_id)
+    for field in GENERATED_FIELDS:
+        if field in stats:
+            setattr(bug, field, stats[field])
+    bug.stats_generated = True
+    bug.stats_generation_method = provider.name
+    db.session.commit()
+    return True
+
+
+def _still_ours(job_id, worker_id):
+    """UPDATE of the job that matches nothing once it timed out and was reclaimed"""
+    return update(StatJob).where(StatJob.id == job_id, StatJob.status == 'running',
+                                 StatJob.locked_by == worker_id)
+
+
+def _failed(job_id, worker_id, error):
+    db.session.rollback()
+    job = db.session.get(StatJob, job_id)
+    values = {'error': f'{type(error).__name__}: {error}', 'locked_by': None, 'locked_at': None}
+    if job.attempts >= job.max_attempts or isinstance(error, LookupError):
+        values.update(status='failed', finished_at=datetime.utcnow())
+    else:
+        values.update(status='pending', run_after=datetime.utcnow() + timedelta(seconds=backoff(job.attempts)))
+    db.session.execute(_still_ours(job_id, worker_id).values(**values))
+    db.session.commit()
+
+
+def work(app, threads=2, poll_interval=1.0, burst=False, stop=None):
+    """
+    Run worker threads until `stop` (a threading.Event) is set, or - with
+    burst - until nothing is runnable. Returns the number of jobs run
+    (stat jobs and tournaments).
+    """
+    from app.tournaments import run_next_tournament
+
+    stop = stop or threading.Event()
+    host = f'{socket.gethostname()}:{os.getpid()}'
+    processed = []
+
+    def loop(number):
+        worker_id = f'{host}:{number}'
+        with app.app_context():
+            try:
+                while not stop.is_set():
+                    job_id = claim_job(worker_id)
+                    if job_id is not None:
+                        run_job(job_id, worker_id)
+                        processed.append(job_id)
+                    elif run_next_tournament():
+                        processed.append(None)
+                    elif burst:
+                        return
+                    else:
+                        stop.wait(poll_interval)
+            finally:
+                db.session.remove()
+
+    workers = [threading.Thread(target=loop, args=(n,), name=f'stat-worker-{n}', daemon=True)
+               for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    try:
+        for thread in workers:
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in workers:
+            thread.join()
+    return len(processed)
@@ -0,0 +1,338 @@
+"""
+Arena Statistics
+
+The ArenaStats row is updated in the same transaction as every bug, user,
+tournament and battle write, so the homepage and dashboard never need to
+aggregate over the Bug/Battle tables:
+
+- ORM inserts/updates/deletes are picked up by mapper events below
+- bulk battle writes call battles_recorded() (see app/results.py)
+
+Counters and sums always move by deltas. When a change can't be applied
+that way - the max or a leaderboard bug deleted or lowered, or no stats row
+yet - the row is rebuilt by the writing session just before it commits,
+inside the same transaction. `flask brawl refresh-stats` rebuilds it by hand
+(bulk imports, raw SQL edits).
+
+Reads go through arena_snapshot(), a small in-process cache with a TTL
+(ARENA_STATS_TTL seconds) that is also dropped whenever this process commits
+a change to the stats. Reads never write: a missing or stale row is
+aggregated on the fly for that snapshot and left for the next write to fix.
+"""
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import case, desc, event, func, inspect, select, update
+from sqlalchemy.orm import Session, aliased, object_session
+
+from app import db
+from app.models import ArenaStats, Battle, Bug, Tournament, User
+
+STATS_ID = 1
+STAT_FIELDS = ('attack', 'defense', 'speed', 'health')
+LEADERBOARD_SIZE = 10
+RECENT_SIZE = 5
+
+_stats_table = ArenaStats.__table__
+_cache = {'value': None, 'expires': 0.0}
+_cache_lock = threading.Lock()
+
+
+def invalidate_arena_stats():
+    with _cache_lock:
+        _cache['value'] = None
+
+
+def arena_snapshot():
+    """
+    Everything the homepage/dashboard show, as plain dicts (safe to share
+    between requests). At most three small queries on a cache miss.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        if _cache['value'] is not None and now < _cache['expires']:
+            return _cache['value']
+
+    value = _load_snapshot()
+    with _cache_lock:
+        _cache['value'] = value
+        _cache['expires'] = now + current_app.config.get('ARENA_STATS_TTL', 5)
+    return value
+
+
+def _load_snapshot():
+    stats = db.session.get(ArenaStats, STATS_ID)
+    if stats is None or stats.stale:
+        row = _aggregate(db.session)
+    else:
+        row = {name: getattr(stats, name) for name in _ROW_FIELDS}
+
+    snapshot = {
+        'total_bugs': row['total_bugs'],
+        'total_users': row['total_users'],
+        'total_battles': row['total_battles'],
+        'total_tournaments': row['total_tournaments'],
+        'top_bugs': [_with_win_rate(entry) for entry in row['leaderboard'] or []],
+    }
+    for field in STAT_FIELDS:
+        snapshot[f'max_{field}'] = row[f'max_{field}'] or 0
+        total = row[f'sum_{field}'] or 0
+        snapshot[f'avg_{field}'] = total / row['total_bugs'] if row['total_bugs'] else 0
+
+    snapshot['recent_bugs'] = [
+        row._asdict() for row in db.session.execute(
+            select(Bug.id, Bug.nickname, Bug.species,
+                   *(getattr(Bug, field) for field in STAT_FIELDS))
+            .order_by(desc(Bug.submission_date)).limit(RECENT_SIZE)
+        )
+    ]
+
+    red, blue, winner = aliased(Bug), aliased(Bug), aliased(Bug)
+    snapshot['recent_battles'] = [
+        {
+            'id': row.id,
+            'battle_date': row.battle_date,
+            'red_corner_bug': {'nickname': row.red_nickname},
+            'blue_corner_bug': {'nickname': row.blue_nickname},
+            'winner': {'nickname': row.winner_nickname},
+        }
+        for row in db.session.execute(
+            select(Battle.id, Battle.battle_date,
+                   red.nickname.label('red_nickname'),
+                   blue.nickname.label('blue_nickname'),
+                   winner.nickname.label('winner_nickname'))
+            .join(red, Battle.red_corner_bug_id == red.id)
+            .join(blue, Battle.blue_corner_bug__id == blue.id)
+            .outerjoin(winner, Battle.winner_id == winner.id)
+            .order_by(desc(Battle.battle_date)).limit(RECENT_SIZE)
+        )
+    ]
+    return snapshot
+
+
+def _with_win_rate(entry):
+    total = entry['wins'] + entry['losses']
+    return dict(entry, win_rate=(entry['wins'] / total * 100) if total > 0 else 0)
+
+
+def _leaderboard_entry(row):
+    return {'id': row.id, 'nickname': row.nickname,
+            'wins': row.wins or 0, 'losses': row.losses or 0}
+
+
+_ROW_FIELDS = ('total_bugs', 'total_users', 'total_battles', 'total_tournaments', 'leaderboard',
+               *(f'max_{field}' for field in STAT_FIELDS), *(f'sum_{field}' for field in STAT_FIELDS))
+
+
+def _aggregate(session):
+    """The stats row's values from scratch - two statements, no writes"""
+    def total(model):
+        return select(func.count()).select_from(model).scalar_subquery()
+
+    aggregates = session.execute(select(
+        func.count(Bug.id), total(User), total(Battle), total(Tournament),
+        *(func.max(getattr(Bug, field)) for field in STAT_FIELDS),
+        *(func.sum(getattr(Bug, field)) for field in STAT_FIELDS),
+    )).one()
+    top = session.execute(
+        select(Bug.id, Bug.nickname, Bug.wins, Bug.losses)
+        .order_by(desc(func.coalesce(Bug.wins, 0)), Bug.id).limit(LEADERBOARD_SIZE)
+    )
+
+    row = dict(zip(('total_bugs', 'total_users', 'total_battles', 'total_tournaments'), aggregates[:4]))
+    for i, field in enumerate(STAT_FIELDS):
+        row[f'max_{field}'] = aggregates[4 + i] or 0
+        row[f'sum_{field}'] = aggregates[4 + len(STAT_FIELDS) + i] or 0
+    row['leaderboard'] = [_leaderboard_entry(entry) for entry in top]
+    return row
+
+
+def _rebuild(session):
+    """Write a from-scratch stats row in the session's transaction (no commit)"""
+    row = dict(_aggregate(session), stale=False)
+    written = session.execute(
+        update(_stats_table).where(_stats_table.c.id == STATS_ID).values(**row)
+    ).rowcount
+    if not written:
+        session.execute(_stats_table.insert().values(id=STATS_ID, **row))
+    session.info['arena_stats_changed'] = True
+
+
+def refresh_arena_stats():
+    """Rebuild the stats row and commit (`flask brawl refresh-stats`)"""
+    _rebuild(db.session)
+    db.session.commit()
+
+
+def battles_recorded(count, winner_ids, loser_ids):
+    """
+    Battle write path hook - call after the win/loss UPDATEs, before commit.
+
+    Only this batch's winners (plus leaderboard bugs that lost) can change the
+    top N, so just those rows are read back.
+
+    The counter UPDATE comes first on purpose: it takes the stats row's write
+    lock (the database write lock on SQLite, the row lock elsewhere) until
+    commit, so no other writer can change the leaderboard between the read
+    and the write below.
+    """
+    written = db.session.execute(
+        update(_stats_table).where(_stats_table.c.id == STATS_ID)
+        .values(total_battles=_stats_table.c.total_battles + count)
+    ).rowcount
+    db.session.info['arena_stats_changed'] = True
+    if not written:
+        db.session.info['arena_stats_rebuild'] = True
+        return
+    row = db.session.execute(
+        select(_stats_table.c.leaderboard).where(_stats_table.c.id == STATS_ID)
+    ).first()
+
+    board = {entry['id']: entry for entry in row.leaderboard or []}
+    changed = set(winner_ids) | (board.keys() & set(loser_ids))
+    if not changed:
+        return
+    for bug in db.session.execute(
+        select(Bug.id, Bug.nickname, Bug.wins, Bug.losses).where(Bug.id.in_(changed))
+    ):
+        board[bug.id] = _leaderboard_entry(bug)
+    top = sorted(board.values(), key=lambda entry: (-entry['wins'], entry['id']))
+    db.session.execute(
+        update(_stats_table).where(_stats_table.c.id == STATS_ID)
+        .values(leaderboard=top[:LEADERBOARD_SIZE])
+    )
+
+
+def _bump(connection, target, rebuild=False, **values):
+    """Apply deltas to the stats row; rebuild=True (or no row yet) rebuilds it before commit"""
+    written = connection.execute(
+        update(_stats_table).where(_stats_table.c.id == STATS_ID).values(**values)
+    ).rowcount
+    session = object_session(target)
+    if session is not None:
+        session.info['arena_stats_changed'] = True
+        if rebuild or not written:
+            session.info['arena_stats_rebuild'] = True
+
+
+def _column(name):
+    return _stats_table.c[name]
+
+
+def _current(connection):
+    """Leaderboard and maxima as they stand in this transaction"""
+    return connection.execute(
+        select(_stats_table.c.leaderboard, *(_column(f'max_{field}') for field in STAT_FIELDS))
+        .where(_stats_table.c.id == STATS_ID)
+    ).first()
+
+
+def _on_leaderboard(row, target):
+    return any(entry['id'] == target.id for entry in row.leaderboard or [])
+
+
+@event.listens_for(Bug, 'after_insert')
+def _bug_inserted(mapper, connection, target):
+    values = {'total_bugs': _column('total_bugs') + 1}
+    for field in STAT_FIELDS:
+        value = getattr(target, field) or 0
+        values[f'sum_{field}'] = _column(f'sum_{field}') + value
+        values[f'max_{field}'] = case(
+            (_column(f'max_{field}') < value, value), else_=_column(f'max_{field}')
+        )
+    _bump(connection, target, **values)
+
+    # a young arena shows every bug on the leaderboard until it fills up
+    row = connection.execute(
+        select(_stats_table.c.leaderboard).where(_stats_table.c.id == STATS_ID)
+    ).first()
+    if row is not None and len(row.leaderboard or []) < LEADERBOARD_SIZE:
+        connection.execute(
+            update(_stats_table).where(_stats_table.c.id == STATS_ID)
+            .values(leaderboard=(row.leaderboard or []) + [_leaderboard_entry(target)])
+        )
+
+
+@event.listens_for(Bug, 'after_update')
+def _bug_updated(mapper, connection, target):
+    attrs = inspect(target).attrs
+    values = {}
+    lowered = []
+    rebuild = False
+    for field in STAT_FIELDS:
+        history = attrs[field].history
+        if not history.has_changes():
+            continue
+        if not history.deleted:
+            rebuild = True  # old value was never loaded - can't apply a delta
+            continue
+        old = history.deleted[0] or 0
+        new = (history.added[0] if history.added else None) or 0
+        values[f'sum_{field}'] = _column(f'sum_{field}') + (new - old)
+        if new >= old:
+            values[f'max_{field}'] = case(
+                (_column(f'max_{field}') < new, new), else_=_column(f'max_{field}')
+            )
+        else:
+            lowered.append((field, old))
+    record_changed = any(attrs[name].history.has_changes() for name in ('nickname', 'wins', 'losses'))
+    if not rebuild and (lowered or record_changed):
+        row = _current(connection)
+        # lowering the max, or an ORM-side record/name edit that can move the
+        # leaderboard, needs the other bugs - leave those to the rebuild
+        rebuild = row is None or any(old >= getattr(row, f'max_{field}') for field, old in lowered) or (
+            record_changed and (_on_leaderboard(row, target) or _could_join(row, target)))
+    if values or rebuild:
+        _bump(connection, target, rebuild=rebuild, **values)
+
+
+def _could_join(row, target):
+    board = row.leaderboard or []
+    if len(board) < LEADERBOARD_SIZE:
+        return True
+    last = board[-1]
+    return (-(target.wins or 0), target.id) < (-last['wins'], last['id'])
+
+
+@event.listens_for(Bug, 'after_delete')
+def _bug_deleted(mapper, connection, target):
+    values = {'total_bugs': _column('total_bugs') - 1}
+    for field in STAT_FIELDS:
+        values[f'sum_{field}'] = _column(f'sum_{field}') - (getattr(target, field) or 0)
+    row = _current(connection)
+    # only losing a max holder or a leaderboard bug needs the other bugs
+    rebuild = row is None or _on_leaderboard(row, target) or any(
+        (getattr(target, field) or 0) >= getattr(row, f'max_{field}') for field in STAT_FIELDS)
+    _bump(connection, target, rebuild=rebuild, **values)
+
+
+def _counter(model, column_name, step):
+    def listener(mapper, connection, target):
+        _bump(connection, target, **{column_name: _column(column_name) + step})
+    event.listen(model, 'after_insert' if step > 0 else 'after_delete', listener)
+
+
+_counter(User, 'total_users', 1)
+_counter(User, 'total_users', -1)
+_counter(Tournament, 'total_tournaments', 1)
+_counter(Tournament, 'total_tournaments', -1)
+
+
+@event.listens_for(Session, 'before_commit')
+def _rebuild_before_commit(session):
+    session.flush()  # the mapper events above only run at flush
+    if session.info.pop('arena_stats_rebuild', False):
+        _rebuild(session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('arena_stats_changed', False):
+        invalidate_arena_stats()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop('arena_stats_changed', None)
+    session.info.pop('arena_stats_rebuild', None)
@@ -0,0 +1,411 @@
+"""
+Taxonomy Lookups
+
+Resolves the species name on an upload to taxonomy data for Species
+(scientific/common name, genus, family, GBIF / iNaturalist ids, Wikipedia
+link). Every provider answer is cached twice:
+
+- in process, in an LRU of MEMORY_CACHE_SIZE names
+- in the TaxonCache table, for TAXONOMY_CACHE_TTL (TAXONOMY_NEGATIVE_TTL for
+  "no match") - shared by every worker and kept across restarts
+
+Only names missing from both go to the provider. Each provider has a batcher:
+names asked for by concurrent requests are collected for TAXONOMY_BATCH_WINDOW
+and sent together (one HTTP request for Wikipedia, which takes 50 titles at
+once), and a name that is already in flight is waited on rather than asked for
+again. Requests to a provider pass through its token bucket (rate/burst), so
+a burst of uploads can't get us throttled.
+
+Provider URLs come from config (TAXONOMY_*_URL) so tests can point them at a
+local HTTP server.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, wait
+from datetime import datetime
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from flask import current_app
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import TaxonCache
+
+MEMORY_CACHE_SIZE = 10000
+MAX_NAME_LENGTH = 200  # TaxonCache.name
+USER_AGENT = 'BugBrawl/1.0 (taxonomy lookup)'
+
+Taxon = namedtuple('Taxon', ['name', 'scientific_name', 'common_name', 'genus', 'family',
+                             'gbif_id', 'inaturalist_id', 'wikipedia_url', 'data_source'])
+TAXON_FIELDS = Taxon._fields[1:-1]
+
+
+def normalize(name):
+    """(cache key, cleaned name) - whitespace collapsed, key lowercased"""
+    cleaned = ' '.join((name or '').split())
+    return cleaned.lower(), cleaned
+
+
+class TokenBucket:
+    """`rate` requests per second on average, bursts of up to `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class _MemoryCache:
+    """LRU of (provider, key) -> payload with per-entry expiry"""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, provider, key):
+        """(hit, payload)"""
+        with self.lock:
+            entry = self.entries.get((provider, key))
+            if entry is None:
+                return False, None
+            payload, expires = entry
+            if expires < time.time():
+                del self.entries[(provider, key)]
+                return False, None
+            self.entries.move_to_end((provider, key))
+            return True, payload
+
+    def put(self, provider, key, payload, ttl):
+        with self.lock:
+            self.entries[(provider, key)] = (payload, time.time() + ttl)
+            self.entries.move_to_end((provider, key))
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_memory = _MemoryCache(MEMORY_CACHE_SIZE)
+
+
+def _ttl(settings, payload):
+    return settings['ttl'] if payload is not None else settings['negative_ttl']
+
+
+def _remember(provider, payloads, settings):
+    """Store fresh provider answers in both cache levels"""
+    for key, payload in payloads.items():
+        _memory.put(provider, key, payload, _ttl(settings, payload))
+    table = TaxonCache.__table__
+    rows = [{'provider': provider, 'name': key, 'payload': payload, 'fetched_at': datetime.utcnow()}
+            for key, payload in payloads.items()]
+    try:
+        with settings['engine'].begin() as conn:
+            conn.execute(delete(table).where(table.c.provider == provider,
+                                             table.c.name.in_(list(payloads))))
+            conn.execute(insert(table), rows)
+    except IntegrityError:
+        pass  # another process stored the same names first - theirs is just as good
+
+
+class _Batcher:
+    """
+    Coalesces and batches one provider's lookups. Whoever has names waiting
+    and finds nobody flushing becomes the leader and sends batches until its
+    own names are answered; everyone else waits on their futures.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.inflight = {}  # key -> Future
+        self.queue = OrderedDict()  # key -> cleaned name, not sent yet
+        self.flushing = False
+        self.lock = threading.Lock()
+
+    def lookup(self, names, settings):
+        """{key: Future} for names ({key: cleaned name})"""
+        futures = {}
+        with self.lock:
+            for key, cleaned in names.items():
+                future = self.inflight.get(key)
+                if future is None:
+                    future = self.inflight[key] = Future()
+                    self.queue[key] = cleaned
+                futures[key] = future
+
+        mine = list(futures.values())
+        while not all(future.done() for future in mine):
+            with self.lock:
+                lead = bool(self.queue) and not self.flushing
+                if lead:
+                    self.flushing = True
+            if not lead:
+                wait(mine, timeout=max(settings['window'], 0.01))
+                continue
+            try:
+                time.sleep(settings['window'])  # let concurrent requests add their names
+                while not all(future.done() for future in mine):
+                    with self.lock:
+                        batch = [self.queue.popitem(last=False)
+                                 for _ in range(min(self.provider.batch_size, len(self.queue)))]
+                    if not batch:
+                        break
+                    self._send(dict(batch), settings)
+            finally:
+                with self.lock:
+                    self.flushing = False
+        return futures
+
+    def _send(self, batch, settings):
+        payloads, error = None, None
+        try:
+            found = self.provider.fetch(list(batch.values()), settings['base_url'], settings['timeout'])
+            payloads = {key: found.get(cleaned) for key, cleaned in batch.items()}
+        except Exception as e:
+            error = e
+        if error is None:
+            try:
+                _remember(self.provider.name, payloads, settings)
+            except Exception as e:
+                # the answers are good, they just won't be cached - still hand them out
+                current_app.logger.warning('Could not cache %d taxonomy answers from %s: %s',
+                                           len(payloads), self.provider.name, e)
+        with self.lock:
+            futures = [(key, self.inflight.pop(key)) for key in batch]
+        for key, future in futures:
+            if error is None:
+                future.set_result(payloads[key])
+            else:
+                future.set_exception(error)
+
+
+class TaxonomyProvider:
+    """
+    fetch() takes a list of cleaned names and returns {name: payload}, payload
+    being a dict of TAXON_FIELDS (or None for no match). Raise on transport
+    errors - failed names are not cached.
+    """
+    name = None
+    url_config = None  # config key holding the base URL
+    rate = 5.0  # requests per second
+    burst = 5
+    batch_size = 50  # names per fetch() call
+
+    def __init__(self):
+        self.limiter = TokenBucket(self.rate, self.burst)
+        self.batcher = _Batcher(self)
+
+    def fetch(self, names, base_url, timeout):
+        raise NotImplementedError
+
+    def get_json(self, url, params, timeout):
+        self.limiter.acquire()
+        request = Request(f'{url}?{urlencode(params)}',
+                          headers={'User-Agent': USER_AGENT, 'Accept': 'application/json'})
+        with urlopen(request, timeout=timeout) as response:
+            return json.load(response)
+
+
+class GBIFProvider(TaxonomyProvider):
+    """GBIF backbone name matching - one request per name (no batch endpoint)"""
+    name = 'gbif'
+    url_config = 'TAXONOMY_GBIF_URL'
+    rate = 10.0
+    burst = 10
+
+    def fetch(self, names, base_url, timeout):
+        found = {}
+        for name in names:
+            match = self.get_json(f'{base_url}/species/match', {'name': name, 'verbose': 'false'}, timeout)
+            if match.get('matchType', 'NONE') == 'NONE' or 'usageKey' not in match:
+                found[name] = None
+                continue
+            found[name] = {
+                'scientific_name': match.get('canonicalName') or match.get('scientificName'),
+                'genus': match.get('genus'),
+                'family': match.get('family'),
+                'gbif_id': str(match['usageKey']),
+            }
+        return found
+
+
+class INaturalistProvider(TaxonomyProvider):
+    """iNaturalist taxa search - one request per name, ~1/s as their API asks"""
+    name = 'inaturalist'
+    url_config = 'TAXONOMY_INATURALIST_URL'
+    rate = 1.0
+    burst = 5
+
+    def fetch(self, names, base_url, timeout):
+        found = {}
+        for name in names:
+            results = self.get_json(f'{base_url}/taxa', {'q': name, 'per_page': 1, 'is_active': 'true'},
+                                    timeout).get('results') or []
+            if not results:
+                found[name] = None
+                continue
+            taxon = results[0]
+            found[name] = {
+                'scientific_name': taxon.get('name'),
+                'common_name': taxon.get('preferred_common_name'),
+                'inaturalist_id': str(taxon['id']),
+                'wikipedia_url': taxon.get('wikipedia_url'),
+            }
+        return found
+
+
+class WikipediaProvider(TaxonomyProvider):
+    """Wikipedia page URLs - up to 50 titles in a single query"""
+    name = 'wikipedia'
+    url_config = 'TAXONOMY_WIKIPEDIA_URL'
+
+    def fetch(self, names, base_url, timeout):
+        query = self.get_json(base_url, {
+            'action': 'query', 'format': 'json', 'redirects': 1, 'prop': 'info', 'inprop': 'url',
+            'titles': '|'.join(names),
+        }, timeout).get('query') or {}
+        # title -> normalized title -> redirect target
+        renamed = {step['from']: step['to']
+                   for step in query.get('normalized', []) + query.get('redirects', [])}
+        pages = {page.get('title'): page for page in (query.get('pages') or {}).values()}
+        found = {}
+        for name in names:
+            title = name
+            for _ in range(3):
+                title = renamed.get(title, title)
+            page = pages.get(title)
+            missing = page is None or 'missing' in page or 'invalid' in page
+            found[name] = None if missing else {'wikipedia_url': page.get('fullurl')}
+        return found
+
+
+_providers = {}
+
+
+def register_provider(provider):
+    _providers[provider.name] = provider
+
+
+def get_provider(name) -> TaxonomyProvider:
+    try:
+        return _providers[name]
+    except KeyError:
+        raise ValueError(f'Unknown taxonomy provider: {name}')
+
+
+for _provider in (GBIFProvider(), INaturalistProvider(), WikipediaProvider()):
+    register_provider(_provider)
+
+
+def _settings(provider):
+    config = current_app.config
+    return {
+        'base_url': config.get(provider.url_config, '').rstrip('/'),
+        'timeout': config.get('TAXONOMY_TIMEOUT', 5),
+        'window': config.get('TAXONOMY_BATCH_WINDOW', 0.02),
+        'ttl': config.get('TAXONOMY_CACHE_TTL', 30 * 24 * 3600),
+        'negative_ttl': config.get('TAXONOMY_NEGATIVE_TTL', 24 * 3600),
+        'engine': db.engine,
+    }
+
+
+def _lookup(provider, names):
+    """{key: payload} from one provider for names ({key: cleaned}); failed names are left out"""
+    settings = _settings(provider)
+    answers = {}
+    missing = {}
+    for key, cleaned in names.items():
+        hit, payload = _memory.get(provider.name, key)
+        if hit:
+            answers[key] = payload
+        else:
+            missing[key] = cleaned
+
+    if missing:
+        now = datetime.utcnow()
+        with settings['engine'].connect() as conn:
+            rows = conn.execute(
+                select(TaxonCache.name, TaxonCache.payload, TaxonCache.fetched_at)
+                .where(TaxonCache.provider == provider.name, TaxonCache.name.in_(list(missing)))
+            ).all()
+        for key, payload, fetched_at in rows:
+            remaining = _ttl(settings, payload) - (now - fetched_at).total_seconds()
+            if remaining > 0:
+                answers[key] = payload
+                _memory.put(provider.name, key, payload, remaining)
+                del missing[key]
+
+    if missing:
+        for key, future in provider.batcher.lookup(missing, settings).items():
+            try:
+                answers[key] = future.result()
+            except Exception as e:
+                current_app.logger.warning('Taxonomy lookup via %s failed for %r: %s',
+                                           provider.name, missing[key], e)
+    return answers
+
+
+def resolve_many(names):
+    """{name: Taxon or None} - None when no provider knows the name (or all failed)"""
+    keys = {}
+    for name in names:
+        key, cleaned = normalize(name)
+        if key and len(key) <= MAX_NAME_LENGTH:
+            keys.setdefault(key, cleaned)
+
+    answers = {}  # key -> [(provider, payload)]
+    for provider_name in current_app.config.get('TAXONOMY_PROVIDERS', ()):
+        for key, payload in _lookup(get_provider(provider_name), keys).items():
+            if payload is not None:
+                answers.setdefault(key, []).append((provider_name, payload))
+
+    resolved = {}
+    for name in names:
+        key, cleaned = normalize(name)
+        found = answers.get(key)
+        if not found:
+            resolved[name] = None
+            continue
+        # earlier providers in TAXONOMY_PROVIDERS win where they disagree
+        fields = {field: next((payload[field] for _, payload in found if payload.get(field)), None)
+                  for field in TAXON_FIELDS}
+        resolved[name] = Taxon(cleaned, data_source=','.join(provider for provider, _ in found), **fields)
+    return resolved
+
+
+def resolve(name):
+    return resolve_many([name])[name]
+
+
+def apply_taxon(species, taxon):
+    """Copy a Taxon onto a Species row, leaving fields the lookup didn't find alone"""
+    for field in TAXON_FIELDS + ('data_source',):
+        value = getattr(taxon, field)
+        if value is not None:
+            setattr(species, field, value)
+
+
+def clear_memory_cache():
+    _memory.clear()
@@ -0,0 +1,210 @@
+"""
+Tournament Runner
+
+Brackets come from battle_engine.brackets, fights from battle_engine.parallel.
+Bug stats are snapshotted into plain arrays once, so the process pool never
+touches Flask or the database - only this module does, once per round.
+
+Tournaments are played by the background worker (`flask brawl worker`), not
+in the request that creates them: a pending tournament is a queued job.
+claim_tournament() flips pending -> running with a conditional UPDATE, like
+stat jobs, with at most TOURNAMENT_CONCURRENCY running at once. Every round
+is fought from (seed, round), so a tournament whose worker died is reclaimed
+after TOURNAMENT_TIMEOUT and replayed, skipping the rounds already saved.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import desc, func, insert, select, update
+
+from app import db
+from app.metrics import record_fights
+from app.models import Bug, Tournament, TournamentEntry
+from app.results import BattleOutcome, record_battles
+from battle_engine.batch import BATCH_FIELDS
+from battle_engine.brackets import BRACKETS, RoundRobin
+from battle_engine.parallel import FightPool
+
+FORMATS = tuple(BRACKETS)
+
+
+def create_tournament(name, format, bug_ids, seed=None) -> Tournament:
+    """
+    Create a pending tournament. Entrants are seeded by win record.
+
+    Raises ValueError for an unknown format or fewer than two bugs.
+    """
+    if format not in BRACKETS:
+        raise ValueError(f'Unknown tournament format: {format}')
+    bug_ids = list(dict.fromkeys(bug_ids))
+    if len(bug_ids) < 2:
+        raise ValueError('A tournament needs at least two bugs')
+
+    tournament = Tournament(
+        name=name,
+        format=format,
+        seed=seed if seed is not None else random.getrandbits(31),
+    )
+    db.session.add(tournament)
+    db.session.flush()
+
+    seeded = db.session.query(Bug.id).filter(Bug.id.in_(bug_ids))\
+        .order_by(desc(func.coalesce(Bug.wins, 0)), Bug.id).all()
+    if len(seeded) < 2:
+        db.session.rollback()
+        raise ValueError('A tournament needs at least two bugs')
+    db.session.execute(insert(TournamentEntry), [
+        {'tournament_id': tournament.id, 'bug_id': bug_id, 'seed': seed_number}
+        for seed_number, (bug_id,) in enumerate(seeded, start=1)
+    ])
+    db.session.commit()
+    return tournament
+
+
+def snapshot_roster(tournament):
+    """
+    Stats of every entrant as plain numpy arrays, index 0 = top seed.
+
+    Returns (entry_ids, bug_ids, roster) where roster maps BATCH_FIELDS -> array
+    """
+    rows = db.session.query(
+        TournamentEntry.id, Bug.id,
+        *(getattr(Bug, field) for field in BATCH_FIELDS)
+    ).join(Bug, TournamentEntry.bug_id == Bug.id)\
+        .filter(TournamentEntry.tournament_id == tournament.id)\
+        .order_by(TournamentEntry.seed).all()
+
+    columns = list(zip(*rows))
+    entry_ids = np.array(columns[0], dtype=np.int64)
+    bug_ids = np.array(columns[1], dtype=np.int64)
+    roster = {
+        field: np.array([value or 0 for value in column],
+                        dtype=np.float64 if field == 'xfactor' else np.int64)
+        for field, column in zip(BATCH_FIELDS, columns[2:])
+    }
+    return entry_ids, bug_ids, roster
+
+
+def run_tournament(tournament, workers=None) -> Tournament:
+    """
+    Play a pending tournament to the end.
+
+    Every round is fought in parallel on a process pool and saved in one
+    transaction. Round-robin rounds don't depend on each other, so they are
+    all fought up front and then saved round by round. Rounds up to
+    rounds_played are already saved (an interrupted run) and are only
+    replayed to rebuild the bracket.
+    """
+    entry_ids, bug_ids, roster = snapshot_roster(tournament)
+    bracket = BRACKETS[tournament.format](len(bug_ids))
+    wins = np.zeros(len(bug_ids), dtype=np.int64)
+    losses = np.zeros(len(bug_ids), dtype=np.int64)
+
+    tournament.status = 'running'
+    db.session.commit()
+
+    with FightPool(roster, workers=workers) as pool:
+        if isinstance(bracket, RoundRobin):
+            started = time.perf_counter()
+            results = pool.fight_rounds(bracket.schedule, seed=tournament.seed)
+            record_fights('tournament', sum(len(pairs) for pairs in bracket.schedule),
+                          time.perf_counter() - started)
+        else:
+            results = None
+
+        while not bracket.finished:
+            pairs = bracket.next_round()
+            if not pairs:
+                bracket.report(pairs, [])
+                continue
+            red, blue = (np.array(side, dtype=np.intp) for side in zip(*pairs))
+            if results is not None:
+                winners = results[bracket.round - 1]
+            else:
+                started = time.perf_counter()
+                winners = pool.fight(red, blue, seed=[tournament.seed, bracket.round])
+                record_fights('tournament', len(red), time.perf_counter() - started)
+            losers = np.where(winners == red, blue, red)
+
+            bracket.report(pairs, winners.tolist())
+            np.add.at(wins, winners, 1)
+            np.add.at(losses, losers, 1)
+            if bracket.round <= (tournament.rounds_played or 0):
+                continue
+            _save_round(tournament, bracket.round, bug_ids[red], bug_ids[blue], bug_ids[winners])
+
+    placement = {entrant: place for place, entrant in enumerate(bracket.standings(), start=1)}
+    db.session.execute(update(TournamentEntry), [
+        {'id': int(entry_ids[i]), 'placement': placement[i],
+         'wins': int(wins[i]), 'losses': int(losses[i])}
+        for i in range(len(entry_ids))
+    ])
+    tournament.champion_id = int(bug_ids[bracket.champion])
+    tournament.status = 'complete'
+    tournament.locked_at = None
+    tournament.completed_at = datetime.utcnow()
+    db.session.commit()
+    return tournament
+
+
+def _save_round(tournament, round_number, red_ids, blue_ids, winner_ids):
+    """One transaction per round"""
+    tournament.rounds_played = round_number
+    tournament.locked_at = datetime.utcnow()  # still alive - don't reclaim
+    record_battles(
+        BattleOutcome(red, blue, winner, tournament.id, round_number)
+        for red, blue, winner in zip(red_ids.tolist(), blue_ids.tolist(), winner_ids.tolist())
+    )
+
+
+def _reclaim_stale(now):
+    """Tournaments running longer than TOURNAMENT_TIMEOUT since their last round (worker died)"""
+    timeout = timedelta(seconds=current_app.config.get('TOURNAMENT_TIMEOUT', 600))
+    db.session.execute(
+        update(Tournament)
+        .where(Tournament.status == 'running', Tournament.locked_at < now - timeout)
+        .values(status='pending', locked_at=None)
+    )
+
+
+def claim_tournament():
+    """Claim the oldest pending tournament; returns its id or None"""
+    now = datetime.utcnow()
+    _reclaim_stale(now)
+    tournament_id = db.session.execute(
+        select(Tournament.id).where(Tournament.status == 'pending').order_by(Tournament.id).limit(1)
+    ).scalar()
+    claimed = 0
+    if tournament_id is not None:
+        running = select(func.count()).select_from(Tournament)\
+            .where(Tournament.status == 'running').scalar_subquery()
+        claimed = db.session.execute(
+            update(Tournament)
+            .where(Tournament.id == tournament_id, Tournament.status == 'pending',
+                   running < current_app.config.get('TOURNAMENT_CONCURRENCY', 1))
+            .values(status='running', locked_at=now)
+        ).rowcount
+    db.session.commit()
+    return tournament_id if claimed else None
+
+
+def run_next_tournament():
+    """Claim and play one pending tournament; False if there was none to claim"""
+    tournament_id = claim_tournament()
+    if tournament_id is None:
+        return False
+    try:
+        run_tournament(db.session.get(Tournament, tournament_id),
+                       workers=current_app.config.get('TOURNAMENT_WORKERS'))
+    except Exception:
+        current_app.logger.exception('Tournament %s failed', tournament_id)
+        db.session.rollback()
+        db.session.execute(
+            update(Tournament).where(Tournament.id == tournament_id)
+            .values(status='failed', locked_at=None)
+        )
+        db.session.commit()
+    return True
@@ -0,0 +1,6 @@
+"""
+Battle Engine
+
+Pure python/numpy combat code - no Flask, no database session.
+The web app, CLI jobs and worker processes all import from here.
+"""
@@ -0,0 +1,202 @@
+"""
+Balance Analyzer
+
+Sweeps every archetype (attack_type x defense_type x size_class) over a grid
+of attack/defense/speed profiles and fights every build against every other
+build with the batch engine - the same turn-based model as a single battle,
+with special attack/defense, health and xfactor left at Combatant's
+defaults. Win rates are rolled up into:
+
+- matchups.csv      archetype vs archetype win rate (red row vs blue column)
+- archetypes.csv    each archetype's overall win rate and verdict
+- types.csv         attack_type (red) vs defense_type (blue) heatmap
+- sizes.csv         size_class (red) vs size_class (blue) heatmap
+- stat_profiles.csv overall win rate per attack/defense/speed profile
+- report.html       the heatmaps plus the dominant / useless archetypes
+
+An archetype is "dominant" above DOMINANT_WIN_RATE and "useless" below
+USELESS_WIN_RATE. With the default grid (3 levels per stat) and 2 samples
+the sweep is ~47M fights - about half a minute on one core - so it can run
+in CI whenever battle_engine.matchups changes (--samples 4 tightens the
+matchup rates by a factor of about 1.4, at twice the time):
+
+    flask brawl balance --output-dir balance-report
+"""
+import csv
+import html
+import itertools
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from battle_engine.batch import RED, simulate_batch
+from battle_engine.tables import (
+    ATTACK_TYPES, DEFENSE_TYPES, SIZE_CLASSES, attack_type_code, defense_type_code, size_code,
+)
+
+DEFAULT_GRID = (25, 50, 75)
+DEFAULT_SAMPLES = 2  # fights per build pairing - ~1458 per archetype pairing
+DOMINANT_WIN_RATE = 0.60
+USELESS_WIN_RATE = 0.40
+
+Archetype = namedtuple('Archetype', ['attack_type', 'defense_type', 'size_class'])
+BalanceReport = namedtuple('BalanceReport', [
+    'archetypes', 'profiles', 'matchups', 'archetype_rates', 'type_rates', 'size_rates',
+    'profile_rates', 'fights',
+])
+
+
+def archetypes():
+    return [Archetype(*combo) for combo in itertools.product(ATTACK_TYPES, DEFENSE_TYPES, SIZE_CLASSES)]
+
+
+def stat_profiles(grid=DEFAULT_GRID):
+    """(attack, defense, speed) for every combination of grid levels"""
+    return list(itertools.product(grid, repeat=3))
+
+
+def _builds(kinds, profiles):
+    """Batch arrays for every archetype x profile, archetype-major"""
+    rows = [(attack, defense, speed, attack_type_code(kind.attack_type),
+             defense_type_code(kind.defense_type), size_code(kind.size_class))
+            for kind in kinds for attack, defense, speed in profiles]
+    columns = zip(*rows)
+    fields = ('attack', 'defense', 'speed', 'attack_type_code', 'defense_type_code', 'size_code')
+    return {field: np.array(column, dtype=np.int64) for field, column in zip(fields, columns)}
+
+
+def analyze(grid=DEFAULT_GRID, samples=DEFAULT_SAMPLES, seed=None) -> BalanceReport:
+    """Fight every build against every build `samples` times"""
+    kinds = archetypes()
+    profiles = stat_profiles(grid)
+    builds = _builds(kinds, profiles)
+    n_kinds, n_profiles = len(kinds), len(profiles)
+    n_builds = n_kinds * n_profiles
+    rng = np.random.default_rng(seed)
+
+    # red wins summed per (red archetype, blue archetype) and per red profile
+    kind_wins = np.zeros((n_kinds, n_kinds))
+    profile_wins = np.zeros(n_profiles)
+    blue = {field: np.tile(values, n_profiles * samples) for field, values in builds.items()}
+    for red_kind in range(n_kinds):
+        # every profile of this red archetype vs every build, `samples` times over
+        red_builds = np.arange(red_kind * n_profiles, (red_kind + 1) * n_profiles)
+        red_index = np.repeat(red_builds, n_builds)
+        red_index = np.tile(red_index, samples)
+        red = {field: values[red_index] for field, values in builds.items()}
+        wins = (simulate_batch(red, blue, rng).winners == RED)
+        wins = wins.reshape(samples, n_profiles, n_kinds, n_profiles).sum(axis=0)
+        kind_wins[red_kind] = wins.sum(axis=(0, 2))
+        profile_wins += wins.sum(axis=(1, 2))
+
+    fights_per_kind_pair = samples * n_profiles * n_profiles
+    matchups = kind_wins / fights_per_kind_pair
+    archetype_rates = matchups.mean(axis=1)
+    profile_rates = profile_wins / (samples * n_kinds * n_builds)
+
+    attack_index = np.array([ATTACK_TYPES.index(kind.attack_type) for kind in kinds])
+    defense_index = np.array([DEFENSE_TYPES.index(kind.defense_type) for kind in kinds])
+    size_index = np.array([SIZE_CLASSES.index(kind.size_class) for kind in kinds])
+    type_rates = _group_mean(matchups, attack_index, defense_index, len(ATTACK_TYPES), len(DEFENSE_TYPES))
+    size_rates = _group_mean(matchups, size_index, size_index, len(SIZE_CLASSES), len(SIZE_CLASSES))
+
+    return BalanceReport(kinds, profiles, matchups, archetype_rates, type_rates, size_rates,
+                         profile_rates, samples * n_builds * n_builds)
+
+
+def _group_mean(matrix, row_groups, column_groups, n_rows, n_columns):
+    """Mean of matrix cells grouped by (row group, column group)"""
+    totals = np.zeros((n_rows, n_columns))
+    counts = np.zeros((n_rows, n_columns))
+    rows, columns = np.meshgrid(row_groups, column_groups, indexing='ij')
+    np.add.at(totals, (rows, columns), matrix)
+    np.add.at(counts, (rows, columns), 1)
+    return totals / counts
+
+
+def verdict(win_rate):
+    if win_rate > DOMINANT_WIN_RATE:
+        return 'dominant'
+    if win_rate < USELESS_WIN_RATE:
+        return 'useless'
+    return 'ok'
+
+
+def _label(kind):
+    return '/'.join(kind)
+
+
+def _write_matrix(path, corner, row_labels, column_labels, matrix):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([corner] + list(column_labels))
+        for label, row in zip(row_labels, matrix):
+            writer.writerow([label] + [f'{value:.4f}' for value in row])
+
+
+def _html_heatmap(title, row_labels, column_labels, matrix):
+    def cell(value):
+        # 0 = blue, 0.5 = white, 1 = red
+        red = 255 if value >= 0.5 else int(255 * value * 2)
+        blue = 255 if value <= 0.5 else int(255 * (1 - value) * 2)
+        green = min(red, blue)
+        return f'<td style="background: rgb({red},{green},{blue})">{value:.0%}</td>'
+
+    head = ''.join(f'<th>{html.escape(label)}</th>' for label in column_labels)
+    body = ''.join(
+        f'<tr><th>{html.escape(label)}</th>{"".join(cell(value) for value in row)}</tr>'
+        for label, row in zip(row_labels, matrix)
+    )
+    return f'<h2>{html.escape(title)}</h2><table><tr><th></th>{head}</tr>{body}</table>'
+
+
+def _html_archetypes(title, rows):
+    body = ''.join(f'<tr><td>{html.escape(_label(kind))}</td><td>{rate:.1%}</td></tr>'
+                   for kind, rate in rows)
+    return f'<h2>{html.escape(title)}</h2><table>{body or "<tr><td>none</td></tr>"}</table>'
+
+
+def write_report(report, output_dir):
+    """Write the CSV files and report.html; returns the list of paths written"""
+    os.makedirs(output_dir, exist_ok=True)
+    labels = [_label(kind) for kind in report.archetypes]
+    paths = []
+
+    def path(name):
+        paths.append(os.path.join(output_dir, name))
+        return paths[-1]
+
+    _write_matrix(path('matchups.csv'), 'red \\ blue', labels, labels, report.matchups)
+    _write_matrix(path('types.csv'), 'attack \\ defense', ATTACK_TYPES, DEFENSE_TYPES, report.type_rates)
+    _write_matrix(path('sizes.csv'), 'red \\ blue', SIZE_CLASSES, SIZE_CLASSES, report.size_rates)
+
+    ranked = sorted(zip(report.archetypes, report.archetype_rates), key=lambda item: -item[1])
+    with open(path('archetypes.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['attack_type', 'defense_type', 'size_class', 'win_rate', 'verdict'])
+        for kind, rate in ranked:
+            writer.writerow([*kind, f'{rate:.4f}', verdict(rate)])
+
+    with open(path('stat_profiles.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['attack', 'defense', 'speed', 'win_rate'])
+        for profile, rate in zip(report.profiles, report.profile_rates):
+            writer.writerow([*profile, f'{rate:.4f}'])
+
+    dominant = [(kind, rate) for kind, rate in ranked if verdict(rate) == 'dominant']
+    useless = [(kind, rate) for kind, rate in reversed(ranked) if verdict(rate) == 'useless']
+    with open(path('report.html'), 'w') as f:
+        f.write(
+            '<!doctype html><html><head><meta charset="utf-8"><title>Balance report</title>'
+            '<style>table{border-collapse:collapse;margin-bottom:2em}'
+            'td,th{border:1px solid #ccc;padding:2px 6px;font:12px sans-serif;text-align:right}</style>'
+            f'</head><body><h1>Balance report</h1><p>{report.fights:,} fights.</p>'
+            + _html_heatmap('Attack type (red) vs defense type (blue)',
+                            ATTACK_TYPES, DEFENSE_TYPES, report.type_rates)
+            + _html_heatmap('Size (red) vs size (blue)', SIZE_CLASSES, SIZE_CLASSES, report.size_rates)
+            + _html_archetypes(f'Dominant archetypes (> {DOMINANT_WIN_RATE:.0%})', dominant)
+            + _html_archetypes(f'Useless archetypes (< {USELESS_WIN_RATE:.0%})', useless)
+            + '</body></html>'
+        )
+    return paths
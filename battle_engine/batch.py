@@ -0,0 +1,166 @@
+"""
+Batch Engine
+
+Resolves N fights in one numpy pass instead of one python call per fight.
+Same turn-based model as battle_engine.combat - health, speed order, special
+moves every SPECIAL_EVERY-th round, the judges' decision after MAX_ROUNDS -
+with every fight still standing advanced one round per numpy step:
+
+    damage per hit = attack * attack / (attack + defense)   (special: sp. atk vs sp. def)
+                     * matchup(my attack_type vs their defense_type)
+                     * size multiplier
+                     * (1 + xfactor * XFACTOR_WEIGHT)
+                     * random 0.9 - 1.1
+
+Rolls come from a numpy Generator rather than random.Random, so a batch fight
+and a combat.fight() with "the same" seed differ fight by fight, but win
+rates agree.
+
+Stats come in as a mapping of equal-length arrays, one per corner, with the
+type/size columns already encoded (see battle_engine.tables / Bug.*_code):
+    {'attack': [...], 'defense': [...], 'speed': [...], 'special_attack': [...],
+     'special_defense': [...], 'health': [...], 'xfactor': [...],
+     'attack_type_code': [...], 'defense_type_code': [...], 'size_code': [...]}
+Use encode() to convert a mapping that still holds type/size strings.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from battle_engine.combat import (
+    MAX_ROUNDS, MIN_DAMAGE, RANDOMNESS, SPECIAL_EVERY, SPECIAL_POWER, XFACTOR_WEIGHT, Combatant,
+)
+from battle_engine.tables import (
+    MATCHUP_TABLE, SIZE_TABLE, attack_type_code, defense_type_code, size_code,
+)
+
+# winners array values
+RED = 0
+BLUE = 1
+
+BATCH_FIELDS = ('attack', 'defense', 'speed', 'special_attack', 'special_defense', 'health',
+                'xfactor', 'attack_type_code', 'defense_type_code', 'size_code')
+STAT_FIELDS = BATCH_FIELDS[:7]
+
+BatchResult = namedtuple('BatchResult', ['winners', 'rounds', 'red_health', 'blue_health'])
+
+_MATCHUP = np.array(MATCHUP_TABLE)
+_SIZE = np.array(SIZE_TABLE)
+# stats a mapping leaves out get the same defaults as a bare Combatant
+_DEFAULTS = Combatant()
+
+
+def _codes(values):
+    return np.asarray(values, dtype=np.intp)
+
+
+def _column(side, field, size=None):
+    if field in side:
+        return np.asarray(side[field], dtype=np.float64)
+    return np.full(size, float(getattr(_DEFAULTS, field)))
+
+
+def encode(side):
+    """Copy of a stats mapping with attack_type/defense_type/size_class strings turned into codes"""
+    encoded = {field: side[field] for field in STAT_FIELDS if field in side}
+    encoded['attack_type_code'] = [attack_type_code(v) for v in side['attack_type']]
+    encoded['defense_type_code'] = [defense_type_code(v) for v in side['defense_type']]
+    encoded['size_code'] = [size_code(v) for v in side['size_class']]
+    return encoded
+
+
+def stack(bugs):
+    """Turn a list of Bug-like objects (or row tuples with the same names) into batch arrays"""
+    return {field: [getattr(bug, field) for bug in bugs] for field in BATCH_FIELDS}
+
+
+def _hit(attack, defense):
+    total = attack + defense
+    return np.divide(attack * attack, total, out=np.zeros_like(total), where=total > 0)
+
+
+def _damage(attacker, defender, size):
+    """(regular hit, special hit) damage arrays before randomness"""
+    attack_type = _codes(attacker['attack_type_code'])
+    scale = (
+        _MATCHUP[attack_type, _codes(defender['defense_type_code'])]
+        * _SIZE[attack_type, _codes(attacker['size_code']), _codes(defender['size_code'])]
+        * (1.0 + _column(attacker, 'xfactor', size) * XFACTOR_WEIGHT)
+    )
+    regular = _hit(_column(attacker, 'attack', size), _column(defender, 'defense', size)) * scale
+    special = _hit(_column(attacker, 'special_attack', size),
+                   _column(defender, 'special_defense', size)) * scale * SPECIAL_POWER
+    return regular, special
+
+
+def simulate_batch(red, blue, rng=None, max_rounds=MAX_ROUNDS) -> BatchResult:
+    """
+    Resolve len(red['attack']) fights at once
+
+    Args:
+        red: mapping of BATCH_FIELDS -> arrays for the red corner (stats left
+            out default to a bare Combatant's)
+        blue: same for the blue corner (same length)
+        rng: numpy Generator or seed (None = fresh entropy)
+
+    Returns:
+        BatchResult(winners, rounds, red_health, blue_health) - winners holds
+        RED/BLUE per fight, the rest match combat.FightResult
+    """
+    rng = np.random.default_rng(rng)
+    size = len(red['attack'])
+    if len(blue['attack']) != size:
+        raise ValueError('red and blue must have the same number of fights')
+
+    red_regular, red_special = _damage(red, blue, size)
+    blue_regular, blue_special = _damage(blue, red, size)
+    red_start = np.maximum(_column(red, 'health', size), 1.0)
+    blue_start = np.maximum(_column(blue, 'health', size), 1.0)
+    red_health = red_start.copy()
+    blue_health = blue_start.copy()
+
+    # faster bug acts first every round, coin flip on a speed tie
+    red_speed = _column(red, 'speed', size)
+    blue_speed = _column(blue, 'speed', size)
+    red_first = (red_speed > blue_speed) | ((red_speed == blue_speed) & (rng.random(size) < 0.5))
+
+    winners = np.full(size, -1, dtype=np.int8)
+    rounds = np.full(size, max_rounds, dtype=np.int64)
+    # fights still going, as indexes into the full arrays
+    live = np.arange(size)
+    for round_number in range(1, max_rounds + 1):
+        if not live.size:
+            break
+        special = round_number % SPECIAL_EVERY == 0
+        red_hits = (red_special if special else red_regular)[live]
+        blue_hits = (blue_special if special else blue_regular)[live]
+        luck = rng.uniform(1.0 - RANDOMNESS, 1.0 + RANDOMNESS, size=(2, live.size))
+        red_hits = np.maximum(red_hits * luck[0], MIN_DAMAGE)
+        blue_hits = np.maximum(blue_hits * luck[1], MIN_DAMAGE)
+
+        # first strike, then the other bug answers if it is still standing
+        first = red_first[live]
+        for strike in range(2):
+            red_turn = first if strike == 0 else ~first
+            blue_health[live[red_turn]] -= red_hits[red_turn]
+            red_health[live[~red_turn]] -= blue_hits[~red_turn]
+            down = np.where(red_turn, blue_health[live] <= 0.0, red_health[live] <= 0.0)
+            if down.any():
+                winners[live[down]] = np.where(red_turn[down], RED, BLUE)
+                rounds[live[down]] = round_number
+                keep = ~down
+                live, red_hits, blue_hits, first = live[keep], red_hits[keep], blue_hits[keep], first[keep]
+
+    # time's up - judges go by share of health left
+    if live.size:
+        red_share = red_health[live] / red_start[live]
+        blue_share = blue_health[live] / blue_start[live]
+        judged = np.where(red_share > blue_share, RED, BLUE).astype(np.int8)
+        ties = red_share == blue_share
+        if ties.any():
+            judged[ties] = rng.integers(RED, BLUE + 1, size=int(ties.sum()))
+        winners[live] = judged
+
+    np.maximum(red_health, 0.0, out=red_health)
+    np.maximum(blue_health, 0.0, out=blue_health)
+    return BatchResult(winners, rounds, red_health, blue_health)
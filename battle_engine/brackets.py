@@ -0,0 +1,195 @@
+"""
+Tournament Brackets
+
+Pairing logic only - entrants are plain integer indexes (0 = top seed) and
+the caller decides how fights are resolved. Every bracket has the same shape:
+
+    pairs = bracket.next_round()        # [(red, blue), ...]
+    bracket.report(pairs, winners)      # winners[i] = winning index of pairs[i]
+    bracket.finished / bracket.champion / bracket.eliminated
+
+Byes are handled inside the bracket and never show up in next_round().
+"""
+
+
+def bracket_order(size):
+    """
+    Standard seeding order for a bracket of `size` slots (power of two)
+    so the top seeds meet as late as possible: 8 -> [0, 7, 3, 4, 1, 6, 2, 5]
+    """
+    order = [0]
+    slots = 1
+    while slots < size:
+        slots *= 2
+        order = [x for seed in order for x in (seed, slots - 1 - seed)]
+    return order
+
+
+def _seeded_slots(n):
+    size = 1
+    while size < n:
+        size *= 2
+    return [seed if seed < n else None for seed in bracket_order(size)]
+
+
+def _adjacent(slots):
+    """Pair up neighbours; an odd one out is paired with None (a bye)"""
+    return [(slots[i], slots[i + 1] if i + 1 < len(slots) else None)
+            for i in range(0, len(slots), 2)]
+
+
+class _Bracket:
+    def __init__(self, n):
+        if n < 2:
+            raise ValueError('a tournament needs at least two entrants')
+        self.n = n
+        self.round = 0
+        self.champion = None
+        self.eliminated = {}  # entrant -> round they were knocked out
+
+    @property
+    def finished(self):
+        return self.champion is not None
+
+    def standings(self):
+        """Entrants best-first: champion, then whoever lasted longest"""
+        rest = sorted((i for i in range(self.n) if i != self.champion),
+                      key=lambda i: (-self.eliminated.get(i, self.round), i))
+        return [self.champion] + rest
+
+
+class SingleElimination(_Bracket):
+    def __init__(self, n):
+        super().__init__(n)
+        self.slots = _seeded_slots(n)
+
+    def next_round(self):
+        self.round += 1
+        return [(a, b) for a, b in _adjacent(self.slots) if a is not None and b is not None]
+
+    def report(self, pairs, winners):
+        results = dict(zip(pairs, winners))
+        advancing = []
+        for a, b in _adjacent(self.slots):
+            if a is None or b is None:
+                advancing.append(b if a is None else a)
+                continue
+            winner = results[(a, b)]
+            advancing.append(winner)
+            self.eliminated[b if winner == a else a] = self.round
+        self.slots = advancing
+        if len(self.slots) == 1:
+            self.champion = self.slots[0]
+
+
+class DoubleElimination(_Bracket):
+    """
+    Upper and lower bracket played side by side each round. Upper losers drop
+    to the lower bracket, lower losers are out. The grand final is replayed
+    once if the lower bracket champion wins it (both then have one loss).
+    """
+
+    def __init__(self, n):
+        super().__init__(n)
+        self.upper = _seeded_slots(n)
+        self.lower = []
+        self.losses = [0] * n
+
+    @property
+    def in_grand_final(self):
+        return len(self.upper) == 1 and len(self.lower) == 1
+
+    def next_round(self):
+        self.round += 1
+        if self.in_grand_final:
+            return [(self.upper[0], self.lower[0])]
+        pairs = [(a, b) for a, b in _adjacent(self.upper) if a is not None and b is not None]
+        pairs += [(a, b) for a, b in _adjacent(self.lower) if b is not None]
+        return pairs
+
+    def report(self, pairs, winners):
+        results = dict(zip(pairs, winners))
+
+        if self.in_grand_final:
+            (a, b), = pairs
+            winner = results[(a, b)]
+            loser = b if winner == a else a
+            self.losses[loser] += 1
+            if self.losses[loser] >= 2:
+                self.eliminated[loser] = self.round
+                self.champion = winner
+            return
+
+        upper, dropped = [], []
+        for a, b in _adjacent(self.upper):
+            if a is None or b is None:
+                upper.append(b if a is None else a)
+                continue
+            winner = results[(a, b)]
+            upper.append(winner)
+            dropped.append(b if winner == a else a)
+
+        lower = []
+        for a, b in _adjacent(self.lower):
+            if b is None:
+                lower.append(a)
+                continue
+            winner = results[(a, b)]
+            lower.append(winner)
+            self.eliminated[b if winner == a else a] = self.round
+
+        for loser in dropped:
+            self.losses[loser] += 1
+        self.upper = [x for x in upper if x is not None]
+        self.lower = lower + dropped
+        if len(self.upper) == 1 and not self.lower:
+            self.champion = self.upper[0]
+
+
+def round_robin_schedule(n):
+    """Circle method: n-1 rounds (n if odd) where everyone meets everyone once"""
+    players = list(range(n))
+    if n % 2:
+        players.append(None)
+    m = len(players)
+    rounds = []
+    for r in range(m - 1):
+        pairs = []
+        for i in range(m // 2):
+            a, b = players[i], players[m - 1 - i]
+            if a is None or b is None:
+                continue
+            # swap corners every other round so nobody is always red
+            pairs.append((b, a) if r % 2 else (a, b))
+        rounds.append(pairs)
+        players = [players[0], players[-1]] + players[1:-1]
+    return rounds
+
+
+class RoundRobin(_Bracket):
+    """Every round is known up front, so callers may resolve them all at once"""
+
+    def __init__(self, n):
+        super().__init__(n)
+        self.schedule = round_robin_schedule(n)
+        self.wins = [0] * n
+
+    def next_round(self):
+        self.round += 1
+        return self.schedule[self.round - 1]
+
+    def report(self, pairs, winners):
+        for winner in winners:
+            self.wins[winner] += 1
+        if self.round == len(self.schedule):
+            self.champion = max(range(self.n), key=lambda i: (self.wins[i], -i))
+
+    def standings(self):
+        return sorted(range(self.n), key=lambda i: (-self.wins[i], i))
+
+
+BRACKETS = {
+    'single_elimination': SingleElimination,
+    'double_elimination': DoubleElimination,
+    'round_robin': RoundRobin,
+}
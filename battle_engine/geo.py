@@ -0,0 +1,138 @@
+"""
+Geohash Cells
+
+A geohash interleaves longitude and latitude bits into a base-32 string, so
+every prefix is a rectangular cell and points in the same cell share the
+prefix. Stored on Bug.geohash, "who is near (lat, lon)" becomes a handful of
+indexed prefix range scans (cover()) plus an exact distance check on what
+they return - never a pass over every sighting.
+
+    precision  cell (at the equator)
+        3      156 x 156 km
+        4      39 x 20 km
+        5      4.9 x 4.9 km
+        6      1.2 x 0.6 km
+        9      4.8 x 4.8 m
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+DECODE = {char: value for value, char in enumerate(BASE32)}
+PRECISION = 9  # what Bug.geohash stores
+REGION_PRECISION = 4  # Bug.region - ~39 x 20 km leaderboard cells
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LON = 111.320  # at the equator, times cos(latitude)
+MAX_COVER_CELLS = 32
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    value = bits = 0
+    even = True  # bits alternate lon, lat, lon...
+    while len(chars) < precision:
+        span, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        if coordinate >= middle:
+            value = (value << 1) | 1
+            span[0] = middle
+        else:
+            value <<= 1
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            value = bits = 0
+    return ''.join(chars)
+
+
+def bounds(cell):
+    """(south, west, north, east) of a geohash cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = DECODE[char]
+        for shift in range(4, -1, -1):
+            span = lon_range if even else lat_range
+            middle = (span[0] + span[1]) / 2
+            if value >> shift & 1:
+                span[0] = middle
+            else:
+                span[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def cell_size(precision):
+    """(lat degrees, lon degrees) spanned by a cell of this precision"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _box(latitude, longitude, radius_km):
+    """Bounding box of the circle: (south, north, west, east), or None for west/east if it wraps the globe"""
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    south, north = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+    widest = max(abs(south), abs(north))
+    if widest >= 90.0:
+        return south, north, None, None  # circle reaches a pole - every longitude
+    lon_delta = radius_km / (KM_PER_DEGREE_LON * math.cos(math.radians(widest)))
+    if lon_delta >= 180.0:
+        return south, north, None, None
+    return south, north, longitude - lon_delta, longitude + lon_delta
+
+
+def _steps(low, high, step):
+    """low, low + step, ... and high itself - one sample in every cell row/column"""
+    values = []
+    value = low
+    while value < high:
+        values.append(value)
+        value += step
+    values.append(high)
+    return values
+
+
+def _wrap(longitude):
+    return (longitude + 180.0) % 360.0 - 180.0
+
+
+def cover(latitude, longitude, radius_km, max_cells=MAX_COVER_CELLS):
+    """
+    Geohash prefixes whose cells together contain every point within
+    radius_km of (latitude, longitude) - the finest precision that needs at
+    most max_cells of them
+    """
+    south, north, west, east = _box(latitude, longitude, radius_km)
+    if west is None:
+        west, east = -180.0, 180.0
+    best = 1  # 32 cells cover the globe
+    for precision in range(1, PRECISION + 1):
+        lat_step, lon_step = cell_size(precision)
+        rows = math.floor(north / lat_step) - math.floor(south / lat_step) + 1
+        columns = min(math.floor(east / lon_step) - math.floor(west / lon_step) + 1, 2 ** 30)
+        if rows * columns > max_cells:
+            break
+        best = precision
+    lat_step, lon_step = cell_size(best)
+    cells = set()
+    for lat in _steps(south, north, lat_step):
+        for lon in _steps(west, east, lon_step):
+            cells.add(encode(lat, _wrap(lon), best))
+    return sorted(cells)
+
+
+def prefix_range(prefix):
+    """[low, high) string range holding every geohash that starts with prefix"""
+    return prefix, prefix + '{'  # '{' sorts right after 'z', the last base-32 character
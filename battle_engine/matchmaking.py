@@ -0,0 +1,165 @@
+"""
+Matchmaking Index
+
+Bugs kept in sorted (key, bug_id) order, one SortedBuckets per
+(tier, size_class) partition, so "the k closest opponents to this rating" is
+a bisect plus a walk outwards instead of a table scan. The key is whatever
+the caller feeds in (Elo rating, power level...).
+
+Lookups are O(P log n + k log P) for P matching partitions. A partition is a
+list of short sorted buckets (at most 2 * BUCKET_SIZE items) plus each
+bucket's max, so an upsert or removal shifts one bucket - O(log n +
+BUCKET_SIZE) - instead of the whole partition like a flat insort would.
+"""
+import heapq
+from bisect import bisect_left, insort
+
+BUCKET_SIZE = 256
+
+
+class SortedBuckets:
+    """
+    Sorted multiset of comparable items as buckets of sorted lists.
+    Positions are (bucket, offset) cursors; buckets are never empty.
+    """
+
+    def __init__(self, bucket_size=BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        self.buckets = []
+        self.maxes = []  # maxes[i] == buckets[i][-1]
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for bucket in self.buckets:
+            yield from bucket
+
+    def add(self, item):
+        if not self.buckets:
+            self.buckets.append([item])
+            self.maxes.append(item)
+        else:
+            i = min(bisect_left(self.maxes, item), len(self.buckets) - 1)
+            bucket = self.buckets[i]
+            insort(bucket, item)
+            self.maxes[i] = bucket[-1]
+            if len(bucket) > 2 * self.bucket_size:
+                half = bucket[self.bucket_size:]
+                del bucket[self.bucket_size:]
+                self.buckets.insert(i + 1, half)
+                self.maxes[i] = bucket[-1]
+                self.maxes.insert(i + 1, half[-1])
+        self.length += 1
+
+    def remove(self, item):
+        """Raises ValueError if item isn't there"""
+        i = bisect_left(self.maxes, item)
+        if i < len(self.buckets):
+            bucket = self.buckets[i]
+            j = bisect_left(bucket, item)
+            if j < len(bucket) and bucket[j] == item:
+                del bucket[j]
+                if bucket:
+                    self.maxes[i] = bucket[-1]
+                else:
+                    del self.buckets[i]
+                    del self.maxes[i]
+                self.length -= 1
+                return
+        raise ValueError(f'{item!r} not in SortedBuckets')
+
+    def bisect_left(self, item):
+        """Cursor of the first item >= item (None past the end)"""
+        i = bisect_left(self.maxes, item)
+        if i == len(self.buckets):
+            return None
+        return i, bisect_left(self.buckets[i], item)
+
+    def last(self):
+        return (len(self.buckets) - 1, len(self.buckets[-1]) - 1) if self.buckets else None
+
+    def step(self, position, step):
+        """Cursor one item after (step=1) or before (step=-1) position, None off either end"""
+        i, j = position[0], position[1] + step
+        if j < 0:
+            i -= 1
+            if i < 0:
+                return None
+            j = len(self.buckets[i]) - 1
+        elif j >= len(self.buckets[i]):
+            i, j = i + 1, 0
+            if i == len(self.buckets):
+                return None
+        return i, j
+
+    def __getitem__(self, position):
+        return self.buckets[position[0]][position[1]]
+
+
+class MatchIndex:
+    def __init__(self):
+        self.partitions = {}  # (tier, size_class) -> SortedBuckets of (key, bug_id)
+        self.entries = {}     # bug_id -> (key, tier, size_class)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, bug_id):
+        return bug_id in self.entries
+
+    def key_of(self, bug_id):
+        return self.entries[bug_id][0]
+
+    def upsert(self, bug_id, key, tier=None, size_class=None):
+        key = float(key or 0)
+        if self.entries.get(bug_id) == (key, tier, size_class):
+            return
+        self.remove(bug_id)
+        self.entries[bug_id] = (key, tier, size_class)
+        partition = self.partitions.get((tier, size_class))
+        if partition is None:
+            partition = self.partitions[(tier, size_class)] = SortedBuckets()
+        partition.add((key, bug_id))
+
+    def remove(self, bug_id):
+        entry = self.entries.pop(bug_id, None)
+        if entry is None:
+            return
+        key, tier, size_class = entry
+        partition = self.partitions[(tier, size_class)]
+        partition.remove((key, bug_id))
+        if not partition:
+            del self.partitions[(tier, size_class)]
+
+    def nearest(self, key, k=5, tier=None, size_class=None, exclude=()):
+        """
+        Up to k bug ids closest to key, closest first.
+        tier / size_class of None match anything.
+        """
+        exclude = set(exclude)
+        heap = []
+        for (part_tier, part_size), partition in self.partitions.items():
+            if tier is not None and part_tier != tier:
+                continue
+            if size_class is not None and part_size != size_class:
+                continue
+            position = partition.bisect_left((key, -1))
+            # one cursor walking down and one walking up from the insertion point
+            below = partition.step(position, -1) if position is not None else partition.last()
+            for step, start in ((-1, below), (1, position)):
+                if start is not None:
+                    found, bug_id = partition[start]
+                    heapq.heappush(heap, (abs(found - key), bug_id, start, step, partition))
+
+        matches = []
+        while heap and len(matches) < k:
+            _, bug_id, position, step, partition = heapq.heappop(heap)
+            if bug_id not in exclude:
+                matches.append(bug_id)
+            position = partition.step(position, step)
+            if position is not None:
+                found, next_id = partition[position]
+                heapq.heappush(heap, (abs(found - key), next_id, position, step, partition))
+        return matches
@@ -0,0 +1,34 @@
+"""
+Battle Narratives
+
+Turns a packed fight log (battle_engine.combat.record_fight) back into the
+play-by-play text shown on the battle page. Nothing here is stored - the
+text is rebuilt from the log whenever it's needed.
+"""
+from battle_engine.combat import BLUE, RED, read_log
+
+HIT_VERBS = ('strikes', 'slams', 'bites', 'lunges at', 'hammers')
+SPECIAL_VERBS = ('unleashes a special move on', 'goes all out against', 'finds an opening on')
+
+
+def render_narrative(red_name, blue_name, log, winner_name=None):
+    """Play-by-play text for a fight log, one line per hit"""
+    fight_log = read_log(log)
+    names = {RED: red_name, BLUE: blue_name}
+
+    lines = [f'{red_name} ({fight_log.red_health} HP) vs {blue_name} ({fight_log.blue_health} HP)!']
+    for number, event in enumerate(fight_log.events):
+        target = BLUE if event.actor == RED else RED
+        verbs = SPECIAL_VERBS if event.special else HIT_VERBS
+        verb = verbs[number % len(verbs)]
+        lines.append(
+            f'Round {event.round}: {names[event.actor]} {verb} {names[target]} '
+            f'for {event.damage:.0f} damage ({event.health:.0f} HP left).'
+        )
+        if event.health <= 0.0:
+            lines.append(f'{names[target]} is down!')
+
+    if winner_name:
+        rounds = fight_log.events[-1].round if fight_log.events else 0
+        lines.append(f'{winner_name} wins after {rounds} round{"s" if rounds != 1 else ""}!')
+    return '\n'.join(lines)
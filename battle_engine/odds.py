@@ -0,0 +1,92 @@
+"""
+Win Odds
+
+Monte Carlo estimate of "how often does red beat blue": N seeded turn-based
+fights (battle_engine.combat) with a 95% Wilson confidence interval.
+
+Estimates are memoized in an LRU cache keyed on the combat stats of both
+bugs (Combatant.stats), not on bug ids - clones and unchanged bugs hit the
+cache, and editing a stat changes the key so stale odds are never served.
+The RNG seed is fixed, so the same matchup always gets the same answer.
+
+Latency target: a cache miss at DEFAULT_FIGHTS stays under 20ms, a hit
+under 0.1ms. Check with `python -m battle_engine.odds`.
+"""
+import math
+import random
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from battle_engine.combat import RED, Combatant, fight
+from battle_engine.tables import ATTACK_TYPES, DEFENSE_TYPES, SIZE_CLASSES
+
+DEFAULT_FIGHTS = 1000
+MAX_FIGHTS = 10000
+ODDS_SEED = 20240611
+ODDS_CACHE_SIZE = 4096
+Z_95 = 1.959964
+
+Odds = namedtuple('Odds', ['red_wins', 'fights', 'probability', 'low', 'high'])
+
+
+def wilson_interval(wins, n, z=Z_95):
+    """(low, high) Wilson score interval for a win rate"""
+    if n == 0:
+        return 0.0, 1.0
+    p = wins / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def win_odds(red, blue, fights=DEFAULT_FIGHTS) -> Odds:
+    """Red's chance of beating blue (both Combatants), memoized on their stats"""
+    fights = max(1, min(int(fights), MAX_FIGHTS))
+    return _cached_odds(red.stats, blue.stats, fights)
+
+
+@lru_cache(maxsize=ODDS_CACHE_SIZE)
+def _cached_odds(red_stats, blue_stats, fights):
+    red = Combatant(None, '', *red_stats)
+    blue = Combatant(None, '', *blue_stats)
+    rng = random.Random(ODDS_SEED)
+    red_wins = sum(1 for _ in range(fights) if fight(red, blue, rng).winner == RED)
+    low, high = wilson_interval(red_wins, fights)
+    return Odds(red_wins, fights, red_wins / fights, low, high)
+
+
+def cache_info():
+    return _cached_odds.cache_info()
+
+
+def clear_cache():
+    _cached_odds.cache_clear()
+
+
+def _benchmark(samples=200):
+    rng = random.Random(1)
+
+    def random_combatant():
+        return Combatant(None, '', *(rng.randint(1, 100) for _ in range(5)),
+                         rng.randint(50, 150), rng.uniform(-5, 5),
+                         rng.randint(0, len(ATTACK_TYPES)), rng.randint(0, len(DEFENSE_TYPES)),
+                         rng.randint(0, len(SIZE_CLASSES)))
+
+    pairs = [(random_combatant(), random_combatant()) for _ in range(samples)]
+    clear_cache()
+    for label in ('miss', 'hit'):
+        timings = []
+        for red, blue in pairs:
+            started = time.perf_counter()
+            win_odds(red, blue)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        p50 = timings[len(timings) // 2] * 1000
+        p95 = timings[int(len(timings) * 0.95)] * 1000
+        print(f'{label}: p50 {p50:.3f}ms  p95 {p95:.3f}ms  ({samples} matchups, {DEFAULT_FIGHTS} fights)')
+
+
+if __name__ == '__main__':
+    _benchmark()
@@ -0,0 +1,94 @@
+"""
+Parallel fight runner
+
+Spreads batch-engine fights (the same turn-based model as combat.fight) over
+a process pool. The roster (a stats snapshot, see batch.BATCH_FIELDS) is shipped to each worker once when the
+pool starts; after that a work unit is just two index arrays and a seed.
+
+Results are identical for any worker count: fights are cut into fixed-size
+chunks and every chunk gets its own child seed.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from battle_engine.batch import BATCH_FIELDS, RED, simulate_batch
+
+CHUNK_SIZE = 16384
+
+_roster = None
+
+
+def _init_worker(roster):
+    global _roster
+    _roster = roster
+
+
+def _resolve(roster, red_idx, blue_idx, seed):
+    red = {field: values[red_idx] for field, values in roster.items()}
+    blue = {field: values[blue_idx] for field, values in roster.items()}
+    return simulate_batch(red, blue, rng=np.random.default_rng(seed)).winners
+
+
+def _fight_chunk(red_idx, blue_idx, seed):
+    return _resolve(_roster, red_idx, blue_idx, seed)
+
+
+class FightPool:
+    """
+    Usage:
+        with FightPool(roster, workers=4) as pool:
+            winners = pool.fight(red_idx, blue_idx, seed=1)  # roster indexes of winners
+    """
+
+    def __init__(self, roster, workers=None):
+        self.roster = {field: np.asarray(roster[field]) for field in BATCH_FIELDS if field in roster}
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self._executor = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.roster,),
+            )
+        return self
+
+    def __exit__(self, *exc):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def fight(self, red_idx, blue_idx, seed=None):
+        """Resolve red_idx[i] vs blue_idx[i]; returns the winning roster index per fight"""
+        red_idx = np.asarray(red_idx, dtype=np.intp)
+        blue_idx = np.asarray(blue_idx, dtype=np.intp)
+        starts = range(0, len(red_idx), CHUNK_SIZE)
+        seeds = np.random.SeedSequence(seed).spawn(len(starts))
+        chunks = [(red_idx[s:s + CHUNK_SIZE], blue_idx[s:s + CHUNK_SIZE], child)
+                  for s, child in zip(starts, seeds)]
+
+        if self._executor is None or len(chunks) < 2:
+            flags = [_resolve(self.roster, *chunk) for chunk in chunks]
+        else:
+            flags = list(self._executor.map(_fight_chunk, *zip(*chunks)))
+
+        if not flags:
+            return np.empty(0, dtype=np.intp)
+        flags = np.concatenate(flags)
+        return np.where(flags == RED, red_idx, blue_idx)
+
+    def fight_rounds(self, rounds, seed=None):
+        """
+        Resolve several independent rounds (lists of (red, blue) pairs) in one go.
+        Returns one winners array per round.
+        """
+        sizes = [len(pairs) for pairs in rounds]
+        flat = [pair for pairs in rounds for pair in pairs]
+        if not flat:
+            return [np.empty(0, dtype=np.intp) for _ in rounds]
+        red_idx, blue_idx = zip(*flat)
+        winners = self.fight(red_idx, blue_idx, seed=seed)
+        return np.split(winners, np.cumsum(sizes)[:-1])
@@ -0,0 +1,156 @@
+"""
+Ratings and Tiers
+
+Elo rating updates plus TierIndex, an order-statistics structure over all
+ratings so tiers (rating percentiles) can be kept current in O(log n) per
+battle instead of sorting the whole roster.
+
+Tiers, best first, with the share of the roster each one covers:
+    uber 5%, ou 15%, uu 20%, ru 20%, nu 20%, zu the rest
+"""
+import math
+
+DEFAULT_RATING = 1500.0
+K_FACTOR = 32.0
+
+TIERS = ('uber', 'ou', 'uu', 'ru', 'nu', 'zu')
+# cumulative share of the roster covered by each tier (zu takes whatever is left)
+TIER_CUTOFFS = (0.05, 0.20, 0.40, 0.60, 0.80)
+
+# ratings are bucketed to whole points; anything outside is clamped
+RATING_BUCKETS = 5000
+
+
+def expected_score(rating, opponent_rating):
+    return 1.0 / (1.0 + 10.0 ** ((opponent_rating - rating) / 400.0))
+
+
+def elo_delta(winner_rating, loser_rating, k=K_FACTOR):
+    """Points the winner gains (and the loser drops)"""
+    return k * (1.0 - expected_score(winner_rating, loser_rating))
+
+
+def rate_outcomes(ratings, outcomes, k=K_FACTOR):
+    """
+    Apply (winner_id, loser_id) outcomes in order to a {bug_id: rating} dict.
+    Unknown ids start at DEFAULT_RATING. Mutates and returns `ratings`.
+    """
+    for winner_id, loser_id in outcomes:
+        winner = ratings.get(winner_id, DEFAULT_RATING)
+        loser = ratings.get(loser_id, DEFAULT_RATING)
+        delta = elo_delta(winner, loser, k)
+        ratings[winner_id] = winner + delta
+        ratings[loser_id] = loser - delta
+    return ratings
+
+
+def rating_bucket(rating):
+    if rating is None:
+        rating = DEFAULT_RATING
+    return min(max(int(math.floor(rating + 0.5)), 0), RATING_BUCKETS - 1)
+
+
+class TierIndex:
+    """
+    Fenwick tree counting bugs per rating bucket, highest rating first.
+
+    add/remove/move and tier_of are all O(log RATING_BUCKETS); cuts() gives
+    the lowest bucket still inside each tier, so callers can tell which
+    rating band needs re-tiering after the boundaries shift.
+    """
+
+    def __init__(self, ratings=()):
+        self.size = RATING_BUCKETS
+        self.tree = [0] * (self.size + 1)
+        self.count = 0
+        counts = [0] * self.size
+        for rating in ratings:
+            counts[self._position(rating)] += 1
+            self.count += 1
+        # O(n) Fenwick build from bucket counts
+        for i in range(1, self.size + 1):
+            self.tree[i] += counts[i - 1]
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def _position(self, rating):
+        # position 0 = highest bucket
+        return self.size - 1 - rating_bucket(rating)
+
+    def _update(self, position, delta):
+        i = position + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, position):
+        """Bugs at positions 0..position (ratings in this bucket or higher)"""
+        total = 0
+        i = position + 1
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def _first_position_reaching(self, target):
+        """Smallest position whose prefix count is >= target (size if none)"""
+        position = 0
+        remaining = target
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self.tree[nxt] < remaining:
+                position = nxt
+                remaining -= self.tree[nxt]
+            step >>= 1
+        return position  # 0-based index of the first position reaching target
+
+    def add(self, rating):
+        self._update(self._position(rating), 1)
+        self.count += 1
+
+    def remove(self, rating):
+        self._update(self._position(rating), -1)
+        self.count -= 1
+
+    def move(self, old_rating, new_rating):
+        old, new = self._position(old_rating), self._position(new_rating)
+        if old != new:
+            self._update(old, -1)
+            self._update(new, 1)
+
+    def count_above(self, rating):
+        """Bugs in strictly higher rating buckets"""
+        position = self._position(rating)
+        return self._prefix(position - 1) if position > 0 else 0
+
+    def tier_of(self, rating):
+        above = self.count_above(rating)
+        for tier, cutoff in zip(TIERS, TIER_CUTOFFS):
+            if above < cutoff * self.count:
+                return tier
+        return TIERS[-1]
+
+    def cuts(self):
+        """
+        Lowest rating bucket that still belongs to each tier (one per cutoff).
+        A bug is in TIERS[i] or better iff rating_bucket(rating) >= cuts()[i].
+        """
+        result = []
+        for cutoff in TIER_CUTOFFS:
+            target = cutoff * self.count
+            # first position whose prefix reaches the cutoff - everything at or
+            # above it has fewer than `target` bugs strictly above
+            position = self._first_position_reaching(target) if target > 0 else 0
+            result.append(self.size - 1 - min(position, self.size - 1))
+        return tuple(result)
+
+
+def tier_for(rating, cuts):
+    """tier_of() from a cuts() snapshot - no index needed"""
+    bucket = rating_bucket(rating)
+    for tier, cut in zip(TIERS, cuts):
+        if bucket >= cut:
+            return tier
+    return TIERS[-1]
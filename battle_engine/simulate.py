@@ -0,0 +1,179 @@
+"""
+Mass Simulation
+
+Runs turn-based fights (battle_engine.combat) for a stream of matchups over
+a process pool - balance studies, rating backfills, anything offline. Used
+by `flask brawl simulate`, but needs neither Flask nor a database:
+
+    roster = load_snapshots('bugs.jsonl')
+    for row in simulate(roster, all_pairs(len(roster)), seed=1, workers=4):
+        ...
+
+Memory stays bounded however many pairs there are: pairs are generated
+lazily, cut into CHUNK_SIZE work units, and only a few units per worker are
+in flight at once. Results come back in pair order and are identical for any
+worker count - every chunk gets its own child seed.
+"""
+import csv
+import itertools
+import json
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from battle_engine.combat import RED, Combatant, fight
+from battle_engine.tables import attack_type_code, defense_type_code, size_code
+
+CHUNK_SIZE = 2048
+MAX_PENDING_PER_WORKER = 4
+
+RESULT_FIELDS = ('red_id', 'blue_id', 'winner_id', 'rounds', 'red_health', 'blue_health')
+SNAPSHOT_FIELDS = ('id', 'nickname', 'attack', 'defense', 'speed', 'special_attack',
+                   'special_defense', 'health', 'xfactor', 'attack_type', 'defense_type',
+                   'size_class', 'attack_type_code', 'defense_type_code', 'size_code')
+_NUMERIC = {'id': int, 'attack': int, 'defense': int, 'speed': int, 'special_attack': int,
+            'special_defense': int, 'health': int, 'xfactor': float,
+            'attack_type_code': int, 'defense_type_code': int, 'size_code': int}
+
+_roster = None
+
+
+def combatant_from_row(row) -> Combatant:
+    """Combatant from a mapping keyed by Bug column names (missing/blank = Combatant default)"""
+    values = {}
+    for field in SNAPSHOT_FIELDS:
+        value = row.get(field)
+        if value not in (None, ''):
+            values[field] = _NUMERIC[field](value) if field in _NUMERIC else value
+    if 'id' not in values:
+        raise ValueError(f'Snapshot row without an id: {row}')
+    # type/size strings only fill in codes the row doesn't already carry
+    attack_type = values.pop('attack_type', None)
+    defense_type = values.pop('defense_type', None)
+    size_class = values.pop('size_class', None)
+    values['attack_type_code'] = values.get('attack_type_code') or attack_type_code(attack_type)
+    values['defense_type_code'] = values.get('defense_type_code') or defense_type_code(defense_type)
+    values['size_code'] = values.get('size_code') or size_code(size_class)
+    return Combatant(bug_id=values.pop('id'), name=values.pop('nickname', ''), **values)
+
+
+def load_snapshots(path):
+    """Combatants from a .csv file (header row) or a JSON-lines file"""
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            return [combatant_from_row(row) for row in csv.DictReader(f)]
+        return [combatant_from_row(json.loads(line)) for line in f if line.strip()]
+
+
+def all_pairs(count):
+    """Every unordered pair of roster indexes"""
+    return itertools.combinations(range(count), 2)
+
+
+def random_pairs(count, n, seed=None):
+    """n random pairs of distinct roster indexes"""
+    if count < 2:
+        raise ValueError('Need at least two bugs to make pairs')
+    rng = random.Random(seed)
+    for _ in range(n):
+        red = rng.randrange(count)
+        blue = rng.randrange(count - 1)
+        yield red, blue if blue < red else blue + 1
+
+
+def read_pairs(path, roster):
+    """(red_id, blue_id) per line of a CSV file -> roster index pairs. # starts a comment"""
+    index_of = {combatant.bug_id: i for i, combatant in enumerate(roster)}
+    with open(path, newline='') as f:
+        for line_number, row in enumerate(csv.reader(f), start=1):
+            if not row or row[0].lstrip().startswith('#'):
+                continue
+            try:
+                yield index_of[int(row[0])], index_of[int(row[1])]
+            except (IndexError, KeyError, ValueError):
+                raise ValueError(f'{path}:{line_number}: expected two known bug ids, got {row}')
+
+
+def parse_pairs(spec, roster, seed=None):
+    """'all', 'random:N' or a pairs file path -> iterator of roster index pairs"""
+    if spec == 'all':
+        return all_pairs(len(roster))
+    if spec.startswith('random:'):
+        try:
+            n = int(spec.split(':', 1)[1])
+        except ValueError:
+            raise ValueError(f'random:N needs a number, got {spec}')
+        return random_pairs(len(roster), n, seed)
+    if os.path.exists(spec):
+        return read_pairs(spec, roster)
+    raise ValueError(f'pairs must be all, random:N or an existing file, got {spec}')
+
+
+def _init_worker(roster):
+    global _roster
+    _roster = roster
+
+
+def _fight_chunk(roster, pairs, state):
+    rng = random.Random(state)
+    rows = []
+    for red_idx, blue_idx in pairs:
+        red, blue = roster[red_idx], roster[blue_idx]
+        result = fight(red, blue, rng)
+        winner = red if result.winner == RED else blue
+        rows.append((red.bug_id, blue.bug_id, winner.bug_id, result.rounds,
+                     round(result.red_health, 2), round(result.blue_health, 2)))
+    return rows
+
+
+def _pooled_chunk(pairs, state):
+    return _fight_chunk(_roster, pairs, state)
+
+
+def _chunks(pairs, seed):
+    root = np.random.SeedSequence(seed)
+    pairs = iter(pairs)
+    for chunk_number in itertools.count():
+        chunk = list(itertools.islice(pairs, CHUNK_SIZE))
+        if not chunk:
+            return
+        child = np.random.SeedSequence(root.entropy, spawn_key=(chunk_number,))
+        yield chunk, int.from_bytes(child.generate_state(4).tobytes(), 'little')
+
+
+def simulate(roster, pairs, seed=None, workers=None):
+    """Yield one RESULT_FIELDS tuple per (red index, blue index) pair, in order"""
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    if workers <= 1:
+        for chunk, state in _chunks(pairs, seed):
+            yield from _fight_chunk(roster, chunk, state)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(roster,)) as executor:
+        pending = deque()
+        for chunk, state in _chunks(pairs, seed):
+            pending.append(executor.submit(_pooled_chunk, chunk, state))
+            if len(pending) >= workers * MAX_PENDING_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def write_results(rows, out, format='jsonl'):
+    """Stream result rows to a text file object. Returns the number written"""
+    count = 0
+    if format == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(RESULT_FIELDS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            out.write(json.dumps(dict(zip(RESULT_FIELDS, row))) + '\n')
+            count += 1
+    return count
@@ -0,0 +1,123 @@
+"""
+Compiled lookup tables
+
+MATCHUP_MATRIX / SIZE_BASE_MODIFIER / SIZE_AGNOSTIC_ATTACKS flattened into
+dense tables indexed by small integer codes, built once at import.
+Code 0 always means "unknown / not set" and is neutral (1.0).
+
+    MATCHUP_TABLE[attack code][defense code]          -> type multiplier
+    SIZE_TABLE[attack code][my size code][their size] -> my size multiplier
+
+Run `python -m battle_engine.tables` to check the tables against the
+string-based helpers in battle_engine.matchups.
+"""
+from battle_engine.matchups import (
+    MATCHUP_MATRIX, SIZE_ORDER, SIZE_BASE_MODIFIER, SIZE_AGNOSTIC_ATTACKS,
+    get_matchup_multiplier, get_size_multipliers,
+)
+
+UNKNOWN = 0
+
+ATTACK_TYPES = tuple(MATCHUP_MATRIX)
+DEFENSE_TYPES = tuple(next(iter(MATCHUP_MATRIX.values())))
+SIZE_CLASSES = tuple(SIZE_ORDER)
+
+ATTACK_TYPE_CODES = {name: code for code, name in enumerate(ATTACK_TYPES, start=1)}
+DEFENSE_TYPE_CODES = {name: code for code, name in enumerate(DEFENSE_TYPES, start=1)}
+SIZE_CODES = {name: code for code, name in enumerate(SIZE_CLASSES, start=1)}
+
+# size step difference -> multiplier when SIZE_BASE_MODIFIER has no entry either way
+_DIFF_DEFAULT = {0: 1.0, 1: 1.15, 2: 1.30, 3: 1.40}
+
+
+def attack_type_code(name) -> int:
+    return ATTACK_TYPE_CODES.get((name or '').lower(), UNKNOWN)
+
+
+def defense_type_code(name) -> int:
+    return DEFENSE_TYPE_CODES.get((name or '').lower(), UNKNOWN)
+
+
+def size_code(name) -> int:
+    return SIZE_CODES.get(name, UNKNOWN)
+
+
+def _size_multiplier(size_a, size_b):
+    """Explicit mapping, then reciprocal of the reverse pair, then step difference"""
+    explicit = SIZE_BASE_MODIFIER.get((size_a, size_b))
+    if explicit is not None:
+        return explicit
+    reverse = SIZE_BASE_MODIFIER.get((size_b, size_a))
+    if reverse is not None:
+        return 1.0 / reverse if reverse != 0 else 1.0
+    diff = SIZE_ORDER.index(size_a) - SIZE_ORDER.index(size_b)
+    step = _DIFF_DEFAULT[min(abs(diff), 3)]
+    return step if diff >= 0 else 1.0 / step
+
+
+def _build_matchup_table():
+    table = [[1.0] * (len(DEFENSE_TYPES) + 1) for _ in range(len(ATTACK_TYPES) + 1)]
+    for attack_type, i in ATTACK_TYPE_CODES.items():
+        for defense_type, j in DEFENSE_TYPE_CODES.items():
+            table[i][j] = MATCHUP_MATRIX[attack_type][defense_type]
+    return tuple(tuple(row) for row in table)
+
+
+def _build_size_table():
+    n = len(SIZE_CLASSES) + 1
+    by_size = [[1.0] * n for _ in range(n)]
+    for size_a, a in SIZE_CODES.items():
+        for size_b, b in SIZE_CODES.items():
+            by_size[a][b] = round(_size_multiplier(size_a, size_b), 3)
+    by_size = tuple(tuple(row) for row in by_size)
+    neutral = tuple(tuple([1.0] * n) for _ in range(n))
+
+    # size-agnostic attacks (venom/chemical) ignore size entirely
+    table = [by_size]  # unknown attack type still gets size modifiers
+    for attack_type in ATTACK_TYPES:
+        table.append(neutral if attack_type in SIZE_AGNOSTIC_ATTACKS else by_size)
+    return tuple(table)
+
+
+MATCHUP_TABLE = _build_matchup_table()
+SIZE_TABLE = _build_size_table()
+
+
+def check_conformance():
+    """
+    Compare every table cell with the string helpers.
+
+    Returns a list of mismatch descriptions (empty = tables are good)
+    """
+    mismatches = []
+    attack_types = (None,) + ATTACK_TYPES
+    sizes = (None,) + SIZE_CLASSES
+
+    for attack_type in attack_types:
+        for defense_type in (None,) + DEFENSE_TYPES:
+            expected = get_matchup_multiplier(attack_type, defense_type)
+            got = MATCHUP_TABLE[attack_type_code(attack_type)][defense_type_code(defense_type)]
+            if got != expected:
+                mismatches.append(f'matchup {attack_type} vs {defense_type}: {got} != {expected}')
+
+    for attack_a in attack_types:
+        for attack_b in attack_types:
+            for size_a in sizes:
+                for size_b in sizes:
+                    expected = get_size_multipliers(size_a, size_b, attack_a, attack_b)
+                    a, b = size_code(size_a), size_code(size_b)
+                    got = (SIZE_TABLE[attack_type_code(attack_a)][a][b],
+                           SIZE_TABLE[attack_type_code(attack_b)][b][a])
+                    if got != expected:
+                        mismatches.append(
+                            f'size {size_a}/{attack_a} vs {size_b}/{attack_b}: {got} != {expected}'
+                        )
+    return mismatches
+
+
+if __name__ == '__main__':
+    problems = check_conformance()
+    for problem in problems:
+        print(problem)
+    print('tables OK' if not problems else f'{len(problems)} mismatches')
+    raise SystemExit(1 if problems else 0)
@@ -0,0 +1,349 @@
+"""
+Benchmark suite - python benchmark.py [--size small|medium|large] [--baseline FILE] [--save]
+
+Builds a seeded synthetic arena in a temporary SQLite database (same seed,
+same roster and battle history) and measures:
+
+- engine: battles' engine work per second (calculate_battle_power_per_s -
+  see METRIC_NOTES), get_size_multipliers calls per second, fights per
+  second (turn-based and batch engine), simulate_battle() per second
+  including its database writes
+- views: p50 / p95 latency and SQL statements per request for index,
+  dashboard and list_battles (first page and a page deep in the history)
+
+    size     bugs        battles
+    small    1,000       10,000
+    medium   100,000     1,000,000
+    large    1,000,000   10,000,000
+
+Results are printed and, with --save, written to --baseline as JSON. Given
+an existing baseline the run is compared against it and exits 1 if any
+metric got worse by more than --threshold (default 20%) - or if any view
+runs more SQL statements than it used to. Baselines from an older
+METRICS_VERSION measured different things and have to be saved again.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+SIZES = {
+    'small': (1_000, 10_000),
+    'medium': (100_000, 1_000_000),
+    'large': (1_000_000, 10_000_000),
+}
+SEED_CHUNK = 100_000
+VIEW_REQUESTS = 50
+VIEW_WARMUP = 3
+REPEATS = 3  # timings are best of REPEATS
+DEFAULT_THRESHOLD = 0.20
+
+HIGHER, LOWER, EXACT = 'higher', 'lower', 'exact'  # which direction is better
+
+# 2: turn-based batch engine, calculate_battle_power_per_s times the real battle path
+METRICS_VERSION = 2
+# printed under the results for metrics whose name no longer says what they time
+METRIC_NOTES = {
+    'calculate_battle_power_per_s': 'calculate_battle_power is gone - this is a battle\'s engine work '
+                                    '(two Combatant.from_bug snapshots and a record_fight) per second',
+}
+
+
+def make_config(uri):
+    from config import ProductionConfig
+
+    class BenchmarkConfig(ProductionConfig):
+        SQLALCHEMY_DATABASE_URI = uri
+        SECRET_KEY = 'benchmark'
+        QUERY_BUDGET_ENABLED = True  # X-Query-Count on every response
+        QUERY_BUDGET_STRICT = False
+        METRICS_ENABLED = False
+        ARENA_STATS_TTL = 0  # every view request pays for its own stats read
+        NARRATOR_WORKERS = 1
+    return BenchmarkConfig
+
+
+def seed_database(app, bugs, battles, seed):
+    """Roster and battle history written straight through the driver - minutes, not hours, at 10M rows"""
+    from flask_migrate import upgrade
+    from app import db
+    from app.models import User
+    from battle_engine.ratings import DEFAULT_RATING
+    from battle_engine.tables import (
+        ATTACK_TYPES, DEFENSE_TYPES, SIZE_CLASSES, attack_type_code, defense_type_code, size_code,
+    )
+
+    rng = np.random.default_rng(seed)
+    with app.app_context():
+        upgrade(directory=os.path.join(basedir, 'migrations'))
+        user = User(username='benchmark', email='benchmark@example.com')
+        user.set_password('benchmark')
+        db.session.add(user)
+        db.session.commit()
+
+        conn = db.session.connection()
+        started = datetime(2024, 1, 1)
+        for start in range(0, bugs, SEED_CHUNK):
+            n = min(SEED_CHUNK, bugs - start)
+            stats = rng.integers(20, 101, size=(n, 5))
+            health = rng.integers(60, 141, size=n)
+            xfactor = rng.uniform(-5, 5, size=n)
+            attack = rng.choice(ATTACK_TYPES, size=n)
+            defense = rng.choice(DEFENSE_TYPES, size=n)
+            size = rng.choice(SIZE_CLASSES, size=n)
+            conn.exec_driver_sql(
+                'INSERT INTO bug (nickname, nickname_key, species, image_path, user_id, attack, defense, '
+                'speed, special_attack, special_defense, health, xfactor, attack_type, defense_type, '
+                'size_class, attack_type_code, defense_type_code, size_code, wins, losses, rating, '
+                'submission_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 0, ?, ?)',
+                [(f'bug{start + i}', f'bug{start + i}', 'benchmark', 'benchmark.jpg', user.id,
+                  *map(int, stats[i]), int(health[i]), float(xfactor[i]),
+                  str(attack[i]), str(defense[i]), str(size[i]),
+                  attack_type_code(str(attack[i])), defense_type_code(str(defense[i])), size_code(str(size[i])),
+                  DEFAULT_RATING, str(started + timedelta(minutes=start + i))) for i in range(n)],
+            )
+
+        wins = np.zeros(bugs + 1, dtype=np.int64)
+        fought = np.zeros(bugs + 1, dtype=np.int64)
+        for start in range(0, battles, SEED_CHUNK):
+            n = min(SEED_CHUNK, battles - start)
+            red = rng.integers(1, bugs + 1, size=n)
+            blue = (red + rng.integers(0, bugs - 1, size=n)) % bugs + 1  # never red
+            winner = np.where(rng.random(n) < 0.5, red, blue)
+            wins += np.bincount(winner, minlength=bugs + 1)
+            fought += np.bincount(red, minlength=bugs + 1) + np.bincount(blue, minlength=bugs + 1)
+            conn.exec_driver_sql(
+                'INSERT INTO battle (red_corner_bug_id, blue_corner_bug__id, winner_id, seed, battle_date) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(int(red[i]), int(blue[i]), int(winner[i]), start + i,
+                  str(started + timedelta(seconds=30 * (start + i)))) for i in range(n)],
+            )
+        # records to match the history
+        conn.exec_driver_sql(
+            'UPDATE bug SET wins = ?, losses = ? WHERE id = ?',
+            [(int(wins[i]), int(fought[i] - wins[i]), i) for i in np.flatnonzero(fought)],
+        )
+        db.session.commit()
+
+
+def _best_rate(count, function):
+    """Operations per second for function() doing `count` operations, best of REPEATS"""
+    best = None
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+
+def engine_metrics(app, bugs, seed):
+    from app import db
+    from app.models import Bug
+    from app.routes.battles import simulate_battle
+    from battle_engine.batch import simulate_batch
+    from battle_engine.combat import Combatant, fight, record_fight
+    from battle_engine.matchups import get_size_multipliers
+    from battle_engine.tables import ATTACK_TYPES, DEFENSE_TYPES, SIZE_CLASSES
+
+    rng = random.Random(seed)
+    random.seed(seed)  # simulate_battle rolls its seed on the global RNG
+    metrics = {}
+    with app.app_context():
+        sample = db.session.query(Bug).filter(Bug.id.in_(rng.sample(range(1, bugs + 1), min(bugs, 1000)))).all()
+
+        battles = 20_000
+        matchups = [(sample[rng.randrange(len(sample))], sample[rng.randrange(len(sample))], rng.getrandbits(31))
+                    for _ in range(battles)]
+
+        def battle_engine():
+            for red, blue, battle_seed in matchups:
+                record_fight(Combatant.from_bug(red), Combatant.from_bug(blue), battle_seed)
+        metrics['calculate_battle_power_per_s'] = (_best_rate(battles, battle_engine), HIGHER)
+
+        calls = 200_000
+        size_pairs = [(rng.choice(SIZE_CLASSES), rng.choice(SIZE_CLASSES), rng.choice(ATTACK_TYPES),
+                       rng.choice(ATTACK_TYPES)) for _ in range(calls)]
+        metrics['get_size_multipliers_per_s'] = (
+            _best_rate(calls, lambda: [get_size_multipliers(*pair) for pair in size_pairs]), HIGHER)
+
+        fighters = [Combatant.from_bug(bug) for bug in sample]
+        fights = 20_000
+        pairs = [(rng.choice(fighters), rng.choice(fighters)) for _ in range(fights)]
+
+        def turn_based():
+            fight_rng = random.Random(seed)
+            for red, blue in pairs:
+                fight(red, blue, fight_rng)
+        metrics['fights_per_s'] = (_best_rate(fights, turn_based), HIGHER)
+
+        batch = 1_000_000
+        np_rng = np.random.default_rng(seed)
+        red, blue = ({
+            'attack': np_rng.integers(20, 101, size=batch),
+            'defense': np_rng.integers(20, 101, size=batch),
+            'speed': np_rng.integers(20, 101, size=batch),
+            'special_attack': np_rng.integers(20, 101, size=batch),
+            'special_defense': np_rng.integers(20, 101, size=batch),
+            'health': np_rng.integers(60, 141, size=batch),
+            'xfactor': np_rng.uniform(-5, 5, size=batch),
+            'attack_type_code': np_rng.integers(1, len(ATTACK_TYPES) + 1, size=batch),
+            'defense_type_code': np_rng.integers(1, len(DEFENSE_TYPES) + 1, size=batch),
+            'size_code': np_rng.integers(1, len(SIZE_CLASSES) + 1, size=batch),
+        } for _ in range(2))
+        metrics['batch_fights_per_s'] = (
+            _best_rate(batch, lambda: simulate_batch(red, blue, np.random.default_rng(seed))), HIGHER)
+
+        battles = 200
+        ids = [(rng.randint(1, bugs), rng.randint(1, bugs)) for _ in range(battles * REPEATS)]
+        ids = [(a, b if b != a else a % bugs + 1) for a, b in ids]
+        remaining = iter(ids)
+
+        def battle_round():
+            for _ in range(battles):
+                red_id, blue_id = next(remaining)
+                simulate_battle(db.session.get(Bug, red_id), db.session.get(Bug, blue_id))
+        metrics['simulate_battle_per_s'] = (_best_rate(battles, battle_round), HIGHER)
+        db.session.remove()
+    return metrics
+
+
+def view_metrics(app):
+    from app import db
+    from app.models import Battle
+
+    with app.app_context():
+        middle = db.session.execute(
+            db.select(Battle.battle_date, Battle.id).order_by(Battle.battle_date, Battle.id)
+            .offset(db.session.query(Battle).count() // 2).limit(1)
+        ).first()
+        db.session.remove()
+    views = {
+        'index': '/',
+        'dashboard': '/dashboard',
+        'list_battles': '/battles',
+        'list_battles_deep': f'/battles?after={middle.battle_date.isoformat()},{middle.id}',
+    }
+
+    client = app.test_client()
+    metrics = {}
+    for name, url in views.items():
+        for _ in range(VIEW_WARMUP):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+        timings = []
+        for _ in range(VIEW_REQUESTS):
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        metrics[f'{name}_p50_ms'] = (timings[len(timings) // 2] * 1000, LOWER)
+        metrics[f'{name}_p95_ms'] = (timings[int(len(timings) * 0.95)] * 1000, LOWER)
+        metrics[f'{name}_queries'] = (int(response.headers.get('X-Query-Count', 0)), EXACT)
+    return metrics
+
+
+def run(size, seed):
+    from app import create_app
+
+    bugs, battles = SIZES[size]
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(make_config('sqlite:///' + os.path.join(tmp, 'benchmark.db')))
+        started = time.perf_counter()
+        seed_database(app, bugs, battles, seed)
+        print(f'seeded {bugs:,} bugs / {battles:,} battles in {time.perf_counter() - started:.1f}s',
+              file=sys.stderr)
+        metrics = view_metrics(app)
+        metrics.update(engine_metrics(app, bugs, seed))
+        with app.app_context():
+            from app import db
+            db.engine.dispose()
+    return {
+        'meta': {
+            'size': size, 'seed': seed, 'bugs': bugs, 'battles': battles, 'version': METRICS_VERSION,
+            'python': platform.python_version(), 'machine': platform.machine(),
+            'date': datetime.utcnow().isoformat(timespec='seconds'),
+        },
+        'metrics': {name: {'value': value, 'better': better} for name, (value, better) in metrics.items()},
+    }
+
+
+def compare(result, baseline, threshold):
+    """[(metric, baseline, current, change, regressed)] for metrics in both"""
+    rows = []
+    for name, current in result['metrics'].items():
+        previous = baseline['metrics'].get(name)
+        if previous is None:
+            continue
+        old, new, better = previous['value'], current['value'], current['better']
+        change = (new - old) / old if old else 0.0
+        if better == HIGHER:
+            regressed = change < -threshold
+        elif better == LOWER:
+            regressed = change > threshold
+        else:
+            regressed = new > old
+        rows.append((name, old, new, change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', choices=SIZES, default='small')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', default=None,
+                        help='baseline JSON (default: benchmark-<size>.json)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown as a fraction (0.2 = 20%%)')
+    parser.add_argument('--save', action='store_true', help='write this run as the new baseline')
+    args = parser.parse_args()
+    path = args.baseline or os.path.join(basedir, f'benchmark-{args.size}.json')
+
+    result = run(args.size, args.seed)
+    baseline = None
+    if os.path.exists(path):
+        with open(path) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('size') != args.size or baseline['meta'].get('seed') != args.seed:
+            sys.exit(f'{path} is a {baseline["meta"].get("size")} / seed {baseline["meta"].get("seed")} '
+                     f'baseline - run with the same --size and --seed')
+        if baseline['meta'].get('version', 1) != METRICS_VERSION:
+            if not args.save:
+                sys.exit(f'{path} was saved by an older benchmark that measured different things - '
+                         f'run with --save to start a new baseline')
+            baseline = None  # nothing comparable in it
+
+    regressions = []
+    if baseline is None:
+        for name, metric in result['metrics'].items():
+            print(f'{name:<32} {metric["value"]:>14,.2f}')
+    else:
+        print(f'{"metric":<32} {"baseline":>14} {"current":>14} {"change":>8}')
+        for name, old, new, change, regressed in compare(result, baseline, args.threshold):
+            print(f'{name:<32} {old:>14,.2f} {new:>14,.2f} {change:>+8.1%}{"  REGRESSION" if regressed else ""}')
+            if regressed:
+                regressions.append(name)
+    for name, note in METRIC_NOTES.items():
+        if name in result['metrics']:
+            print(f'* {name}: {note}')
+
+    if args.save:
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'baseline written to {path}', file=sys.stderr)
+    if regressions:
+        sys.exit(f'{len(regressions)} metric(s) regressed past {args.threshold:.0%}: {", ".join(regressions)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -16,3 +16,67 @@ class Config:
     UPLOAD_FOLDER = 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    IMAGE_WORKERS = 2  # thumbnail threads per process, 0 = build thumbnails inline
+    ARENA_STATS_TTL = 5  # seconds the homepage/dashboard numbers are cached per process
+    TIER_INDEX_TTL = 300  # seconds before a process rebuilds its rating tier index from the db
+    MATCHMAKING_TTL = 300  # same, for the matchmaking indexes
+    DUPLICATES_TTL = 300  # same, for the photo hash index (app/duplicates.py)
+    # stat generation queue (app/stat_jobs.py)
+    STAT_PROVIDER = 'local'
+    STAT_JOB_MAX_ATTEMPTS = 5
+    STAT_JOB_BACKOFF = 5  # seconds before the first retry, doubled each time
+    STAT_JOB_BACKOFF_MAX = 3600
+    STAT_JOB_TIMEOUT = 300  # a job running longer than this is handed to another worker
+    # tournaments are played by the same worker (app/tournaments.py)
+    TOURNAMENT_CONCURRENCY = 1  # running at once across all workers - each one uses every CPU
+    TOURNAMENT_WORKERS = None  # fight processes per tournament (None = one per CPU)
+    TOURNAMENT_TIMEOUT = 600  # seconds without a finished round before another worker takes over
+    # taxonomy lookups (app/taxonomy.py) - point the URLs at a local server in tests
+    TAXONOMY_PROVIDERS = ('gbif', 'inaturalist', 'wikipedia')
+    TAXONOMY_GBIF_URL = 'https://api.gbif.org/v1'
+    TAXONOMY_INATURALIST_URL = 'https://api.inaturalist.org/v1'
+    TAXONOMY_WIKIPEDIA_URL = 'https://en.wikipedia.org/w/api.php'
+    TAXONOMY_CACHE_TTL = 30 * 24 * 3600  # seconds a found taxon is trusted
+    TAXONOMY_NEGATIVE_TTL = 24 * 3600  # seconds a "no match" is trusted
+    TAXONOMY_TIMEOUT = 5
+    TAXONOMY_BATCH_WINDOW = 0.02  # seconds to wait for more names before sending a batch
+    # battle narrator (app/narrator.py)
+    NARRATOR_PROVIDER = 'local'  # local, ollama
+    NARRATOR_WORKERS = 4  # narrations generated at once per process
+    NARRATOR_MODEL = 'llama3'
+    NARRATOR_OLLAMA_URL = 'http://localhost:11434'
+    NARRATOR_TIMEOUT = 60
+    NARRATOR_LOCAL_DELAY = 0.0  # seconds between words from the local narrator
+
+
+class ProductionConfig(Config):
+    """
+    For gunicorn with several workers and --preload (see gunicorn.conf.py).
+    Every worker process has its own pool of POOL_SIZE connections - one per
+    gunicorn thread, plus a little overflow for background threads.
+    """
+    DEBUG = False
+    POOL_SIZE = int(os.environ.get('GUNICORN_THREADS', 4))
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': POOL_SIZE,
+        'max_overflow': 2,
+        'pool_timeout': 10,  # seconds to wait for a free connection
+        'pool_recycle': 3600,
+    }
+    # run on every new SQLite connection (app/database.py)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',  # readers no longer block the writer (or each other)
+        'synchronous': 'NORMAL',  # fsync at checkpoints instead of every commit - safe with WAL
+        'busy_timeout': 5000,  # ms a writer waits for the lock before "database is locked"
+        'mmap_size': 256 * 1024 * 1024,  # read pages straight from the OS page cache
+    }
+    # how the driver opens its transactions - IMMEDIATE takes the write lock
+    # at BEGIN (waiting busy_timeout for it) and holds it until commit
+    SQLITE_BEGIN = 'IMMEDIATE'
+
+
+# BUGBRAWL_CONFIG picks one (run.py defaults to development, wsgi.py to production)
+configs = {
+    'development': Config,
+    'production': ProductionConfig,
+}
@@ -0,0 +1,43 @@
+"""
+gunicorn settings - gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is imported once in the master (preload_app) and forked, so workers
+start fast and share its memory. Threads per worker match
+ProductionConfig.POOL_SIZE. Long-lived responses (narration streams) hold a
+thread, not a whole worker.
+
+Workers share their /metrics numbers through METRICS_MULTIPROC_DIR (see
+app/metrics.py), so any worker can answer a scrape with the server's totals.
+The directory is emptied on start; give each server on a host its own.
+"""
+import multiprocessing
+import os
+import tempfile
+
+bind = os.environ.get('BIND', '0.0.0.0:6000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+timeout = 60
+keepalive = 5
+max_requests = 5000  # recycle workers now and then
+max_requests_jitter = 500
+
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'bugbrawl-metrics'))
+
+
+def on_starting(server):
+    from app.metrics import clear_directory
+    clear_directory(os.environ['METRICS_MULTIPROC_DIR'])
+
+
+def post_fork(server, worker):
+    from app.database import dispose_after_fork
+    from wsgi import app
+    dispose_after_fork(app)
+
+
+def child_exit(server, worker):
+    from app.metrics import mark_process_dead
+    mark_process_dead(worker.pid, os.environ['METRICS_MULTIPROC_DIR'])
@@ -0,0 +1,163 @@
+"""
+SQLite load test - python loadtest.py [--processes 4 --threads 4 --seconds 10]
+
+Runs the same workload twice, each time on a fresh temporary database:
+
+- before: the development Config - no pragmas, deferred BEGIN, default pool
+- after:  ProductionConfig (WAL, synchronous=NORMAL, busy_timeout, mmap,
+          BEGIN IMMEDIATE, pool sizing)
+
+Every process builds its own app, like gunicorn workers, and runs threads
+that mix reads of /battles with simulate_battle() writes. Prints the journal
+mode the database file ended up in, operations per second and how many
+failed with "database is locked" for each run.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+PROFILES = ('before', 'after')
+
+
+def make_config(profile, uri):
+    from config import Config, ProductionConfig
+
+    base = ProductionConfig if profile == 'after' else Config
+
+    class LoadTestConfig(base):
+        SQLALCHEMY_DATABASE_URI = uri
+        SECRET_KEY = 'loadtest'
+        METRICS_ENABLED = False
+    return LoadTestConfig
+
+
+def setup_database(profile, uri, bugs, seed):
+    """Schema and roster, built under the profile's own config - journal_mode=WAL is
+    stored in the database file, so an 'after' setup would leave 'before' in WAL too"""
+    from flask_migrate import upgrade
+    from app import create_app, db
+    from app.models import Bug, User
+    from battle_engine.tables import ATTACK_TYPES, DEFENSE_TYPES, SIZE_CLASSES
+
+    app = create_app(make_config(profile, uri))
+    with app.app_context():
+        upgrade(directory=os.path.join(basedir, 'migrations'))
+        user = User(username='loadtest', email='loadtest@example.com')
+        user.set_password('loadtest')
+        db.session.add(user)
+        db.session.commit()
+        rng = random.Random(seed)
+        db.session.execute(insert(Bug), [{
+            'nickname': f'bug{i}', 'species': 'loadtest', 'image_path': 'loadtest.jpg', 'user_id': user.id,
+            'attack': rng.randint(1, 100), 'defense': rng.randint(1, 100), 'speed': rng.randint(1, 100),
+            'special_attack': rng.randint(1, 100), 'special_defense': rng.randint(1, 100),
+            'health': rng.randint(50, 150), 'xfactor': rng.uniform(-5, 5),
+            'attack_type': rng.choice(ATTACK_TYPES), 'defense_type': rng.choice(DEFENSE_TYPES),
+            'size_class': rng.choice(SIZE_CLASSES), 'wins': 0, 'losses': 0,
+        } for i in range(bugs)])
+        db.session.commit()
+        db.engine.dispose()
+
+
+def run_worker(profile, uri, threads, seconds, write_ratio, bugs, seed):
+    """One 'gunicorn worker': returns (reads, writes, locked, other errors)"""
+    import threading
+    from app import create_app, db
+    from app.models import Bug
+    from app.routes.battles import simulate_battle
+
+    app = create_app(make_config(profile, uri))
+    totals = [0, 0, 0, 0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def loop(number):
+        rng = random.Random(seed * 1000 + number)
+        client = app.test_client()
+        counts = [0, 0, 0, 0]
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                try:
+                    if rng.random() < write_ratio:
+                        red_id, blue_id = rng.sample(range(1, bugs + 1), 2)
+                        simulate_battle(db.session.get(Bug, red_id), db.session.get(Bug, blue_id))
+                        counts[1] += 1
+                    else:
+                        response = client.get('/battles')
+                        if response.status_code == 200:
+                            counts[0] += 1
+                        else:
+                            counts[3] += 1
+                except OperationalError as e:
+                    db.session.rollback()
+                    counts[2 if 'locked' in str(e) else 3] += 1
+            db.session.remove()
+        with lock:
+            for i, count in enumerate(counts):
+                totals[i] += count
+
+    workers = [threading.Thread(target=loop, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    with app.app_context():
+        db.engine.dispose()
+    return totals
+
+
+def run_profile(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = 'sqlite:///' + os.path.join(tmp, 'loadtest.db')
+        setup_database(profile, uri, args.bugs, args.seed)
+        jobs = [(profile, uri, args.threads, args.seconds, args.write_ratio, args.bugs, args.seed + n)
+                for n in range(args.processes)]
+        started = time.perf_counter()
+        with multiprocessing.Pool(args.processes) as pool:
+            results = pool.starmap(run_worker, jobs)
+        elapsed = time.perf_counter() - started
+        journal_mode = _journal_mode(uri)
+    reads, writes, locked, errors = (sum(column) for column in zip(*results))
+    return journal_mode, reads, writes, locked, errors, elapsed
+
+
+def _journal_mode(uri):
+    """What the database file itself says, read with plain sqlite3"""
+    import sqlite3
+    connection = sqlite3.connect(uri[len('sqlite:///'):])
+    try:
+        return connection.execute('PRAGMA journal_mode').fetchone()[0]
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4, help='app processes (gunicorn workers)')
+    parser.add_argument('--threads', type=int, default=4, help='threads per process')
+    parser.add_argument('--seconds', type=float, default=10.0, help='length of each run')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='share of operations that are battles')
+    parser.add_argument('--bugs', type=int, default=1000, help='roster size')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--profile', choices=PROFILES, action='append',
+                        help='run only this profile (default: both)')
+    args = parser.parse_args()
+
+    print(f'{args.processes} processes x {args.threads} threads, {args.seconds:g}s, '
+          f'{args.write_ratio:.0%} writes, {args.bugs} bugs')
+    print(f'{"profile":<8} {"journal":>8} {"ops/s":>9} {"reads/s":>9} {"writes/s":>9} {"locked":>7} {"errors":>7}')
+    for profile in args.profile or PROFILES:
+        journal_mode, reads, writes, locked, errors, elapsed = run_profile(profile, args)
+        print(f'{profile:<8} {journal_mode:>8} {(reads + writes) / elapsed:>9.1f} {reads / elapsed:>9.1f} '
+              f'{writes / elapsed:>9.1f} {locked:>7} {errors:>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""bug geohash and region
+
+Revision ID: 8b2f4c1d9e07
+Revises: 3d1e30326e63
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2f4c1d9e07'
+down_revision = '3d1e30326e63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bug', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('geohash', sa.String(length=12), nullable=True))
+        batch_op.add_column(sa.Column('region', sa.String(length=12), nullable=True))
+        batch_op.create_index(batch_op.f('ix_bug_geohash'), ['geohash'], unique=False)
+        batch_op.create_index('ix_bug_region_wins', ['region', 'wins'], unique=False)
+    # existing rows: `flask brawl geohash-bugs`
+
+
+def downgrade():
+    with op.batch_alter_table('bug', schema=None) as batch_op:
+        batch_op.drop_index('ix_bug_region_wins')
+        batch_op.drop_index(batch_op.f('ix_bug_geohash'))
+        batch_op.drop_column('region')
+        batch_op.drop_column('geohash')
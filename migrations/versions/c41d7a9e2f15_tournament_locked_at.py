@@ -0,0 +1,26 @@
+"""tournament locked_at
+
+Revision ID: c41d7a9e2f15
+Revises: 8b2f4c1d9e07
+Create Date: 2026-10-18 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7a9e2f15'
+down_revision = '8b2f4c1d9e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tournament', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('locked_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('tournament', schema=None) as batch_op:
+        batch_op.drop_column('locked_at')
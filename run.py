@@ -1,15 +1,16 @@
 """
 Application entry point
-Run this file to start the server: python run.py
+Run this file to start the development server: python run.py
+
+Create / update the tables first with `flask db upgrade`. In production
+serve wsgi.py with gunicorn instead (see gunicorn.conf.py).
 """
-from app import create_app, db
+import os
 
-app = create_app()
+from app import create_app
+from config import configs
 
-# Create database tables
-with app.app_context():
-    db.create_all()
-    print("Database initialized!")
+app = create_app(configs[os.environ.get('BUGBRAWL_CONFIG', 'development')])
 
 if __name__ == '__main__':
     # host='0.0.0.0' makes it accessible from other devices on your network
@@ -0,0 +1,77 @@
+"""
+Shared fixtures: an app on a throwaway SQLite file with the full schema, and
+a factory for bugs with seeded random stats
+"""
+import random
+
+import pytest
+
+from app import create_app, db
+from app.models import Bug, User
+from battle_engine.tables import ATTACK_TYPES, DEFENSE_TYPES, SIZE_CLASSES
+from config import Config
+
+
+@pytest.fixture
+def app(tmp_path, request):
+    """Parametrize indirectly with a dict to override config keys"""
+    class TestConfig(Config):
+        TESTING = True
+        SECRET_KEY = 'test'
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "test.db"}'
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        LOGIN_DISABLED = True
+        METRICS_ENABLED = False
+        locals().update(getattr(request, 'param', {}))
+
+    app = create_app(TestConfig)
+    _forget_process_state()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _forget_process_state():
+    """Per-process indexes and caches belong to the previous test's database"""
+    from app import duplicates, ratings, stats, taxonomy
+    from app.matchmaking import reset_match_indexes
+    ratings._index = None
+    duplicates.reset_hash_index()
+    reset_match_indexes()
+    stats.invalidate_arena_stats()
+    taxonomy.clear_memory_cache()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='tester', email='tester@example.com')
+    user.set_password('tester')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def make_bugs(user):
+    """make_bugs(n, seed=0) -> n committed bugs"""
+    def make(n, seed=0, **fields):
+        rng = random.Random(seed)
+        bugs = [Bug(
+            nickname=f'bug{seed}-{i}', species='testus bugus', image_path='bug.jpg', user_id=user.id,
+            attack=rng.randint(20, 100), defense=rng.randint(20, 100), speed=rng.randint(20, 100),
+            special_attack=rng.randint(20, 100), special_defense=rng.randint(20, 100),
+            health=rng.randint(60, 140), xfactor=rng.uniform(-5, 5),
+            attack_type=rng.choice(ATTACK_TYPES), defense_type=rng.choice(DEFENSE_TYPES),
+            size_class=rng.choice(SIZE_CLASSES), wins=0, losses=0, **fields,
+        ) for i in range(n)]
+        db.session.add_all(bugs)
+        db.session.commit()
+        return bugs
+    return make
@@ -0,0 +1,38 @@
+"""
+Balance sweep smoke test - a two-level grid and one sample, checking the
+shape of the report and the files it writes
+"""
+import csv
+
+import numpy as np
+
+from battle_engine.balance import analyze, archetypes, verdict, write_report
+from battle_engine.tables import ATTACK_TYPES, DEFENSE_TYPES, SIZE_CLASSES
+
+
+def test_sweep_shape_and_report(tmp_path):
+    report = analyze(grid=(25, 75), samples=1, seed=3)
+    n_kinds = len(archetypes())
+    assert len(report.archetypes) == n_kinds and len(report.profiles) == 8
+    assert report.fights == (n_kinds * 8) ** 2
+    assert report.matchups.shape == (n_kinds, n_kinds)
+    assert report.type_rates.shape == (len(ATTACK_TYPES), len(DEFENSE_TYPES))
+    assert report.size_rates.shape == (len(SIZE_CLASSES), len(SIZE_CLASSES))
+    assert report.archetype_rates.shape == (n_kinds,) and report.profile_rates.shape == (8,)
+    for rates in (report.matchups, report.type_rates, report.size_rates, report.profile_rates):
+        assert np.all((rates >= 0) & (rates <= 1))
+    # a mirror match is a coin flip give or take the red corner's first move
+    assert abs(np.diag(report.matchups).mean() - 0.5) < 0.1
+
+    paths = write_report(report, tmp_path / 'report')
+    assert sorted(path.rsplit('/', 1)[-1] for path in paths) == [
+        'archetypes.csv', 'matchups.csv', 'report.html', 'sizes.csv', 'stat_profiles.csv', 'types.csv']
+    with open(tmp_path / 'report' / 'archetypes.csv') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == n_kinds
+    assert [float(row['win_rate']) for row in rows] == sorted((float(row['win_rate']) for row in rows),
+                                                              reverse=True)
+    assert all(row['verdict'] == verdict(float(row['win_rate'])) for row in rows)
+    with open(tmp_path / 'report' / 'matchups.csv') as f:
+        assert len(list(csv.reader(f))) == n_kinds + 1
+    assert f'{report.fights:,} fights' in (tmp_path / 'report' / 'report.html').read_text()
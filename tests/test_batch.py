@@ -0,0 +1,59 @@
+"""
+Batch engine: the numpy turn loop plays the same model as combat.fight, so
+win rates, fight lengths and health left agree over many fights
+"""
+import random
+
+import numpy as np
+import pytest
+
+from battle_engine.batch import BATCH_FIELDS, RED, simulate_batch
+from battle_engine.combat import Combatant, fight
+
+FIGHTS = 20000
+
+
+def _random_combatant(rng, health=(50, 150)):
+    return Combatant(None, '', *(rng.randint(1, 100) for _ in range(5)),
+                     rng.randint(*health), rng.uniform(-5, 5),
+                     rng.randint(1, 6), rng.randint(1, 6), rng.randint(1, 4))
+
+
+def _compare(red, blue, max_rounds):
+    side = lambda combatant: {field: np.full(FIGHTS, getattr(combatant, field)) for field in BATCH_FIELDS}
+    batch = simulate_batch(side(red), side(blue), rng=1, max_rounds=max_rounds)
+    rng = random.Random(1)
+    single = [fight(red, blue, rng, max_rounds) for _ in range(FIGHTS)]
+
+    assert np.mean(batch.winners == RED) == pytest.approx(
+        np.mean([result.winner == RED for result in single]), abs=0.02)
+    assert batch.rounds.mean() == pytest.approx(np.mean([result.rounds for result in single]), rel=0.02)
+    assert batch.red_health.mean() == pytest.approx(
+        np.mean([result.red_health for result in single]), rel=0.05, abs=0.5)
+    assert batch.blue_health.mean() == pytest.approx(
+        np.mean([result.blue_health for result in single]), rel=0.05, abs=0.5)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_batch_matches_turn_based_fights(seed):
+    rng = random.Random(seed)
+    _compare(_random_combatant(rng), _random_combatant(rng), max_rounds=100)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_batch_matches_judges_decision(seed):
+    # too much health to finish in 3 rounds - the judges decide
+    rng = random.Random(seed)
+    _compare(_random_combatant(rng, (300, 500)), _random_combatant(rng, (300, 500)), max_rounds=3)
+
+
+def test_missing_stats_default_like_combatant():
+    red = {'attack': [80] * FIGHTS, 'defense': [40] * FIGHTS, 'speed': [60] * FIGHTS,
+           'attack_type_code': [1] * FIGHTS, 'defense_type_code': [2] * FIGHTS, 'size_code': [3] * FIGHTS}
+    blue = {'attack': [50] * FIGHTS, 'defense': [70] * FIGHTS, 'speed': [60] * FIGHTS,
+            'attack_type_code': [2] * FIGHTS, 'defense_type_code': [1] * FIGHTS, 'size_code': [2] * FIGHTS}
+    fill = lambda side: {**{field: [getattr(Combatant(), field)] * FIGHTS for field in BATCH_FIELDS}, **side}
+    defaulted = simulate_batch(red, blue, rng=2)
+    full = simulate_batch(fill(red), fill(blue), rng=2)
+    assert (defaulted.winners == full.winners).all()
+    assert (defaulted.rounds == full.rounds).all()
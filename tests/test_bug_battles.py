@@ -0,0 +1,73 @@
+"""
+/bug/<id>/battles: walking the cursor visits the bug's whole history newest
+first, from both corners, without skipping or repeating a battle - also when
+battles share a timestamp across a page boundary
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import Battle
+
+
+@pytest.fixture
+def history(make_bugs):
+    """50 battles for bugs[0], in runs of up to 4 sharing one battle_date; id -> (corner, date)"""
+    bugs = make_bugs(6)
+    hero, others = bugs[0], bugs[1:]
+    rng = random.Random(4)
+    start = datetime(2024, 1, 1)
+    battles = []
+    for i in range(50):
+        opponent = rng.choice(others)
+        red, blue = (hero, opponent) if rng.random() < 0.5 else (opponent, hero)
+        battles.append(Battle(red_corner_bug_id=red.id, blue_corner_bug__id=blue.id,
+                              winner_id=rng.choice((red, blue)).id,
+                              battle_date=start + timedelta(minutes=i // 4)))
+    # battles the hero isn't in, at the same timestamps
+    battles += [Battle(red_corner_bug_id=others[0].id, blue_corner_bug__id=others[1].id,
+                       battle_date=start + timedelta(minutes=i)) for i in range(12)]
+    rng.shuffle(battles)  # ids don't follow dates
+    db.session.add_all(battles)
+    db.session.commit()
+    return hero, sorted(((battle.battle_date, battle.id) for battle in battles
+                         if hero.id in (battle.red_corner_bug_id, battle.blue_corner_bug__id)), reverse=True)
+
+
+def _walk(client, bug_id, limit):
+    seen, after = [], None
+    while True:
+        url = f'/bug/{bug_id}/battles?limit={limit}' + (f'&after={after}' if after else '')
+        page = client.get(url).get_json()
+        assert len(page['battles']) <= max(1, limit)
+        seen += page['battles']
+        after = page['next_after']
+        if after is None:
+            return seen
+
+
+@pytest.mark.parametrize('limit', [1, 3, 4, 7, 20, 100])
+def test_cursor_walks_the_whole_history_once(client, history, limit):
+    hero, expected = history
+    seen = _walk(client, hero.id, limit)
+    assert [(datetime.fromisoformat(row['battle_date']), row['id']) for row in seen] == expected
+    for row in seen:
+        battle = db.session.get(Battle, row['id'])
+        corner = 'red' if battle.red_corner_bug_id == hero.id else 'blue'
+        assert row['corner'] == corner and row['won'] == (battle.winner_id == hero.id)
+
+
+def test_limit_is_clamped(client, history):
+    hero, expected = history
+    assert len(client.get(f'/bug/{hero.id}/battles?limit=0').get_json()['battles']) == 1
+    assert len(client.get(f'/bug/{hero.id}/battles?limit=-5').get_json()['battles']) == 1
+    assert [row['id'] for row in _walk(client, hero.id, -5)] == [battle_id for _, battle_id in expected]
+    assert len(client.get(f'/bug/{hero.id}/battles?limit=1000').get_json()['battles']) == len(expected)
+
+
+def test_bad_cursor_and_unknown_bug(client, history):
+    hero, _ = history
+    assert client.get(f'/bug/{hero.id}/battles?after=yesterday').status_code == 400
+    assert client.get('/bug/9999/battles').status_code == 404
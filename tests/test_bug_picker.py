@@ -0,0 +1,33 @@
+"""
+Typeahead prefix search (/battle/picker) matches LIKE 'prefix%' for any prefix
+"""
+import pytest
+
+from app import db
+from app.routes.battles import _prefix_upper
+
+MAX = '\U0010ffff'
+
+
+@pytest.mark.parametrize('prefix, upper', [
+    ('abc', 'abd'),
+    ('a' + MAX, 'b'),
+    ('a' + MAX + MAX, 'b'),
+    (MAX, None),
+    ('a\ud7ff', 'a\ue000'),  # U+D800-DFFF are surrogates
+])
+def test_prefix_upper(prefix, upper):
+    assert _prefix_upper(prefix) == upper
+
+
+def test_picker_matches_prefix_scan(client, make_bugs):
+    names = ['ant', 'antlion', 'anu', 'b', 'z' + MAX, 'z' + MAX + 'q', MAX, MAX + 'x', '\ud7ffbug', '\ue000']
+    for name, bug in zip(names, make_bugs(len(names))):
+        bug.nickname = name
+    db.session.commit()
+
+    for prefix in ['ant', 'z' + MAX, MAX, '\ud7ff', '\ue000', 'zz']:
+        response = client.get('/battle/picker', query_string={'q': prefix, 'limit': 50})
+        assert response.status_code == 200
+        assert sorted(row['nickname'] for row in response.get_json()) == \
+            sorted(name for name in names if name.startswith(prefix))
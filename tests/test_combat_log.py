@@ -0,0 +1,67 @@
+"""
+Fight logs replay to exactly where the fight ended, and tournament battles
+(no log) say why they have no play-by-play
+"""
+import math
+import random
+
+from app.models import Battle
+from app.routes.battles import simulate_battle
+from app.stat_jobs import work
+from app.tournaments import create_tournament
+from battle_engine.combat import BLUE, RED, Combatant, read_log, record_fight
+from battle_engine.narrative import render_narrative
+
+
+def _random_combatant(rng):
+    return Combatant(None, '', *(rng.randint(1, 100) for _ in range(5)), rng.randint(50, 150),
+                     rng.uniform(-5, 5), rng.randint(1, 6), rng.randint(1, 6), rng.randint(1, 4))
+
+
+def test_log_replays_to_the_result():
+    rng = random.Random(0)
+    for seed in range(2000):
+        red, blue = _random_combatant(rng), _random_combatant(rng)
+        result, log = record_fight(red, blue, seed)
+        fight_log = read_log(log)
+        health = {RED: fight_log.red_health, BLUE: fight_log.blue_health}
+        for event in fight_log.events:
+            target = BLUE if event.actor == RED else RED
+            assert event.damage == health[target] - event.health
+            health[target] = event.health
+        # knocked out means 0 in the log; still standing never rounds down to 0
+        assert health[RED] == math.ceil(result.red_health)
+        assert health[BLUE] == math.ceil(result.blue_health)
+        loser = BLUE if result.winner == RED else RED
+        if result.rounds < 100:
+            assert health[loser] == 0 and health[result.winner] > 0
+
+
+def test_narrative_ends_with_the_loser_down():
+    red = Combatant(1, 'Red', attack=90, health=60)
+    blue = Combatant(2, 'Blue', defense=20, health=60)
+    result, log = record_fight(red, blue, seed=3)
+    assert result.winner == RED
+    lines = render_narrative('Red', 'Blue', log, 'Red').splitlines()
+    assert lines[-2:] == ['Blue is down!', f'Red wins after {result.rounds} round{"s" if result.rounds != 1 else ""}!']
+    assert '(0 HP left)' in lines[-3]
+
+
+def test_single_battle_page_has_play_by_play(client, make_bugs):
+    red, blue = make_bugs(2)
+    battle = simulate_battle(red, blue)
+    page = client.get(f'/battle/{battle.id}').get_data(as_text=True)
+    assert 'Play-by-play' in page and 'Ringside' in page
+
+
+def test_tournament_battle_page_explains_missing_play_by_play(app, client, make_bugs):
+    bugs = make_bugs(4)
+    create_tournament('Cup', 'single_elimination', [bug.id for bug in bugs])
+    work(app, threads=1, burst=True)
+    battle = Battle.query.filter(Battle.tournament_id.isnot(None)).first()
+    response = client.get(f'/battle/{battle.id}')
+    page = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert 'Play-by-play' not in page and 'Ringside' not in page
+    assert 'no play-by-play' in page and 'Cup' in page
+    assert client.get(f'/battle/{battle.id}/narration').status_code == 404
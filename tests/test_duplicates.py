@@ -0,0 +1,99 @@
+"""
+find_duplicates() against a brute-force Hamming scan as bugs are inserted,
+rehashed and deleted - and a rolled-back transaction leaves the index as it was
+"""
+import random
+
+from app import db
+from app.duplicates import DUPLICATE_DISTANCE, find_duplicates, hash_index, to_signed, to_unsigned
+from app.models import Bug
+
+
+def _near(rng, base, bits):
+    for bit in rng.sample(range(64), bits):
+        base ^= 1 << bit
+    return base
+
+
+def _hashes(rng, count):
+    """Clusters of near-duplicates around a few photos, plus unrelated ones"""
+    bases = [rng.getrandbits(64) for _ in range(count // 10)]
+    return [_near(rng, rng.choice(bases), rng.randint(0, 14)) if i % 3 else rng.getrandbits(64)
+            for i in range(count)]
+
+
+def _brute_force(value, k=DUPLICATE_DISTANCE):
+    rows = db.session.query(Bug.id, Bug.image_hash).filter(Bug.image_hash.isnot(None))
+    found = ((bug_id, bin(to_unsigned(stored) ^ value).count('1')) for bug_id, stored in rows)
+    return sorted(((bug_id, distance) for bug_id, distance in found if distance <= k),
+                  key=lambda pair: (pair[1], pair[0]))
+
+
+def _check(queries):
+    for value in queries:
+        found = sorted(find_duplicates(value), key=lambda pair: (pair[1], pair[0]))
+        assert found == _brute_force(value), hex(value)
+
+
+def test_index_follows_inserts_updates_and_deletes(make_bugs):
+    rng = random.Random(3)
+    values = _hashes(rng, 600)
+    bugs = make_bugs(300)
+    for bug, value in zip(bugs, values):
+        bug.image_hash = to_signed(value)
+    db.session.commit()
+    queries = [_near(rng, value, rng.randint(0, 6)) for value in rng.sample(values, 40)]
+    _check(queries)  # built from the table
+
+    # inserts after the build
+    for bug, value in zip(make_bugs(300, seed=1), values[300:]):
+        bug.image_hash = to_signed(value)
+    db.session.commit()
+    _check(queries)
+
+    # rehash some, clear some, delete some
+    for bug in rng.sample(bugs, 40):
+        bug.image_hash = to_signed(rng.choice(values) ^ 1)
+    for bug in rng.sample(bugs, 20):
+        bug.image_hash = None
+    for bug in rng.sample(bugs, 30):
+        db.session.delete(bug)
+    db.session.commit()
+    _check(queries)
+
+
+def test_rollback_leaves_no_phantom_hashes(make_bugs):
+    rng = random.Random(5)
+    kept, dropped = make_bugs(2)
+    kept.image_hash = to_signed(rng.getrandbits(64))
+    db.session.commit()
+    hash_index()  # built, so later changes go through the queue
+    original = to_unsigned(kept.image_hash)
+    phantom = rng.getrandbits(64)
+
+    db.session.add(Bug(nickname='ghost', species='testus bugus', image_path='bug.jpg',
+                       user_id=kept.user_id, image_hash=to_signed(phantom)))
+    dropped.image_hash = to_signed(phantom ^ 1)
+    kept.image_hash = None
+    db.session.flush()
+    db.session.rollback()
+
+    assert find_duplicates(phantom) == [] == _brute_force(phantom)
+    assert find_duplicates(original) == [(kept.id, 0)] == _brute_force(original)
+
+    db.session.delete(kept)
+    db.session.flush()
+    db.session.rollback()
+    assert find_duplicates(original) == [(kept.id, 0)]
+
+
+def test_index_is_rebuilt_after_the_ttl(app, make_bugs):
+    bug, = make_bugs(1)
+    value = random.Random(9).getrandbits(64)
+    assert find_duplicates(value) == []
+    # written behind the process's back, as another worker would
+    db.session.execute(db.update(Bug).where(Bug.id == bug.id).values(image_hash=to_signed(value)))
+    db.session.commit()
+    assert find_duplicates(value) == []
+    app.config['DUPLICATES_TTL'] = 0
+    assert find_duplicates(value) == [(bug.id, 0)]
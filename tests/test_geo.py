@@ -0,0 +1,98 @@
+"""
+bugs_near() against brute-force haversine over a few thousand synthetic
+sightings - including the poles and the antimeridian, where geohash cells
+and bounding boxes wrap - and region_leaderboard() ordering
+"""
+import random
+from collections import Counter
+
+import pytest
+
+from app import db
+from app.geo import bugs_near, region_leaderboard
+from app.models import Bug
+from battle_engine.geo import distance_km
+
+QUERIES = [
+    (48.85, 2.35),  # dense cluster
+    (89.95, 10.0), (90.0, 0.0), (-89.9, -120.0),  # poles
+    (0.0, 179.99), (3.0, -179.95), (-8.0, 180.0),  # antimeridian, both sides
+    (60.0, 179.5), (-45.0, 100.0), (30.0, -60.0),  # sparse
+]
+
+
+@pytest.fixture
+def sightings(user):
+    rng = random.Random(7)
+    bugs = []
+    for i in range(3000):
+        zone = i % 5
+        if zone == 0:
+            latitude, longitude = rng.uniform(47, 51), rng.uniform(0, 5)
+        elif zone == 1:
+            latitude, longitude = rng.uniform(84, 90), rng.uniform(-180, 180)
+        elif zone == 2:
+            latitude, longitude = rng.uniform(-90, -84), rng.uniform(-180, 180)
+        elif zone == 3:
+            latitude, longitude = rng.uniform(-10, 10), rng.choice((-1, 1)) * rng.uniform(175, 180)
+        else:
+            latitude, longitude = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        bugs.append(Bug(nickname=f'bug{i}', species='testus bugus', image_path='bug.jpg', user_id=user.id,
+                        latitude=latitude, longitude=longitude, wins=rng.randint(0, 50), losses=0))
+    db.session.add_all(bugs)
+    db.session.flush()
+    rows = [(bug.id, bug.latitude, bug.longitude, bug.region, bug.wins) for bug in bugs]
+    db.session.commit()
+    return rows
+
+
+def _brute_force(sightings, latitude, longitude):
+    return sorted((distance_km(latitude, longitude, lat, lon), bug_id) for bug_id, lat, lon, _, _ in sightings)
+
+
+def _pairs(found):
+    return [(sighting.distance_km, sighting.bug_id) for sighting in found]
+
+
+def test_nearest_matches_brute_force(sightings):
+    for latitude, longitude in QUERIES:
+        expected = _brute_force(sightings, latitude, longitude)
+        for k in (1, 10, 50):
+            assert _pairs(bugs_near(latitude, longitude, k=k)) == expected[:k], (latitude, longitude, k)
+    # more than there are: every bug, nearest first
+    assert _pairs(bugs_near(0.0, 0.0, k=len(sightings) + 10)) == _brute_force(sightings, 0.0, 0.0)
+
+
+def test_radius_matches_brute_force(sightings):
+    for latitude, longitude in QUERIES:
+        everything = _brute_force(sightings, latitude, longitude)
+        for radius_km in (10, 200, 1500):
+            expected = [pair for pair in everything if pair[0] <= radius_km]
+            found = bugs_near(latitude, longitude, k=len(sightings), radius_km=radius_km)
+            assert _pairs(found) == expected, (latitude, longitude, radius_km)
+            assert _pairs(bugs_near(latitude, longitude, k=5, radius_km=radius_km)) == expected[:5]
+
+
+def test_region_leaderboard_ranks_by_wins(sightings):
+    regions = Counter(region for _, _, _, region, _ in sightings)
+    for region, count in regions.most_common(3):
+        members = [(bug_id, lat, lon, wins) for bug_id, lat, lon, bug_region, wins in sightings
+                   if bug_region == region]
+        board = region_leaderboard(region, limit=10)
+        expected = sorted(members, key=lambda member: (-member[3], member[0]))[:10]
+        assert [row['id'] for row in board['top']] == [member[0] for member in expected]
+        assert [row['wins'] for row in board['top']] == [member[3] for member in expected]
+        assert board['bugs'] == count
+        assert board['wins'] == sum(member[3] for member in members)
+        south, west, north, east = board['bounds']
+        assert all(south <= lat <= north and west <= lon <= east for _, lat, lon, _ in members)
+
+
+def test_near_rejects_bad_radius_and_points(client, sightings):
+    for radius in ('nan', 'inf', '-inf', '0', '-5'):
+        assert client.get(f'/bugs/near?lat=48.85&lon=2.35&radius_km={radius}').status_code == 400, radius
+    for point in ('lat=nan&lon=0', 'lat=0&lon=inf', 'lat=91&lon=0', 'lat=0'):
+        assert client.get(f'/bugs/near?{point}').status_code == 400, point
+    found = client.get('/bugs/near?lat=48.85&lon=2.35&radius_km=200&limit=3').get_json()
+    expected = [bug_id for distance, bug_id in _brute_force(sightings, 48.85, 2.35) if distance <= 200][:3]
+    assert len(expected) == 3 and [row['id'] for row in found] == expected
@@ -0,0 +1,82 @@
+"""
+Matchmaking index: bucketed partitions stay sorted, nearest() matches brute
+force, and the app's indexes only follow committed writes
+"""
+import random
+
+from app import db
+from app.matchmaking import find_opponents, match_indexes
+from app.models import Bug
+from app.results import BattleOutcome, record_battles
+from battle_engine.matchmaking import MatchIndex, SortedBuckets
+
+
+def test_sorted_buckets_stay_sorted():
+    rng = random.Random(0)
+    buckets, reference = SortedBuckets(bucket_size=4), []
+    for _ in range(5000):
+        if reference and rng.random() < 0.4:
+            item = rng.choice(reference)
+            reference.remove(item)
+            buckets.remove(item)
+        else:
+            item = (rng.randint(0, 100), rng.randint(0, 10))
+            reference.append(item)
+            buckets.add(item)
+        assert len(buckets) == len(reference)
+    assert list(buckets) == sorted(reference)
+    assert all(0 < len(bucket) <= 8 for bucket in buckets.buckets)
+    assert buckets.maxes == [bucket[-1] for bucket in buckets.buckets]
+
+
+def test_nearest_matches_brute_force():
+    rng = random.Random(1)
+    index, entries = MatchIndex(), {}
+    for _ in range(3000):
+        bug_id = rng.randrange(500)
+        if rng.random() < 0.2:
+            index.remove(bug_id)
+            entries.pop(bug_id, None)
+        else:
+            entry = (float(rng.randint(1000, 2000)), rng.choice(['ou', 'uu', None]), rng.choice(['tiny', 'large']))
+            index.upsert(bug_id, *entry)
+            entries[bug_id] = entry
+
+    for _ in range(200):
+        key, tier, k = rng.uniform(900, 2100), rng.choice(['ou', 'uu', None]), rng.randint(1, 20)
+        found = index.nearest(key, k, tier=tier, exclude=(7,))
+        expected = sorted((abs(entry[0] - key), bug_id) for bug_id, entry in entries.items()
+                          if bug_id != 7 and (tier is None or entry[1] == tier))[:k]
+        assert [abs(entries[bug_id][0] - key) for bug_id in found] == [distance for distance, _ in expected]
+
+
+def _index_ratings():
+    index = match_indexes()['rating']
+    return {bug_id: entry[0] for bug_id, entry in index.entries.items()}
+
+
+def test_index_follows_commits_not_rollbacks(app, make_bugs):
+    bugs = make_bugs(20)
+    match_indexes()
+    outcomes = [BattleOutcome(bugs[0].id, bug.id, bugs[0].id) for bug in bugs[1:]]
+
+    before = _index_ratings()
+    record_battles(outcomes, commit=False)
+    db.session.rollback()
+    assert _index_ratings() == before
+
+    record_battles(outcomes)
+    assert _index_ratings() == {bug.id: bug.rating for bug in Bug.query}
+    assert find_opponents(bugs[0].id, 3) == [bug_id for _, bug_id in sorted(
+        (abs(bug.rating - db.session.get(Bug, bugs[0].id).rating), bug.id)
+        for bug in Bug.query if bug.id != bugs[0].id)][:3]
+
+
+def test_orm_changes_wait_for_commit(app, make_bugs):
+    bug, = make_bugs(1)
+    match_indexes()
+    bug.attack, bug.defense, bug.speed = 1, 1, 1
+    db.session.flush()
+    assert match_indexes()['power'].key_of(bug.id) != 3
+    db.session.commit()
+    assert match_indexes()['power'].key_of(bug.id) == 3
@@ -0,0 +1,67 @@
+"""
+/metrics adds up every process sharing METRICS_MULTIPROC_DIR, and totals
+don't drop when a worker exits and is folded into the archive
+"""
+import multiprocessing
+import os
+
+import pytest
+
+from app import db
+from app.metrics import ARCHIVE_FILE, mark_process_dead
+
+SERIES = 'bugbrawl_requests_total{endpoint="battles.list_battles",method="GET",status="200"}'
+
+
+def _scrape(client):
+    for line in client.get('/metrics').get_data(as_text=True).splitlines():
+        if line.startswith(SERIES + ' '):
+            return int(line.split()[-1])
+    return 0
+
+
+def _worker(app, requests):
+    """A forked 'gunicorn worker' serving a few requests"""
+    with app.app_context():
+        db.engine.dispose(close=False)
+        client = app.test_client()
+        for _ in range(requests):
+            assert client.get('/battles').status_code == 200
+
+
+@pytest.mark.parametrize('app', [{'METRICS_ENABLED': True, 'METRICS_FLUSH_SECONDS': 0}], indirect=True)
+def test_metrics_add_up_across_processes(app, client, tmp_path):
+    directory = tmp_path / 'metrics'
+    directory.mkdir()
+    app.config['METRICS_MULTIPROC_DIR'] = str(directory)
+    client.get('/battles')
+    before = _scrape(client)
+
+    workers = [multiprocessing.get_context('fork').Process(target=_worker, args=(app, requests))
+               for requests in (3, 5)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+    assert _scrape(client) == before + 8
+
+    # the first worker exits: its numbers move to the archive, totals hold
+    mark_process_dead(workers[0].pid, str(directory))
+    assert (directory / ARCHIVE_FILE).exists()
+    assert not any(name.startswith(f'metrics-{workers[0].pid}-') for name in os.listdir(directory))
+    assert _scrape(client) == before + 8
+    mark_process_dead(workers[1].pid, str(directory))
+    client.get('/battles')
+    assert _scrape(client) == before + 9
+
+
+@pytest.mark.parametrize('app', [{'METRICS_ENABLED': True}], indirect=True)
+def test_without_a_directory_each_process_reports_its_own(app, client):
+    app.config['METRICS_MULTIPROC_DIR'] = None
+    client.get('/battles')
+    before = _scrape(client)
+    worker = multiprocessing.get_context('fork').Process(target=_worker, args=(app, 2))
+    worker.start()
+    worker.join()
+    assert _scrape(client) == before
@@ -0,0 +1,120 @@
+"""
+Narrator: SSE output, late listeners replaying what was said so far, and
+finished narrations served from the Narration table
+"""
+import json
+import threading
+
+import pytest
+
+from app import narrator
+from app.models import Narration
+from app.narrator import (
+    LocalNarrator, NarrationRequest, NarratorProvider, narration_key, narration_stream, sse_events,
+)
+from app.routes.battles import battle_narrative, simulate_battle
+
+
+class _Gated(NarratorProvider):
+    """Says one word per release() - lets a test join halfway through"""
+    name = 'gated'
+
+    def __init__(self, words):
+        self.words = words
+        self.calls = 0
+        self.released = threading.Semaphore(0)
+
+    def stream(self, request, settings):
+        self.calls += 1
+        for word in self.words:
+            self.released.acquire()
+            yield word
+
+    def release(self, count=1):
+        for _ in range(count):
+            self.released.release()
+
+
+class _Broken(NarratorProvider):
+    name = 'broken'
+
+    def stream(self, request, settings):
+        yield 'Welcome'
+        raise RuntimeError('model went away')
+
+
+def _events(lines):
+    """[(event, data)] from SSE text"""
+    events = []
+    for block in ''.join(lines).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@pytest.fixture
+def battle(make_bugs):
+    red, blue = make_bugs(2)
+    return simulate_battle(red, blue)
+
+
+def test_local_narrator_streams_the_play_by_play_word_by_word():
+    request = NarrationRequest('Red', 'Blue', 'Red', 'Red strikes Blue.\nBlue is down!')
+    chunks = list(LocalNarrator().stream(request, {}))
+    assert chunks == ['Welcome ', 'to ', 'the ', 'arena!\nRed ', 'strikes ', 'Blue.\nBlue ', 'is ', 'down!']
+    assert ''.join(chunks) == f'Welcome to the arena!\n{request.play_by_play}'
+
+
+def test_narration_streams_then_is_served_from_the_table(app, client, battle, monkeypatch):
+    response = client.get(f'/battle/{battle.id}/narration')
+    assert response.mimetype == 'text/event-stream'
+    events = _events(response.get_data(as_text=True))
+    assert events[-1] == ('done', None)
+    text = ''.join(data for kind, data in events if kind == 'chunk')
+    assert text == f'Welcome to the arena!\n{battle_narrative(battle)}'
+    assert Narration.query.one().text == text
+
+    # cache hit: nothing reaches the provider, the whole text comes as one chunk
+    def unreachable(*args):
+        raise AssertionError('narrated twice')
+    monkeypatch.setattr(LocalNarrator, 'stream', unreachable)
+    events = _events(client.get(f'/battle/{battle.id}/narration').get_data(as_text=True))
+    assert events == [('chunk', text), ('done', None)]
+    page = client.get(f'/battle/{battle.id}').get_data(as_text=True)
+    assert 'EventSource' not in page and 'Welcome to the arena!' in page
+
+
+def test_late_listener_gets_what_was_said_so_far(app, battle, monkeypatch):
+    provider = _Gated(['One ', 'two ', 'three ', 'four'])
+    monkeypatch.setitem(narrator._providers, 'gated', provider)
+    app.config['NARRATOR_PROVIDER'] = 'gated'
+
+    first = narration_stream(battle, 'play-by-play')
+    early = sse_events(first)
+    provider.release(2)
+    heard = [next(early), next(early)]
+
+    late = narration_stream(battle, 'play-by-play')
+    assert late is first  # joined the narration in progress, not a second one
+    late_events = sse_events(late)
+    replay = [next(late_events), next(late_events)]
+    assert replay == heard
+
+    provider.release(2)
+    rest = list(early)
+    assert replay + list(late_events) == heard + rest
+    assert _events(heard + rest) == [('chunk', 'One '), ('chunk', 'two '), ('chunk', 'three '),
+                                     ('chunk', 'four'), ('done', None)]
+    assert provider.calls == 1
+    assert Narration.query.filter_by(key=narration_key(battle, 'gated')).one().text == 'One two three four'
+
+
+def test_failure_is_a_failed_event_not_error(app, client, battle, monkeypatch):
+    monkeypatch.setitem(narrator._providers, 'broken', _Broken())
+    app.config['NARRATOR_PROVIDER'] = 'broken'
+    body = client.get(f'/battle/{battle.id}/narration').get_data(as_text=True)
+    assert 'event: error' not in body
+    kind, message = _events(body)[-1]
+    assert kind == 'failed' and 'play-by-play instead' in message
+    assert Narration.query.count() == 0
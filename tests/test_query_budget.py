@@ -0,0 +1,56 @@
+"""
+List and arena views stay inside their query budgets (QUERY_BUDGET_STRICT)
+"""
+import pytest
+
+from app import db
+from app.models import ArenaStats
+from app.query_budget import QueryBudgetExceeded
+from app.results import BattleOutcome, record_battles
+from app.routes import main
+from app.stats import arena_snapshot, invalidate_arena_stats
+
+VIEWS = ['/', '/dashboard', '/battles', '/battles?page=2']
+
+
+@pytest.fixture
+def arena(app, make_bugs):
+    assert app.config['QUERY_BUDGET_STRICT']  # on by default under TESTING
+    bugs = make_bugs(30)
+    record_battles(BattleOutcome(red.id, blue.id, red.id) for red, blue in zip(bugs, bugs[1:] * 2))
+    app.config['ARENA_STATS_TTL'] = 0  # every request reads its own snapshot
+
+
+@pytest.mark.parametrize('url', VIEWS)
+def test_views_within_budget(client, arena, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert int(response.headers['X-Query-Count']) <= 3
+
+
+@pytest.mark.parametrize('url', ['/', '/dashboard'])
+def test_missing_stats_row_within_budget(client, arena, url):
+    db.session.query(ArenaStats).delete()
+    db.session.commit()
+    invalidate_arena_stats()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert int(response.headers['X-Query-Count']) == main.ARENA_QUERY_BUDGET
+    assert db.session.get(ArenaStats, 1) is None  # aggregated for the page, not written
+    snapshot = arena_snapshot()
+    assert (snapshot['total_bugs'], snapshot['total_users'], snapshot['total_battles']) == (30, 1, 30)
+
+
+def test_keyset_page_within_budget(client, arena):
+    first = client.get('/battles?after=9999-12-31T00:00:00,0')
+    assert int(first.headers['X-Query-Count']) == 1
+    cursor = first.get_data(as_text=True).split('after=')[1].split('"')[0]
+    response = client.get(f'/battles?after={cursor}')
+    assert response.status_code == 200
+    assert int(response.headers['X-Query-Count']) == 1
+
+
+def test_over_budget_fails_the_request(app, client, arena, monkeypatch):
+    monkeypatch.setattr(app.view_functions['main.dashboard'], 'query_budget', 2)
+    with pytest.raises(QueryBudgetExceeded, match=r'main.dashboard ran 3 SQL statements \(budget 2\)'):
+        client.get('/dashboard')
@@ -0,0 +1,62 @@
+"""
+The in-process tier index only follows committed rating changes
+"""
+from app import db
+from app.models import Bug
+from app.ratings import rate_battles, tier_index
+from app.results import BattleOutcome, record_battles
+from battle_engine.ratings import TierIndex
+
+
+def _in_step_with_table():
+    fresh = TierIndex(db.session.execute(db.select(Bug.rating)).scalars())
+    index = tier_index()
+    return index.count == fresh.count and index.tree == fresh.tree
+
+
+def _outcomes(bugs):
+    top = bugs[0]
+    return [BattleOutcome(top.id, bug.id, top.id) for bug in bugs[1:]]
+
+
+def test_committed_battles_move_the_index(app, make_bugs):
+    bugs = make_bugs(40)
+    tier_index()
+    record_battles(_outcomes(bugs))
+    assert _in_step_with_table()
+    assert db.session.get(Bug, bugs[0].id).tier == 'uber'
+
+
+def test_rolled_back_battles_leave_the_index_alone(app, make_bugs):
+    bugs = make_bugs(40)
+    before = list(tier_index().tree)
+    record_battles(_outcomes(bugs), commit=False)
+    db.session.rollback()
+    assert tier_index().tree == before
+    assert _in_step_with_table()
+
+
+def test_several_rating_passes_in_one_transaction(app, make_bugs):
+    bugs = make_bugs(40)
+    tier_index()
+    ids = [bug.id for bug in bugs]
+    rate_battles(ids[:20], ids[20:])
+    rate_battles(ids[:20], ids[20:])
+    db.session.commit()
+    assert _in_step_with_table()
+    tiers = {bug.id: bug.tier for bug in Bug.query}
+    index = tier_index()
+    assert all(tiers[bug.id] == index.tier_of(bug.rating) for bug in Bug.query)
+
+
+def test_new_and_deleted_bugs_wait_for_commit(app, make_bugs):
+    make_bugs(10)
+    count = tier_index().count
+    extra = make_bugs(5, seed=1)
+    assert tier_index().count == count + 5
+    for bug in extra:
+        db.session.delete(bug)
+    db.session.flush()
+    assert tier_index().count == count + 5
+    db.session.rollback()
+    assert _in_step_with_table()
@@ -0,0 +1,62 @@
+"""
+Concurrent battle writers never lose a win/loss increment
+"""
+import random
+import threading
+
+import pytest
+
+from app import db
+from app.models import Battle, Bug
+from app.results import BattleOutcome, record_battles
+from config import ProductionConfig
+
+THREADS = 8
+BATCHES = 25
+
+
+# with a deferred BEGIN the driver runs reads outside the write lock, so
+# this is where a read-modify-write would lose increments
+@pytest.mark.parametrize('app', [
+    {'SQLITE_PRAGMAS': ProductionConfig.SQLITE_PRAGMAS, 'SQLITE_BEGIN': 'IMMEDIATE'},
+    {'SQLITE_PRAGMAS': ProductionConfig.SQLITE_PRAGMAS, 'SQLITE_BEGIN': 'DEFERRED'},
+    {},  # development: SQLite's defaults
+], indirect=True, ids=['immediate', 'deferred', 'development'])
+def test_no_lost_increments_on_a_hot_bug(app, make_bugs):
+    hot, *others = make_bugs(9)
+    hot_id, other_ids = hot.id, [bug.id for bug in others]
+    errors = []
+    start = threading.Barrier(THREADS)
+
+    def writer(number):
+        rng = random.Random(number)
+        # own app context = own session and connection
+        with app.app_context():
+            try:
+                start.wait()
+                for _ in range(BATCHES):
+                    opponent = rng.choice(other_ids)
+                    red, blue = (hot_id, opponent) if rng.random() < 0.5 else (opponent, hot_id)
+                    record_battles([
+                        BattleOutcome(red, blue, rng.choice((red, blue))),
+                        BattleOutcome(opponent, rng.choice([i for i in other_ids if i != opponent]), opponent),
+                    ])
+            except Exception as e:  # surfaced below - a thread can't fail the test itself
+                errors.append(e)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    db.session.expire_all()
+    hot = db.session.get(Bug, hot_id)
+    assert hot.wins + hot.losses == THREADS * BATCHES
+    assert Battle.query.count() == 2 * THREADS * BATCHES
+    # every battle gave out exactly one win and one loss
+    totals = db.session.query(db.func.sum(Bug.wins), db.func.sum(Bug.losses)).one()
+    assert totals == (2 * THREADS * BATCHES, 2 * THREADS * BATCHES)
@@ -0,0 +1,147 @@
+"""
+Stat job queue with LocalStatProvider: claiming, retries with backoff, the
+per-provider concurrency limit, stale-lock reclaim - and the battle views and
+/stats-status agreeing on when a bug may battle
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, stat_jobs
+from app.models import StatJob
+from app.stat_jobs import (
+    LocalStatProvider, SNAPSHOT_FIELDS, StatProvider, backoff, claim_job, enqueue_stats, run_job, stats_pending,
+)
+
+
+class _Flaky(StatProvider):
+    name = 'flaky'
+    concurrency = 1
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    def generate(self, bug):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('provider timed out')
+        return LocalStatProvider().generate(bug)
+
+
+@pytest.fixture
+def flaky(monkeypatch):
+    def install(failures):
+        provider = _Flaky(failures)
+        monkeypatch.setitem(stat_jobs._providers, 'flaky', provider)
+        return provider
+    return install
+
+
+def _ready(client, bug):
+    return client.get(f'/bug/{bug.id}/stats-status').get_json()['battle_ready']
+
+
+def _due_now(job_id):
+    db.session.get(StatJob, job_id).run_after = datetime.utcnow()
+    db.session.commit()
+
+
+def test_claim_and_run_writes_the_stats(client, make_bugs):
+    bug, = make_bugs(1)
+    job = enqueue_stats(bug.id)
+    assert enqueue_stats(bug.id).id == job.id  # one active job per bug
+    assert stats_pending([bug.id]) == {bug.id} and not _ready(client, bug)
+
+    assert claim_job('w1') == job.id
+    assert claim_job('w2') is None  # nobody else gets it
+    snapshot = {field: getattr(bug, field) for field in SNAPSHOT_FIELDS}
+    assert run_job(job.id, 'w1')
+
+    db.session.expire_all()
+    assert job.status == 'done' and job.attempts == 1
+    expected = LocalStatProvider().generate(snapshot)
+    assert {field: getattr(bug, field) for field in expected} == expected
+    assert bug.stats_generated and bug.stats_generation_method == 'local'
+    assert stats_pending([bug.id]) == set() and _ready(client, bug)
+
+
+def test_failures_back_off_then_fail(app, client, make_bugs, flaky):
+    app.config.update(STAT_JOB_BACKOFF=10, STAT_JOB_BACKOFF_MAX=25)
+    flaky(failures=10)
+    bug, = make_bugs(1)
+    job_id = enqueue_stats(bug.id, provider='flaky').id
+    db.session.get(StatJob, job_id).max_attempts = 3
+    db.session.commit()
+
+    for attempt, delay in ((1, 10), (2, 20)):
+        assert claim_job('w1') == job_id
+        started = datetime.utcnow()
+        assert not run_job(job_id, 'w1')
+        job = db.session.get(StatJob, job_id)
+        assert job.status == 'pending' and job.attempts == attempt and job.locked_by is None
+        waits = (job.run_after - started).total_seconds()
+        assert delay <= waits <= delay * 1.25 + 1
+        assert claim_job('w1') is None  # not before run_after
+        assert not _ready(client, bug)
+        _due_now(job_id)
+
+    assert claim_job('w1') == job_id
+    assert not run_job(job_id, 'w1')
+    job = db.session.get(StatJob, job_id)
+    assert job.status == 'failed' and 'provider timed out' in job.error
+    # out of the queue: the bug battles with the stats it has, everywhere
+    assert stats_pending([bug.id]) == set() and _ready(client, bug)
+
+
+def test_backoff_doubles_up_to_the_cap(app):
+    app.config.update(STAT_JOB_BACKOFF=5, STAT_JOB_BACKOFF_MAX=60)
+    for attempts, delay in ((1, 5), (2, 10), (3, 20), (4, 40), (5, 60), (9, 60)):
+        assert all(delay <= backoff(attempts) <= delay * 1.25 for _ in range(20))
+
+
+def test_provider_limit_caps_running_jobs(make_bugs):
+    bugs = make_bugs(LocalStatProvider.concurrency + 2)
+    for bug in bugs:
+        enqueue_stats(bug.id)
+    claimed = [claim_job(f'w{i}') for i in range(len(bugs))]
+    running = [job_id for job_id in claimed if job_id is not None]
+    assert len(running) == LocalStatProvider.concurrency
+    assert claimed[len(running):] == [None, None]
+
+    assert run_job(running[0], 'w0')
+    assert claim_job('w9') is not None  # a slot opened up
+    assert claim_job('w10') is None
+
+
+def test_stale_lock_is_reclaimed_and_the_old_worker_loses(app, make_bugs):
+    app.config['STAT_JOB_TIMEOUT'] = 60
+    bug, = make_bugs(1)
+    job_id = enqueue_stats(bug.id).id
+    assert claim_job('dead') == job_id
+    assert claim_job('w2') is None  # still within the timeout
+
+    db.session.get(StatJob, job_id).locked_at = datetime.utcnow() - timedelta(seconds=61)
+    db.session.commit()
+    assert claim_job('w2') == job_id
+    job = db.session.get(StatJob, job_id)
+    assert job.locked_by == 'w2' and job.attempts == 2
+
+    # the first worker wakes up and finishes late: its result is dropped
+    assert not run_job(job_id, 'dead')
+    db.session.expire_all()
+    assert job.status == 'running' and job.locked_by == 'w2' and not bug.stats_generated
+    assert run_job(job_id, 'w2')
+    db.session.expire_all()
+    assert job.status == 'done' and bug.stats_generated
+
+
+def test_late_failure_does_not_requeue_a_reclaimed_job(make_bugs, flaky):
+    flaky(failures=1)
+    bug, = make_bugs(1)
+    job_id = enqueue_stats(bug.id, provider='flaky').id
+    assert claim_job('dead') == job_id
+    db.session.get(StatJob, job_id).locked_by = 'w2'  # as if reclaimed meanwhile
+    db.session.commit()
+    assert not run_job(job_id, 'dead')
+    job = db.session.get(StatJob, job_id)
+    assert job.status == 'running' and job.locked_by == 'w2'
@@ -0,0 +1,131 @@
+"""
+ArenaStats follows inserts, edits and deletes by deltas - a rebuild only when
+a max holder or leaderboard bug goes, done by the writer before it commits -
+and arena pages never write
+"""
+import pytest
+from sqlalchemy import event, func, select, update
+
+from app import db, stats
+from app.models import ArenaStats, Bug, User
+from app.stats import LEADERBOARD_SIZE, STAT_FIELDS, arena_snapshot, refresh_arena_stats
+
+
+@pytest.fixture
+def rebuilds(monkeypatch):
+    """How many times the stats row was aggregated from scratch"""
+    calls = []
+    aggregate = stats._aggregate
+    monkeypatch.setattr(stats, '_aggregate', lambda session: calls.append(1) or aggregate(session))
+    return calls
+
+
+def _brute_force():
+    row = {'total_bugs': Bug.query.count(), 'total_users': User.query.count()}
+    for field in STAT_FIELDS:
+        column = getattr(Bug, field)
+        row[f'max_{field}'] = db.session.scalar(select(func.coalesce(func.max(column), 0)))
+        row[f'sum_{field}'] = db.session.scalar(select(func.coalesce(func.sum(column), 0)))
+    row['leaderboard'] = [bug.id for bug in Bug.query.order_by(Bug.wins.desc(), Bug.id).limit(LEADERBOARD_SIZE)]
+    return row
+
+
+def _stored():
+    db.session.expire_all()
+    stored = db.session.get(ArenaStats, stats.STATS_ID)
+    row = {name: getattr(stored, name) for name in _brute_force() if name != 'leaderboard'}
+    row['leaderboard'] = [entry['id'] for entry in stored.leaderboard]
+    assert not stored.stale
+    return row
+
+
+def _ordinary(bugs):
+    """A bug that holds no max and isn't on the leaderboard"""
+    row = _stored()
+    return next(bug for bug in bugs if bug.id not in row['leaderboard']
+                and all(getattr(bug, field) < row[f'max_{field}'] for field in STAT_FIELDS))
+
+
+def test_counters_follow_inserts_and_deletes_without_a_rebuild(make_bugs, rebuilds):
+    assert db.session.get(ArenaStats, stats.STATS_ID)  # the user fixture's commit created the row
+    bugs = make_bugs(40)
+    assert _stored() == _brute_force()
+
+    bugs += make_bugs(25, seed=1)
+    for _ in range(5):
+        gone = _ordinary(bugs)
+        bugs.remove(gone)
+        db.session.delete(gone)
+        db.session.commit()
+    assert _stored() == _brute_force()
+    assert rebuilds == []
+
+
+def test_edits_move_sums_and_maxima_without_a_rebuild(make_bugs, rebuilds):
+    bugs = make_bugs(30)
+    bug = _ordinary(bugs)
+    bug.attack += 1  # up, still below the max
+    bug.speed -= 1  # down, wasn't the max
+    db.session.commit()
+    top = max(bugs, key=lambda other: other.health)
+    bug.health = top.health + 7  # a new max
+    db.session.commit()
+    assert _stored() == _brute_force()
+    assert rebuilds == []
+
+
+def test_losing_a_max_or_leaderboard_bug_rebuilds_before_commit(make_bugs, rebuilds):
+    bugs = make_bugs(30)
+    db.session.execute(update(Bug).where(Bug.id.in_([bug.id for bug in bugs[:15]])).values(wins=Bug.id))
+    refresh_arena_stats()
+    assert _stored() == _brute_force()
+    del rebuilds[:]
+
+    db.session.delete(max(bugs, key=lambda bug: bug.attack))
+    db.session.commit()
+    assert len(rebuilds) == 1 and _stored() == _brute_force()
+
+    db.session.delete(db.session.get(Bug, _stored()['leaderboard'][0]))
+    db.session.commit()
+    assert len(rebuilds) == 2 and _stored() == _brute_force()
+
+    db.session.get(Bug, _stored()['leaderboard'][-1]).nickname = 'renamed'
+    db.session.commit()
+    assert len(rebuilds) == 3 and _stored() == _brute_force()
+    assert arena_snapshot()['top_bugs'][-1]['nickname'] == 'renamed'
+
+
+def test_rolled_back_changes_leave_the_row_alone(make_bugs, rebuilds):
+    bugs = make_bugs(20)
+    before = _stored()
+    db.session.delete(max(bugs, key=lambda bug: bug.health))
+    db.session.flush()
+    db.session.rollback()
+    assert _stored() == before == _brute_force()
+    assert rebuilds == []
+
+
+def test_arena_pages_never_write(app, client, make_bugs):
+    make_bugs(12)
+    refresh_arena_stats()
+    db.session.query(ArenaStats).update({'stale': True})
+    db.session.commit()
+    stats.invalidate_arena_stats()
+
+    writes = []
+
+    def count_writes(conn, cursor, statement, *args):
+        if not statement.lstrip().upper().startswith('SELECT'):
+            writes.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count_writes)
+    try:
+        for url in ('/', '/dashboard'):
+            assert client.get(url).status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_writes)
+    assert writes == []
+    assert db.session.get(ArenaStats, stats.STATS_ID).stale  # left for a write or the CLI
+    assert arena_snapshot()['total_bugs'] == 12
+
+    refresh_arena_stats()
+    assert not db.session.get(ArenaStats, stats.STATS_ID).stale
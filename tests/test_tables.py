@@ -0,0 +1,29 @@
+"""
+Precompiled matchup/size tables agree with the string helpers they replace
+"""
+from battle_engine import tables
+from battle_engine.tables import (
+    ATTACK_TYPES, DEFENSE_TYPES, SIZE_CLASSES, MATCHUP_TABLE, SIZE_TABLE, check_conformance,
+)
+
+
+def test_tables_match_string_helpers():
+    assert check_conformance() == []
+
+
+def test_tables_cover_every_code():
+    # one row/column per type or size plus UNKNOWN (0)
+    assert len(MATCHUP_TABLE) == len(ATTACK_TYPES) + 1
+    assert all(len(row) == len(DEFENSE_TYPES) + 1 for row in MATCHUP_TABLE)
+    assert len(SIZE_TABLE) == len(ATTACK_TYPES) + 1
+    for by_size in SIZE_TABLE:
+        assert len(by_size) == len(SIZE_CLASSES) + 1
+        assert all(len(row) == len(SIZE_CLASSES) + 1 for row in by_size)
+
+
+def test_conformance_reports_a_wrong_cell(monkeypatch):
+    broken = [list(row) for row in MATCHUP_TABLE]
+    broken[1][1] += 1
+    monkeypatch.setattr(tables, 'MATCHUP_TABLE', tuple(map(tuple, broken)))
+    problems = check_conformance()
+    assert len(problems) == 1 and problems[0].startswith(f'matchup {ATTACK_TYPES[0]} vs {DEFENSE_TYPES[0]}')
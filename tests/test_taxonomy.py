@@ -0,0 +1,159 @@
+"""
+Taxonomy lookups against a local stand-in for GBIF and Wikipedia
+(http.server): single-flight, batching, rate limiting, negative caching and
+answers that survive a failed cache write
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import taxonomy
+from app.models import TaxonCache
+from app.taxonomy import TokenBucket, get_provider, resolve, resolve_many
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """Knows every name except ones starting with 'Nothing'"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.requests.append((url.path, params, time.monotonic()))
+        time.sleep(self.server.delay)
+        if url.path == '/gbif/species/match':
+            name = params['name']
+            body = {'matchType': 'NONE'} if name.startswith('Nothing') else {
+                'matchType': 'EXACT', 'usageKey': len(self.server.requests), 'canonicalName': name,
+                'genus': name.split()[0], 'family': 'Testidae'}
+        elif url.path == '/wiki':
+            pages = {}
+            for i, title in enumerate(params['titles'].split('|'), start=1):
+                pages[str(-i) if title.startswith('Nothing') else str(i)] = (
+                    {'title': title, 'missing': ''} if title.startswith('Nothing')
+                    else {'title': title, 'fullurl': f'https://en.wikipedia.org/wiki/{title.replace(" ", "_")}'})
+            body = {'query': {'pages': pages}}
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server(app):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StandIn)
+    server.requests = []
+    server.delay = 0.0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    app.config.update(TAXONOMY_GBIF_URL=f'{base}/gbif', TAXONOMY_WIKIPEDIA_URL=f'{base}/wiki')
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _paths(server, path):
+    return [params for request_path, params, _ in server.requests if request_path == path]
+
+
+def _in_threads(app, count, target):
+    results = [None] * count
+    start = threading.Barrier(count)
+
+    def run(i):
+        with app.app_context():
+            start.wait()
+            results[i] = target(i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_lookups_of_one_name_reach_the_server_once(app, server):
+    app.config['TAXONOMY_PROVIDERS'] = ('gbif',)
+    server.delay = 0.2  # every thread asks while the first request is still out
+    taxa = _in_threads(app, 8, lambda i: resolve('Lucanus  cervus' if i % 2 else 'lucanus cervus'))
+    assert len(_paths(server, '/gbif/species/match')) == 1
+    assert {taxon.gbif_id for taxon in taxa} == {'1'}
+
+
+def test_wikipedia_titles_go_fifty_to_a_request(app, server):
+    app.config['TAXONOMY_PROVIDERS'] = ('wikipedia',)
+    names = [f'Bug number{i}' for i in range(120)]
+    resolved = resolve_many(names)
+    batches = [params['titles'].split('|') for params in _paths(server, '/wiki')]
+    assert [len(titles) for titles in batches] == [50, 50, 20]
+    assert sorted(title for titles in batches for title in titles) == sorted(names)
+    assert resolved['Bug number7'].wikipedia_url == 'https://en.wikipedia.org/wiki/Bug_number7'
+
+
+def test_concurrent_names_share_a_wikipedia_request(app, server):
+    app.config.update(TAXONOMY_PROVIDERS=('wikipedia',), TAXONOMY_BATCH_WINDOW=0.3)
+    taxa = _in_threads(app, 20, lambda i: resolve(f'Bug number{i}'))
+    batches = _paths(server, '/wiki')
+    assert len(batches) == 1 and len(batches[0]['titles'].split('|')) == 20
+    assert all(taxon is not None for taxon in taxa)
+
+
+def test_token_bucket_throttles():
+    bucket = TokenBucket(rate=20, burst=2)
+    started = time.monotonic()
+    for _ in range(12):
+        bucket.acquire()
+    # the burst goes straight out, the other 10 wait 1/20 s each
+    assert time.monotonic() - started >= 10 / 20 * 0.95
+
+
+def test_provider_requests_pass_through_the_bucket(app, server, monkeypatch):
+    app.config['TAXONOMY_PROVIDERS'] = ('gbif',)
+    monkeypatch.setattr(get_provider('gbif'), 'limiter', TokenBucket(rate=10, burst=1))
+    resolve_many([f'Bug number{i}' for i in range(6)])
+    sent = [at for path, _, at in server.requests]
+    assert len(sent) == 6
+    assert all(later - earlier >= 0.1 * 0.9 for earlier, later in zip(sent, sent[1:]))
+
+
+def test_misses_are_cached_for_the_negative_ttl(app, server):
+    app.config.update(TAXONOMY_PROVIDERS=('gbif',), TAXONOMY_CACHE_TTL=3600, TAXONOMY_NEGATIVE_TTL=0.5)
+    assert resolve('Nothing here') is None
+    assert resolve('Apis mellifera').genus == 'Apis'
+    assert TaxonCache.query.count() == 2
+
+    resolve('Nothing here')
+    resolve('Apis mellifera')
+    assert len(server.requests) == 2  # both answered from cache
+
+    time.sleep(0.6)
+    taxonomy.clear_memory_cache()  # the table alone decides now
+    resolve('Nothing here')
+    resolve('Apis mellifera')
+    asked = [params['name'] for params in _paths(server, '/gbif/species/match')]
+    assert asked == ['Nothing here', 'Apis mellifera', 'Nothing here']
+
+
+def test_failed_cache_write_still_answers(app, server, monkeypatch, caplog):
+    app.config['TAXONOMY_PROVIDERS'] = ('gbif',)
+
+    def broken(*args):
+        raise OperationalError('INSERT', {}, Exception('disk I/O error'))
+    monkeypatch.setattr(taxonomy, '_remember', broken)
+
+    taxa = _in_threads(app, 4, lambda i: resolve('Apis mellifera'))
+    assert all(taxon is not None and taxon.genus == 'Apis' for taxon in taxa)
+    assert 'Could not cache 1 taxonomy answers from gbif' in caplog.text
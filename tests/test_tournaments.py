@@ -0,0 +1,65 @@
+"""
+Tournaments are queued by the request and played by the worker
+"""
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Battle, Tournament
+from app.stat_jobs import work
+from app.tournaments import claim_tournament, create_tournament, run_next_tournament
+
+
+def _results(tournament):
+    return sorted((b.round_number, b.red_corner_bug_id, b.blue_corner_bug__id, b.winner_id)
+                  for b in tournament.battles)
+
+
+def test_new_tournament_is_queued_not_played(app, client, make_bugs):
+    make_bugs(8)
+    response = client.post('/tournament/new', data={'name': 'Cup', 'format': 'single_elimination', 'size': 8})
+    assert response.status_code == 302
+
+    tournament = Tournament.query.one()
+    assert tournament.status == 'pending'
+    assert Battle.query.count() == 0
+    assert b'Queued' in client.get(response.location).data
+
+    assert work(app, threads=1, burst=True) == 1
+    db.session.expire_all()
+    assert tournament.status == 'complete'
+    assert tournament.champion_id is not None
+    assert Battle.query.count() == 7
+
+
+def test_one_running_tournament_at_a_time(app, make_bugs):
+    bugs = make_bugs(4)
+    first = create_tournament('A', 'round_robin', [bug.id for bug in bugs])
+    create_tournament('B', 'round_robin', [bug.id for bug in bugs])
+    assert claim_tournament() == first.id
+    assert claim_tournament() is None  # TOURNAMENT_CONCURRENCY = 1
+
+
+def test_stale_tournament_resumes_without_replaying_saved_rounds(app, make_bugs):
+    bugs = make_bugs(6)
+    ids = [bug.id for bug in bugs]
+    # created together so both are seeded from the same win records
+    reference = create_tournament('Reference', 'round_robin', ids, seed=42)
+    tournament = create_tournament('Crashed', 'round_robin', ids, seed=42)
+    assert run_next_tournament()
+    expected = _results(reference)
+
+    assert claim_tournament() == tournament.id
+    # the worker saved two rounds and died
+    for round_number, red, blue, winner in expected:
+        if round_number <= 2:
+            db.session.add(Battle(red_corner_bug_id=red, blue_corner_bug__id=blue, winner_id=winner,
+                                  tournament_id=tournament.id, round_number=round_number))
+    tournament.rounds_played = 2
+    tournament.locked_at = datetime.utcnow() - timedelta(seconds=app.config['TOURNAMENT_TIMEOUT'] + 1)
+    db.session.commit()
+
+    assert run_next_tournament()
+    db.session.expire_all()
+    assert tournament.status == 'complete'
+    assert _results(tournament) == expected
+    assert tournament.champion_id == reference.champion_id
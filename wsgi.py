@@ -0,0 +1,12 @@
+"""
+WSGI entry point for production: gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this has no side effects beyond building the app - no tables are
+created (`flask db upgrade` does that) and no database connection is opened.
+"""
+import os
+
+from app import create_app
+from config import configs
+
+app = create_app(configs[os.environ.get('BUGBRAWL_CONFIG', 'production')])